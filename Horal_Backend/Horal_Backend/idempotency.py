@@ -0,0 +1,115 @@
+import hashlib
+import json
+from functools import wraps
+from django.conf import settings
+from django.http import HttpResponse
+from django_redis import get_redis_connection
+from rest_framework import status
+from rest_framework.response import Response
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+KEY_PREFIX = "idempotency:"
+
+
+def _error(status_code, message):
+    return Response({"status": "error", "status_code": status_code, "message": message}, status=status_code)
+
+
+def _fingerprint(request):
+    """Hash of what the request asks for, a reused key with a different body is rejected"""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}:{request.path}:{body}".encode()).hexdigest()
+
+
+def _serialize(response, fingerprint):
+    entry = {"fingerprint": fingerprint, "status": response.status_code}
+    if isinstance(response, Response):
+        entry["data"] = response.data
+    else:
+        entry["content"] = response.content.decode()
+        entry["content_type"] = response.get("Content-Type")
+    return json.dumps(entry, default=str)
+
+
+def _replay(entry):
+    if "data" in entry:
+        response = Response(entry["data"], status=entry["status"])
+    else:
+        response = HttpResponse(entry["content"], status=entry["status"], content_type=entry["content_type"])
+    response[REPLAYED_HEADER] = "true"
+    return response
+
+
+def idempotent(scope):
+    """
+    Make an APIView handler safe to retry with an Idempotency-Key header.
+    The first response (anything below 500) is stored in Redis for
+    IDEMPOTENCY_KEY_TTL seconds with a fingerprint of the request, and
+    duplicates get it back after a single read. A duplicate arriving while the
+    first request still runs waits on a lock and then replays. Requests
+    without the header run as before
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return handler(view, request, *args, **kwargs)
+            if len(key) > 255:
+                return _error(status.HTTP_400_BAD_REQUEST, f"{IDEMPOTENCY_HEADER} must be at most 255 characters")
+
+            # Keys are per user, so one client cannot replay another's response
+            owner = request.user.pk if request.user.is_authenticated else request.session.session_key
+            cache_key = f"{KEY_PREFIX}{scope}:{owner}:{hashlib.sha256(key.encode()).hexdigest()}"
+            fingerprint = _fingerprint(request)
+            redis = get_redis_connection("default")
+
+            def stored_response():
+                stored = redis.get(cache_key)
+                if stored is None:
+                    return None
+                entry = json.loads(stored)
+                if entry["fingerprint"] != fingerprint:
+                    return _error(
+                        status.HTTP_422_UNPROCESSABLE_ENTITY,
+                        f"This {IDEMPOTENCY_HEADER} was already used for a different request"
+                    )
+                return _replay(entry)
+
+            response = stored_response()
+            if response is not None:
+                return response
+
+            lock = redis.lock(
+                f"{cache_key}:lock",
+                timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT,
+                blocking_timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT,
+            )
+            if not lock.acquire():
+                return _error(
+                    status.HTTP_409_CONFLICT,
+                    f"A request with this {IDEMPOTENCY_HEADER} is still being processed"
+                )
+            try:
+                # The request we waited on has finished
+                response = stored_response()
+                if response is not None:
+                    return response
+
+                response = handler(view, request, *args, **kwargs)
+                if response.status_code < 500:
+                    redis.set(cache_key, _serialize(response, fingerprint), ex=settings.IDEMPOTENCY_KEY_TTL)
+                return response
+            finally:
+                try:
+                    lock.release()
+                except Exception as e:
+                    # The lock timed out while the handler ran, the response is stored regardless
+                    logger.warning(f"Idempotency lock for {scope} expired before release: {e}")
+        return wrapper
+    return decorator
@@ -0,0 +1,46 @@
+import msgpack
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# DRF's encoder already knows how to flatten Decimal, UUID, datetime,
+# lazy strings and querysets, so both renderers fall back to it
+_drf_encoder = JSONEncoder()
+
+
+def encode_default(obj):
+    """Fallback encoder for types orjson/msgpack can't serialize natively"""
+    return _drf_encoder.default(obj)
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for DRF's JSONRenderer backed by orjson.
+    Output is always compact, ignoring any indent requested by the client.
+    """
+    options = (
+        orjson.OPT_NON_STR_KEYS
+        | orjson.OPT_PASSTHROUGH_DATETIME  # keep DRF's datetime formatting
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return orjson.dumps(data, default=encode_default, option=self.options)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Renderer that serializes response data into MessagePack.
+    Served when the client sends `Accept: application/msgpack`.
+    """
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=encode_default, use_bin_type=True)
@@ -0,0 +1,9 @@
+def ensure_session_key(request):
+    """
+    Session key of the request, creating the session on first use.
+    Call this only when anonymous state is about to be written, so visitors
+    that merely browse never get a session row
+    """
+    if not request.session.session_key:
+        request.session.save()
+    return request.session.session_key
@@ -17,6 +17,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 
 import environ
 import os
+from corsheaders.defaults import default_headers
 
 # Initialise environment variables
 env = environ.Env(
@@ -86,14 +87,13 @@ MIDDLEWARE = [
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'carts.middleware.SessionFixMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
     # Custom middleware
-    'carts.middleware.CartMiddleware',
+    'products.middleware.ProductIndexSyncMiddleware',
     # 'sellers_dashboard.middleware.reauth_middleware.DashboardReauthMiddleware',
     
 ]
@@ -114,6 +114,8 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",       # React dev server
     "http://127.0.0.1:3000",
 ]
+# Mobile and web clients send Idempotency-Key on checkout and payment initialization
+CORS_ALLOW_HEADERS = (*default_headers, "idempotency-key")
 
 # Set trailing slash automatically
 APPEND_SlASH = True
@@ -154,6 +156,18 @@ REST_FRAMEWORK = {
     ],    
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 30,
+    # Compact orjson by default, MessagePack for clients sending Accept: application/msgpack
+    'DEFAULT_RENDERER_CLASSES': [
+        'Horal_Backend.renderers.ORJSONRenderer',
+        'Horal_Backend.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'Horal_Backend.parsers.ORJSONParser',
+        'Horal_Backend.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
 SWAGGER_SETTINGS = {
@@ -287,6 +301,17 @@ CELERY_RESULT_BACKEND = CELERY_BROKER_URL
 # No SSL needed for Render internal Redis
 CELERY_BROKER_USE_SSL = None  
 
+# Sessions are created lazily (first cart or recently-viewed write), see
+# Horal_Backend/sessions.py. SESSION_ENGINE accepts "db", "cached_db", "cache"
+# (Redis only, through the default cache) or a full engine path
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+}
+SESSION_ENGINE = env('SESSION_ENGINE', default='cached_db')
+SESSION_ENGINE = SESSION_ENGINES.get(SESSION_ENGINE, SESSION_ENGINE)
+
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 
 CELERY_ACCEPT_CONTENT = ["json"]
@@ -334,6 +359,62 @@ FEZ_USERNAME = env('FEZ_USERNAME')
 FEZ_PASSWORD = env('FEZ_PASSWORD')
 HORAL_FEZ_WEBHOOK = env('HORAL_FEZ_WEBHOOK')
 
+# Shipping quotes are cached per (pickup state, delivery state, weight bucket, service);
+# failed lookups are cached briefly so retries do not hit FEZ again
+SHIPPING_QUOTE_TTL = env.int('SHIPPING_QUOTE_TTL', default=60 * 60 * 6)
+SHIPPING_QUOTE_ERROR_TTL = env.int('SHIPPING_QUOTE_ERROR_TTL', default=60)
+SHIPPING_QUOTE_WEIGHT_BUCKET_KG = env.int('SHIPPING_QUOTE_WEIGHT_BUCKET_KG', default=1)
+
+# FEZ pricing and ETA calls run concurrently: each call gets FEZ_CALL_TIMEOUT seconds,
+# all calls of one checkout share FEZ_CHECKOUT_BUDGET seconds
+FEZ_MAX_CONCURRENCY = env.int('FEZ_MAX_CONCURRENCY', default=16)
+FEZ_CALL_TIMEOUT = env.float('FEZ_CALL_TIMEOUT', default=5.0)
+FEZ_CHECKOUT_BUDGET = env.float('FEZ_CHECKOUT_BUDGET', default=8.0)
+
+
+# Catalog change feed (products/changes/)
+PRODUCT_CHANGES_RETENTION_DAYS = env.int('PRODUCT_CHANGES_RETENTION_DAYS', default=30)
+PRODUCT_CHANGES_MAX_PAGE_SIZE = 500
+
+# In-process cache used by add-to-cart to resolve a product id or slug
+PRODUCT_LOCATOR_CACHE_SIZE = env.int('PRODUCT_LOCATOR_CACHE_SIZE', default=10000)
+PRODUCT_LOCATOR_CACHE_TTL = env.int('PRODUCT_LOCATOR_CACHE_TTL', default=600)
+
+# Storefront used for product links in sitemaps and merchant feeds
+FRONTEND_BASE_URL = env('FRONTEND_BASE_URL', default='https://www.horal.ng')
+
+# Bulk publish/unpublish/delete selections above this size run as a background job
+BULK_LISTING_SYNC_LIMIT = env.int('BULK_LISTING_SYNC_LIMIT', default=500)
+
+# Largest number of SKUs accepted by one bulk inventory update
+INVENTORY_BULK_MAX_ITEMS = 1000
+
+# Anonymous carts live in Redis ("redis") or in the carts table ("db") until
+# login or checkout; the Redis hash expires after CART_GUEST_TTL seconds idle
+CART_GUEST_BACKEND = env('CART_GUEST_BACKEND', default='redis')
+CART_GUEST_TTL = env.int('CART_GUEST_TTL', default=60 * 60 * 24 * 30)
+
+# Abandoned cart reminders are queued this many carts per task, each task renders and sends its own batch
+CART_REMINDER_BATCH_SIZE = env.int('CART_REMINDER_BATCH_SIZE', default=50)
+
+# Largest number of operations accepted by one POST /cart/batch/
+CART_BATCH_MAX_OPERATIONS = 50
+
+# Stock reserved by a checkout is released this many seconds later unless the order is paid
+ORDER_RESERVATION_TTL = env.int('ORDER_RESERVATION_TTL', default=60 * 30)
+
+# Flash sale holds not committed or released within this many seconds go back
+# to the Redis counters; keep it above the pending order expiry
+FLASH_SALE_HOLD_TTL = env.int('FLASH_SALE_HOLD_TTL', default=60 * 45)
+
+# Flash sale journal entries applied to Postgres per transaction
+FLASH_SALE_RECONCILE_BATCH = env.int('FLASH_SALE_RECONCILE_BATCH', default=1000)
+
+# Responses to requests sent with an Idempotency-Key are replayed for this many seconds
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', default=60 * 60 * 24)
+# How long a duplicate waits for the original request before getting a 409
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+
 
 ROOT_URLCONF = 'Horal_Backend.urls'
 
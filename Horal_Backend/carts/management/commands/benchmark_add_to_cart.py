@@ -0,0 +1,113 @@
+import io
+import json
+import time
+import uuid
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from carts.serializers import CartItemCreateSerializer
+from products.import_utils import run_product_import
+from products.locator_utils import clear_locator_cache
+from products.models import ProductBulkJob, ProductVariant
+from products.utils import CATEGORY_MODEL_MAP, product_models_list
+from shops.models import Shop
+from subcategories.models import SubCategory
+
+
+def legacy_validate(data):
+    """The previous validate path: try every product model, then look the variant up"""
+    product = None
+    for model in product_models_list:
+        try:
+            product = model.objects.get(id=data['product_id'])
+            break
+        except model.DoesNotExist:
+            continue
+
+    content_type = ContentType.objects.get_for_model(product)
+    variant = ProductVariant.objects.filter(
+        content_type=content_type, object_id=product.id, color=data['color']
+    ).first()
+    return variant.stock_quantity >= data['quantity']
+
+
+class Command(BaseCommand):
+    help = "Time the add-to-cart validate path: model loop against the ProductIndex locator"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=50)
+        parser.add_argument("--rounds", type=int, default=20)
+
+    def seed(self, shop, sub_category, count):
+        lines = [
+            json.dumps({
+                "category": sub_category.category.name,
+                "sub_category": sub_category.name,
+                "title": f"Locator bench {shop.name} {n}",
+                "description": "Synthetic product used for add-to-cart benchmarking",
+                "price": "2500.00", "state": "Lagos", "local_govt": "Ikeja",
+                "is_published": True,
+                "images": [{"url": f"https://cdn.horal.ng/bench/{n}.jpg"}],
+                "variants": [{"color": "black", "stock_quantity": 10}],
+                "logistics": {"weight_measurement": "KG", "total_weight": "1.00"},
+            })
+            for n in range(count)
+        ]
+        job = ProductBulkJob.objects.create(kind=ProductBulkJob.Kind.IMPORT, shop=shop)
+        job = run_product_import(job, io.BytesIO("\n".join(lines).encode()), "jsonl")
+        if job.failed:
+            raise CommandError(f"Seeding failed: {job.errors[:3]}")
+
+    def measure(self, label, payloads, validate, rounds, before_round=None):
+        calls, queries_total, elapsed = 0, 0, 0.0
+        for _ in range(rounds):
+            if before_round:
+                before_round()
+            for payload in payloads:
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    validate(payload)
+                    elapsed += time.perf_counter() - start
+                queries_total += len(queries)
+                calls += 1
+        self.stdout.write(
+            f"{label:<22} {queries_total / calls:>10.2f} {elapsed / calls * 1_000_000:>12.0f}"
+        )
+
+    def handle(self, *args, **options):
+        sub_category = SubCategory.objects.select_related("category").filter(
+            category__name__in=list(CATEGORY_MODEL_MAP)
+        ).first()
+        if not sub_category:
+            raise CommandError("Create at least one category with a sub category first")
+
+        shop = Shop.objects.create(
+            owner_type=Shop.OwnerType.PLATFORM, name=f"locator-benchmark-{uuid.uuid4().hex[:8]}"
+        )
+
+        try:
+            self.seed(shop, sub_category, options["products"])
+            model = CATEGORY_MODEL_MAP[sub_category.category.name.lower()]
+            self.stdout.write(
+                f"Products are {model.__name__}, model #{product_models_list.index(model) + 1} "
+                f"of {len(product_models_list)} in the legacy loop"
+            )
+
+            payloads = [
+                {"product_id": product_id, "color": "black", "quantity": 1}
+                for product_id in model.objects.filter(shop=shop).values_list("id", flat=True)
+            ]
+
+            def validate(payload):
+                serializer = CartItemCreateSerializer(data=payload)
+                serializer.is_valid(raise_exception=True)
+
+            self.stdout.write(f"{'path':<22} {'queries':>10} {'us / call':>12}")
+            self.measure("model loop", payloads, legacy_validate, options["rounds"])
+            self.measure("locator, cold cache", payloads, validate, options["rounds"], clear_locator_cache)
+            self.measure("locator, warm cache", payloads, validate, options["rounds"])
+        finally:
+            self.stdout.write("Cleaning up benchmark shop...")
+            shop.delete()
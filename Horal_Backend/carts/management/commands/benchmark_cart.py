@@ -0,0 +1,94 @@
+import io
+import json
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from carts.models import Cart, CartItem
+from carts.serializers import CartSerializer
+from products.import_utils import run_product_import
+from products.models import ProductBulkJob, ProductVariant
+from products.utils import CATEGORY_MODEL_MAP
+from shops.models import Shop
+from subcategories.models import SubCategory
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Show cart serialization query counts for carts of 1 to 100 lines, compact and expanded"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1,5,10,25,50,100")
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def seed(self, shop, sub_category, count):
+        """One product with one variant per cart line, created through the bulk import"""
+        lines = [
+            json.dumps({
+                "category": sub_category.category.name,
+                "sub_category": sub_category.name,
+                "title": f"Cart bench {shop.name} {n}",
+                "description": "Synthetic product used for cart benchmarking",
+                "price": "2500.00", "state": "Lagos", "local_govt": "Ikeja",
+                "is_published": True,
+                "images": [{"url": f"https://cdn.horal.ng/bench/{n}.jpg"}],
+                "variants": [{"color": "black", "stock_quantity": 10, **({"price_override": "1999.00"} if n % 2 else {})}],
+                "logistics": {"weight_measurement": "KG", "total_weight": "1.00"},
+            })
+            for n in range(count)
+        ]
+        job = ProductBulkJob.objects.create(kind=ProductBulkJob.Kind.IMPORT, shop=shop)
+        job = run_product_import(job, io.BytesIO("\n".join(lines).encode()), "jsonl")
+        if job.failed:
+            raise CommandError(f"Seeding failed: {job.errors[:3]}")
+        return list(ProductVariant.objects.filter(shop=shop))
+
+    def measure(self, cart, expand, repeat):
+        best = None
+        for _ in range(repeat):
+            cart = Cart.objects.get(pk=cart.pk)
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                CartSerializer(cart, context={"expand_product": expand}).data
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return len(queries), best * 1000
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        sub_category = SubCategory.objects.select_related("category").filter(
+            category__name__in=list(CATEGORY_MODEL_MAP)
+        ).first()
+        if not sub_category:
+            raise CommandError("Create at least one category with a sub category first")
+
+        shop = Shop.objects.create(
+            owner_type=Shop.OwnerType.PLATFORM, name=f"cart-benchmark-{uuid.uuid4().hex[:8]}"
+        )
+        user = CustomUser.objects.create_user(
+            email=f"cart-benchmark-{uuid.uuid4().hex[:8]}@horal.ng", password=uuid.uuid4().hex + "!A1"
+        )
+
+        try:
+            variants = self.seed(shop, sub_category, max(sizes))
+            cart = Cart.objects.create(user=user)
+
+            self.stdout.write(f"{'lines':>6} {'compact q':>10} {'compact ms':>11} {'expanded q':>11} {'expanded ms':>12}")
+            for size in sizes:
+                CartItem.objects.filter(cart=cart).delete()
+                CartItem.objects.bulk_create([
+                    CartItem(cart=cart, variant=variant, quantity=1) for variant in variants[:size]
+                ])
+
+                compact_queries, compact_ms = self.measure(cart, False, options["repeat"])
+                expanded_queries, expanded_ms = self.measure(cart, True, options["repeat"])
+                self.stdout.write(
+                    f"{size:>6} {compact_queries:>10} {compact_ms:>11.1f} "
+                    f"{expanded_queries:>11} {expanded_ms:>12.1f}"
+                )
+        finally:
+            self.stdout.write("Cleaning up benchmark data...")
+            user.delete()
+            shop.delete()
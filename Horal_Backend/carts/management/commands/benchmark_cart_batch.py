@@ -0,0 +1,105 @@
+import io
+import json
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+from carts.models import Cart, CartItem
+from products.import_utils import run_product_import
+from products.models import ProductBulkJob, ProductVariant
+from products.utils import CATEGORY_MODEL_MAP
+from shops.models import Shop
+from subcategories.models import SubCategory
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = "Compare N single cart line updates (plus a cart refresh) against one POST /cart/batch/"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lines", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def seed(self, shop, sub_category, count):
+        lines = [
+            json.dumps({
+                "category": sub_category.category.name,
+                "sub_category": sub_category.name,
+                "title": f"Batch bench {shop.name} {n}",
+                "description": "Synthetic product used for cart batch benchmarking",
+                "price": "2500.00", "state": "Lagos", "local_govt": "Ikeja",
+                "is_published": True,
+                "images": [{"url": f"https://cdn.horal.ng/bench/{n}.jpg"}],
+                "variants": [{"color": "black", "stock_quantity": 50}],
+                "logistics": {"weight_measurement": "KG", "total_weight": "1.00"},
+            })
+            for n in range(count)
+        ]
+        job = ProductBulkJob.objects.create(kind=ProductBulkJob.Kind.IMPORT, shop=shop)
+        job = run_product_import(job, io.BytesIO("\n".join(lines).encode()), "jsonl")
+        if job.failed:
+            raise CommandError(f"Seeding failed: {job.errors[:3]}")
+        return list(ProductVariant.objects.filter(shop=shop))
+
+    def measure(self, label, func, repeat):
+        best, query_count = None, 0
+        for attempt in range(repeat):
+            connection.queries_log.clear()
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                requests = func(attempt)
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            query_count = len(queries)
+        self.stdout.write(f"{label:<28} {requests:>9} {query_count:>9} {best * 1000:>10.1f}")
+
+    def handle(self, *args, **options):
+        sub_category = SubCategory.objects.select_related("category").filter(
+            category__name__in=list(CATEGORY_MODEL_MAP)
+        ).first()
+        if not sub_category:
+            raise CommandError("Create at least one category with a sub category first")
+
+        shop = Shop.objects.create(
+            owner_type=Shop.OwnerType.PLATFORM, name=f"batch-benchmark-{uuid.uuid4().hex[:8]}"
+        )
+        user = CustomUser.objects.create_user(
+            email=f"batch-benchmark-{uuid.uuid4().hex[:8]}@horal.ng", password=uuid.uuid4().hex + "!A1",
+            is_active=True,
+        )
+
+        try:
+            variants = self.seed(shop, sub_category, options["lines"])
+            cart = Cart.objects.create(user=user)
+            items = CartItem.objects.bulk_create([
+                CartItem(cart=cart, variant=variant, quantity=1) for variant in variants
+            ])
+
+            client = Client(HTTP_HOST="localhost", HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(user)}")
+
+            def single_calls(attempt):
+                for item in items:
+                    client.put(f"/api/v1/cart/item/{item.id}/", {"quantity": attempt + 2},
+                               content_type="application/json")
+                # The client refreshes the cart once it is done
+                client.get("/api/v1/cart/")
+                return len(items) + 1
+
+            def batch_call(attempt):
+                response = client.post("/api/v1/cart/batch/", {"operations": [
+                    {"op": "update", "item": str(item.id), "quantity": attempt + 2} for item in items
+                ]}, content_type="application/json")
+                if response.status_code != 200:
+                    raise CommandError(f"Batch call failed: {response.content[:300]}")
+                return 1
+
+            self.stdout.write(f"{'path':<28} {'requests':>9} {'queries':>9} {'best ms':>10}")
+            self.measure(f"{len(items)} single updates + GET", single_calls, options["repeat"])
+            self.measure("one batch call", batch_call, options["repeat"])
+        finally:
+            self.stdout.write("Cleaning up benchmark data...")
+            user.delete()
+            shop.delete()
@@ -0,0 +1,120 @@
+from importlib import import_module
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from carts.models import Cart
+from carts.stores import RedisCartStore
+from products.models import ProductVariant
+
+
+WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE")
+
+# Requests a crawler, health check or API client typically sends without cookies
+ANONYMOUS_PATHS = [
+    "/api/v1/cart/",
+    "/api/v1/product/",
+    "/api/v1/product/recently-viewed/",
+    "/api/v1/product/top-selling/",
+]
+
+
+class EagerSessionMiddleware:
+    """The previous CartMiddleware: a session for every request that lacks one"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.session.session_key:
+            request.session.create()
+        return self.get_response(request)
+
+
+class Command(BaseCommand):
+    help = "Count DB writes per anonymous request with eager sessions (before) and lazy sessions (after)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200,
+                            help="Cookie-less requests per run, spread over the anonymous endpoints")
+        parser.add_argument("--shopper-reads", type=int, default=20,
+                            help="Cart reads made by one shopper after adding an item")
+        parser.add_argument("--engines", default="db,cached_db,cache",
+                            help="Session engines to run the lazy mode with")
+
+    def count_writes(self, func):
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        writes = [q["sql"] for q in queries if q["sql"].lstrip().upper().startswith(WRITE_PREFIXES)]
+        return len(writes), sum("django_session" in sql for sql in writes)
+
+    def track(self, client):
+        """Remember the session a client was given, so cleanup can remove it and its guest cart"""
+        cookie = client.cookies.get(settings.SESSION_COOKIE_NAME)
+        if cookie and cookie.value:
+            self.sessions.append((settings.SESSION_ENGINE, cookie.value))
+
+    def run(self, options, variant):
+        def visitors():
+            for n in range(options["requests"]):
+                client = Client(HTTP_HOST="localhost")
+                client.get(ANONYMOUS_PATHS[n % len(ANONYMOUS_PATHS)])
+                self.track(client)
+
+        def shopper():
+            client = Client(HTTP_HOST="localhost")
+            if variant:
+                client.post("/api/v1/cart/add/", {
+                    "product_id": str(variant.object_id), "color": variant.color, "quantity": 1,
+                }, content_type="application/json")
+            for _ in range(options["shopper_reads"]):
+                client.get("/api/v1/cart/")
+            self.track(client)
+
+        return self.count_writes(visitors), self.count_writes(shopper)
+
+    def report(self, label, engine, options, result):
+        (visitor_writes, visitor_sessions), (shopper_writes, shopper_sessions) = result
+        requests = options["requests"]
+        self.stdout.write(
+            f"{label:<7} {engine:<10} {visitor_writes:>14} {visitor_sessions:>16} "
+            f"{visitor_writes / requests:>13.2f} {shopper_writes:>14} {shopper_sessions:>16}"
+        )
+
+    def cleanup(self):
+        """Delete the sessions and guest carts the runs created, in whichever engine and backend holds them"""
+        session_keys = {session_key for _, session_key in self.sessions}
+        for engine, session_key in self.sessions:
+            import_module(engine).SessionStore(session_key=session_key).delete()
+
+        # Cart items go with their cart
+        Cart.objects.filter(session_key__in=session_keys).delete()
+        if settings.CART_GUEST_BACKEND == "redis":
+            for session_key in session_keys:
+                RedisCartStore(session_key).clear()
+
+    def handle(self, *args, **options):
+        self.sessions = []
+        variant = ProductVariant.objects.filter(stock_quantity__gt=0).exclude(color__isnull=True).first()
+        if not variant:
+            self.stdout.write("No variant in stock, the shopper run only reads the cart")
+
+        engines = dict(settings.SESSION_ENGINES)
+        self.stdout.write(
+            f"{'mode':<7} {'engine':<10} {'visitor writes':>14} {'visitor sessions':>16} "
+            f"{'writes / req':>13} {'shopper writes':>14} {'shopper sessions':>16}"
+        )
+
+        middleware = settings.MIDDLEWARE + [f"{__name__}.EagerSessionMiddleware"]
+        try:
+            with override_settings(MIDDLEWARE=middleware, SESSION_ENGINE=engines["db"]):
+                self.report("before", "db", options, self.run(options, variant))
+
+            for engine in options["engines"].split(","):
+                with override_settings(SESSION_ENGINE=engines.get(engine, engine)):
+                    self.report("after", engine, options, self.run(options, variant))
+        finally:
+            self.stdout.write("Cleaning up load test sessions and carts...")
+            self.cleanup()
@@ -32,12 +32,13 @@ class Cart(models.Model):
 
     @property
     def total_price(self):
-        return sum(item.item_total_price for item in self.cart_item.all())
+        from .utils import get_cart_totals
+        return get_cart_totals(self)["total_price"]
     
 
     @property
     def total_item(self):
-        return len(self.cart_item.all())
+        return self.cart_item.count()
 
     def __str__(self):
         if self.user:
@@ -59,8 +60,7 @@ class CartItem(models.Model):
 
     @property
     def item_total_price(self):
-        price = self.variant.price_override or self.variant.product.price
-        return price * self.quantity
+        return self.variant.effective_price * self.quantity
     
 
     def __str__(self):
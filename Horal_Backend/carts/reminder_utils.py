@@ -0,0 +1,145 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef, F, DecimalField, ExpressionWrapper
+from django.template.loader import get_template
+from django.utils import timezone
+from notifications.emails import send_email_batch
+from products.models import ProductIndex
+from .models import Cart, CartItem
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+REMINDER_TEMPLATE = "notifications/emails/cart_abandoned_email.html"
+REMINDER_CTA = {
+    "url": "https://www.horal.ng/cart",
+    "text": "Complete Your Order"
+}
+
+# label: (hours since the last cart update, heading, body paragraphs)
+REMINDERS = {
+    "2h": (2, "Did You Forget Something?", [
+        "You left some items in your cart. Complete your purchase before they sell out!"
+    ]),
+    "24h": (24, "Your Cart is Waiting!", [
+        "Your cart still has items waiting. These products are popular and might sell out soon!"
+    ]),
+    "48h": (48, "Last Chance to Grab Your Items!", [
+        "Your cart hasn't been checked out yet. Complete your purchase before it's too late!"
+    ]),
+}
+
+# A cart is reminded if it was last updated within this long after the threshold
+REMINDER_WINDOW = timedelta(hours=2)
+
+
+def eligible_carts(label, now=None):
+    """
+    Signed-in carts with items, last updated inside the reminder window,
+    that have not had this reminder yet. Served by the updated_at and flag indexes
+    """
+    now = now or timezone.now()
+    hours = REMINDERS[label][0]
+    end = now - timedelta(hours=hours)
+
+    return Cart.objects.filter(
+        updated_at__gte=end - REMINDER_WINDOW,
+        updated_at__lt=end,
+        user__isnull=False,
+        **{f"reminder_{label}_sent": False},
+    ).filter(
+        Exists(CartItem.objects.filter(cart=OuterRef('pk'), variant__isnull=False))
+    ).order_by('updated_at', 'id')
+
+
+def cart_contents(cart_ids):
+    """{cart id: [email line]} for many carts with two queries"""
+    items = CartItem.objects.filter(cart_id__in=cart_ids, variant__isnull=False).annotate(
+        object_id=F('variant__object_id'),
+        line_total=ExpressionWrapper(
+            F('variant__effective_price') * F('quantity'),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    ).values('cart_id', 'object_id', 'quantity', 'line_total').order_by('cart_id', 'id')
+
+    items = list(items)
+    products = ProductIndex.objects.only('id', 'title', 'image').in_bulk(
+        {item['object_id'] for item in items}
+    )
+
+    contents = defaultdict(list)
+    for item in items:
+        product = products.get(item['object_id'])
+        if not product:
+            continue
+        contents[item['cart_id']].append({
+            "image_url": product.image if product.image else None,
+            "name": product.title,
+            "quantity": item['quantity'],
+            "price": item['line_total']  # template adds ₦
+        })
+    return contents
+
+
+def send_reminder_batch(cart_ids, label):
+    """
+    Render and send one reminder per cart from a single compiled template, then
+    flag only the carts whose email went out. Carts are locked while sending so
+    an overlapping task skips them instead of emailing twice. The lock is FOR NO
+    KEY UPDATE, so adding items to a locked cart (a key share on its row) still goes through.
+    Returns (sent cart ids, failed cart ids)
+    """
+    _, heading, body_paragraphs = REMINDERS[label]
+    template = get_template(REMINDER_TEMPLATE)
+    flag = f"reminder_{label}_sent"
+
+    with transaction.atomic():
+        carts = list(
+            Cart.objects.filter(id__in=cart_ids, user__isnull=False, **{flag: False})
+            .select_related('user').only('id', 'user__email', 'user__full_name')
+            .select_for_update(no_key=True, skip_locked=True, of=('self',))
+        )
+        contents = cart_contents([cart.id for cart in carts])
+        carts = [cart for cart in carts if contents.get(cart.id)]
+
+        messages = [{
+            "recipient": cart.user.email,
+            "subject": heading,
+            "html": template.render({
+                "user": cart.user.full_name,
+                "title": heading,
+                "body_paragraphs": body_paragraphs,
+                "cart_items": contents[cart.id],
+                "cta": REMINDER_CTA,
+            }),
+        } for cart in carts]
+
+        delivered = send_email_batch(messages, from_email=f"Horal Cart <{settings.DEFAULT_FROM_EMAIL}>") if messages else []
+
+        sent = [cart.id for cart, ok in zip(carts, delivered) if ok]
+        failed = [cart.id for cart, ok in zip(carts, delivered) if not ok]
+        Cart.objects.filter(id__in=sent).update(**{flag: True})
+
+    return sent, failed
+
+
+def send_abandoned_cart_reminders(now=None, batch_size=None):
+    """Queue every due reminder as small tasks of cart ids, returns {label: carts queued}"""
+    from .tasks import send_cart_reminders_task
+
+    now = now or timezone.now()
+    batch_size = batch_size or settings.CART_REMINDER_BATCH_SIZE
+
+    queued = {}
+    for label in REMINDERS:
+        cart_ids = [str(cart_id) for cart_id in eligible_carts(label, now).values_list('id', flat=True)]
+        # Tasks carry ids only, the worker renders and flags what it actually sends
+        for start in range(0, len(cart_ids), batch_size):
+            send_cart_reminders_task.delay(cart_ids[start:start + batch_size], label)
+        queued[label] = len(cart_ids)
+
+        logger.info(f"Queued {queued[label]} abandoned cart reminders ({label})")
+    return queued
@@ -1,13 +1,10 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Cart, CartItem
-from django.contrib.contenttypes.models import ContentType
-from products.models import (
-    ChildrenProduct, VehicleProduct, FashionProduct, ProductVariant,
-    ElectronicsProduct, AccessoryProduct, FoodProduct,
-    HealthAndBeautyProduct, GadgetProduct, Color, SizeOption
-)
+from products.models import Color, SizeOption
+from products.locator_utils import locate_product, find_variant
 from products.serializers import MixedProductSerializer
-from products.utils import product_models_list
+from .utils import get_cart_lines, get_cart_totals
 import logging
 
 logger = logging.getLogger(__name__)
@@ -63,8 +60,12 @@ class CartItemSerializer(serializers.ModelSerializer):
     
 
 class CartSerializer(serializers.ModelSerializer):
-    """Serializer for the cart model"""
-    items = CartItemSerializer(many=True, read_only=True, source='cart_item')
+    """
+    Serializer for the cart model.
+    Lines use the compact projection unless the context asks for
+    `expand_product`, which restores the full product payload per line
+    """
+    items = serializers.SerializerMethodField()
     total_price = serializers.SerializerMethodField()
     total_item = serializers.SerializerMethodField()
 
@@ -74,16 +75,29 @@ class CartSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at', 'items', 'total_price']
 
 
+    def get_items(self, obj):
+        if self.context.get('expand_product'):
+            items = obj.cart_item.select_related('variant')
+            return CartItemSerializer(items, many=True).data
+        return get_cart_lines(obj)
+
+    def get_totals(self, obj):
+        """Both totals come from a single aggregate query"""
+        if not hasattr(obj, '_totals'):
+            obj._totals = get_cart_totals(obj)
+        return obj._totals
+
     def get_total_price(self, obj):
-        return obj.total_price
+        return self.get_totals(obj)["total_price"]
     
     def get_total_item(self, obj):
-        return obj.total_item
+        return self.get_totals(obj)["total_item"]
     
 
 class CartItemCreateSerializer(serializers.Serializer):
     """Handles the creation of cart items based on existing product"""
-    product_id = serializers.UUIDField()
+    product_id = serializers.UUIDField(required=False)
+    slug = serializers.SlugField(max_length=255, required=False)
     color = serializers.ChoiceField(choices=Color.choices, required=False, allow_null=True)
     quantity = serializers.IntegerField(default=1, min_value=1)
     standard_size = serializers.ChoiceField(choices=SizeOption.StandardSize.choices, allow_null=True, required=False)
@@ -93,35 +107,21 @@ class CartItemCreateSerializer(serializers.Serializer):
 
     def validate(self, data):
         """Validate product in the cart"""
-        product = None
-        for model in product_models_list:
-            try:
-                product = model.objects.get(id=data['product_id'])
-                break
-            except model.DoesNotExist:
-                continue
+        identifier = data.get('product_id') or data.get('slug')
+        if not identifier:
+            raise serializers.ValidationError("Provide product_id or slug")
 
-        
-        if not product:
+        location = locate_product(identifier)
+        if not location:
             raise serializers.ValidationError("Product not found")
-        
-        content_type = ContentType.objects.get_for_model(product)
-        filter_kwargs = {
-            'content_type': content_type,
-            'object_id': product.id,
-        }
 
-        # Conditionally include additional fields
-        if data.get('standard_size') is not None:
-            filter_kwargs['standard_size'] = data['standard_size']
-        if data.get('custom_size_unit') is not None:
-            filter_kwargs['custom_size_unit'] = data['custom_size_unit']
-        if data.get('custom_size_value') is not None:
-            filter_kwargs['custom_size_value'] = data['custom_size_value']
-        if data.get('color') is not None:
-            filter_kwargs['color'] = data['color']
-       
-        variant = ProductVariant.objects.filter(**filter_kwargs).first()
+        variant = find_variant(
+            location,
+            standard_size=data.get('standard_size'),
+            custom_size_unit=data.get('custom_size_unit'),
+            custom_size_value=data.get('custom_size_value'),
+            color=data.get('color'),
+        )
 
         if not variant:
             raise serializers.ValidationError("No matching variant found")
@@ -133,40 +133,39 @@ class CartItemCreateSerializer(serializers.Serializer):
         return data
     
 
-
     def create(self, validated_data):
-        """Create cart item for authenticated or anonymous users"""
-        request = self.context['request']
-
-        # Use the cart provided in context (if available) or get from request
-        cart = self.context.get('cart')
-        if not cart:
-            # Get or create cart based on user authentication status
-            if request.user.is_authenticated:
-                cart, _ = Cart.objects.get_or_create(user=request.user)
-            else:
-                session_key = request.session.session_key
-                if not session_key:
-                    request.session.create()
-                    session_key = request.session.session_key
-
-                cart, _ = Cart.objects.get_or_create(session_key=session_key)
-
-        variant = validated_data['variant']
-        quantity = validated_data['quantity']
-
-        # Check if the item already exists in the cart
-        cart_item, created = CartItem.objects.get_or_create(
-            cart=cart,
-            variant=variant,
-            defaults={'quantity': quantity}
-        )
+        """Add the variant to the request's cart store and return the cart line id"""
+        from .stores import get_cart_store
+
+        # Use the cart store provided in context (if available) or get from request
+        store = self.context.get('store') or get_cart_store(self.context['request'])
+        return store.add(validated_data['variant'], validated_data['quantity'])
+
+
+class CartOperationSerializer(serializers.Serializer):
+    """
+    One step of a batch cart change.
+    add takes a variant id, update and remove take a cart line id
+    """
+    ADD, UPDATE, REMOVE = "add", "update", "remove"
+
+    op = serializers.ChoiceField(choices=[ADD, UPDATE, REMOVE])
+    variant = serializers.UUIDField(required=False)
+    item = serializers.UUIDField(required=False)
+    quantity = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, data):
+        if data["op"] == self.ADD:
+            if "variant" not in data:
+                raise serializers.ValidationError("add needs a variant")
+            data.setdefault("quantity", 1)
+        elif "item" not in data:
+            raise serializers.ValidationError(f"{data['op']} needs an item")
+        elif data["op"] == self.UPDATE and "quantity" not in data:
+            raise serializers.ValidationError("update needs a quantity")
+        return data
 
-        if not created:
-            cart_item.quantity += quantity
-            # Ensure stock quantity is not exceeded
-            if cart_item.quantity > cart_item.variant.stock_quantity:
-                cart_item.quantity = cart_item.variant.stock_quantity
-            cart_item.save()
 
-        return cart_item
\ No newline at end of file
+class CartBatchSerializer(serializers.Serializer):
+    """Ordered list of cart operations applied all together or not at all"""
+    operations = CartOperationSerializer(many=True, allow_empty=False, max_length=settings.CART_BATCH_MAX_OPERATIONS)
@@ -0,0 +1,344 @@
+import uuid
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django_redis import get_redis_connection
+from rest_framework.exceptions import ValidationError
+from Horal_Backend.sessions import ensure_session_key
+from products.models import ProductVariant
+from .models import Cart, CartItem
+from .serializers import CartSerializer, CartItemSerializer, CartOperationSerializer as Op
+from .utils import get_cart_lines, build_cart_lines, variants_with_prices, merge_cart_lines
+
+GUEST_CART_KEY = "cart:guest:{session_key}"
+# Hash fields that are not variant ids start with an underscore
+CREATED_AT_FIELD = "_created_at"
+
+
+class DatabaseCartStore:
+    """Cart rows in Postgres, used for signed in users and as the guest fallback"""
+
+    def __init__(self, cart):
+        self.cart = cart
+
+    @property
+    def id(self):
+        return self.cart.id
+
+    def serialize(self, expand_product=False):
+        return CartSerializer(self.cart, context={'expand_product': expand_product}).data
+
+    def line(self, item_id, expand_product=False):
+        if expand_product:
+            item = CartItem.objects.select_related('variant').get(id=item_id, cart=self.cart)
+            return CartItemSerializer(item).data
+        lines = get_cart_lines(self.cart, item_ids=[item_id])
+        return lines[0] if lines else None
+
+    def get_variant(self, item_id):
+        item = CartItem.objects.select_related('variant').filter(id=item_id, cart=self.cart).first()
+        return item.variant if item else None
+
+    def add(self, variant, quantity):
+        """Add a variant or top up its line, never above the available stock"""
+        cart_item, created = CartItem.objects.get_or_create(
+            cart=self.cart,
+            variant=variant,
+            defaults={'quantity': quantity}
+        )
+
+        if not created:
+            cart_item.quantity += quantity
+            # Ensure stock quantity is not exceeded
+            if cart_item.quantity > variant.stock_quantity:
+                cart_item.quantity = variant.stock_quantity
+            cart_item.save()
+
+        return cart_item.id
+
+    def set_quantity(self, item_id, quantity):
+        CartItem.objects.filter(id=item_id, cart=self.cart).update(quantity=quantity)
+
+    def remove(self, item_id):
+        deleted, _ = CartItem.objects.filter(id=item_id, cart=self.cart).delete()
+        return bool(deleted)
+
+    def clear(self):
+        self.cart.delete()
+
+    def items(self):
+        """{item id: (variant id, quantity)} of every line, locked for a batch change"""
+        return {
+            item_id: (variant_id, quantity)
+            for item_id, variant_id, quantity in CartItem.objects.select_for_update().filter(
+                cart=self.cart, variant__isnull=False
+            ).values_list('id', 'variant_id', 'quantity')
+        }
+
+    def write(self, quantities, removed):
+        """Upsert {variant id: quantity} and drop the removed variants, two queries at most"""
+        if removed:
+            CartItem.objects.filter(cart=self.cart, variant_id__in=removed).delete()
+        if quantities:
+            CartItem.objects.bulk_create(
+                [CartItem(cart=self.cart, variant_id=v, quantity=q) for v, q in quantities.items()],
+                update_conflicts=True,
+                unique_fields=['cart', 'variant'],
+                update_fields=['quantity'],
+            )
+
+    def update(self, change):
+        """Pass the locked lines to change() and write the (quantities, removed) it returns"""
+        with transaction.atomic():
+            self.write(*change(self.items()))
+
+
+class RedisCartStore:
+    """
+    Guest cart kept as a Redis hash of variant id -> quantity with a sliding TTL.
+    Line ids are the variant ids, and the cart id is derived from the session,
+    so reading an empty cart writes nothing
+    """
+
+    def __init__(self, session_key):
+        self.session_key = session_key
+        self.key = GUEST_CART_KEY.format(session_key=session_key)
+        self.redis = get_redis_connection("default")
+
+    @property
+    def id(self):
+        return uuid.uuid5(uuid.NAMESPACE_URL, f"horal:cart:{self.session_key}")
+
+    def quantities(self, client=None):
+        """{variant id: quantity} of the cart, read through `client` when given"""
+        return {
+            uuid.UUID(field.decode()): int(value)
+            for field, value in (client or self.redis).hgetall(self.key).items()
+            if not field.startswith(b"_")
+        }
+
+    def _touch(self, pipe):
+        pipe.hsetnx(self.key, CREATED_AT_FIELD, timezone.now().isoformat())
+        pipe.expire(self.key, settings.CART_GUEST_TTL)
+
+    def _entries(self, quantities):
+        """Line tuples for build_cart_lines, dropping variants that no longer exist"""
+        variants = {v.id: v for v in variants_with_prices(quantities.keys())}
+
+        missing = [str(vid) for vid in quantities if vid not in variants]
+        if missing:
+            self.redis.hdel(self.key, *missing)
+
+        return [
+            (variant_id, variants[variant_id], quantity, variants[variant_id].unit_price)
+            for variant_id, quantity in sorted(quantities.items())
+            if variant_id in variants
+        ]
+
+    def serialize(self, expand_product=False):
+        entries = self._entries(self.quantities())
+        created_at = self.redis.hget(self.key, CREATED_AT_FIELD)
+
+        if expand_product:
+            items = CartItemSerializer([
+                CartItem(id=variant_id, variant=variant, quantity=quantity)
+                for variant_id, variant, quantity, _ in entries
+            ], many=True).data
+        else:
+            items = build_cart_lines(entries)
+
+        return {
+            "id": self.id,
+            "created_at": parse_datetime(created_at.decode()) if created_at else timezone.now(),
+            "total_item": len(entries),
+            "items": items,
+            "total_price": sum(
+                (unit_price * quantity for _, _, quantity, unit_price in entries if unit_price is not None),
+                Decimal("0.00"),
+            ),
+        }
+
+    def line(self, item_id, expand_product=False):
+        quantity = self.redis.hget(self.key, str(item_id))
+        if quantity is None:
+            return None
+
+        entries = self._entries({item_id: int(quantity)})
+        if not entries:
+            return None
+        if expand_product:
+            _, variant, quantity, _ = entries[0]
+            return CartItemSerializer(CartItem(id=item_id, variant=variant, quantity=quantity)).data
+        return build_cart_lines(entries)[0]
+
+    def get_variant(self, item_id):
+        if not self.redis.hexists(self.key, str(item_id)):
+            return None
+        return ProductVariant.objects.filter(id=item_id).first()
+
+    def add(self, variant, quantity):
+        """Add a variant or top up its line, never above the available stock"""
+        with self.redis.pipeline() as pipe:
+            pipe.hincrby(self.key, str(variant.id), quantity)
+            self._touch(pipe)
+            total = pipe.execute()[0]
+
+        if total > variant.stock_quantity:
+            self.redis.hset(self.key, str(variant.id), variant.stock_quantity)
+        return variant.id
+
+    def set_quantity(self, item_id, quantity):
+        with self.redis.pipeline() as pipe:
+            pipe.hset(self.key, str(item_id), quantity)
+            self._touch(pipe)
+            pipe.execute()
+
+    def remove(self, item_id):
+        return bool(self.redis.hdel(self.key, str(item_id)))
+
+    def clear(self):
+        self.redis.delete(self.key)
+
+    def update(self, change):
+        """
+        Pass the lines to change() and write the (quantities, removed) it returns
+        in one MULTI/EXEC. The cart is WATCHed from the read on, so when another
+        request changes it first the whole update runs again on the new lines
+        """
+        def apply(pipe):
+            items = {variant_id: (variant_id, quantity) for variant_id, quantity in self.quantities(pipe).items()}
+            quantities, removed = change(items)
+
+            pipe.multi()
+            if removed:
+                pipe.hdel(self.key, *[str(variant_id) for variant_id in removed])
+            if quantities:
+                pipe.hset(self.key, mapping={str(v): q for v, q in quantities.items()})
+            self._touch(pipe)
+
+        self.redis.transaction(apply, self.key)
+
+
+def apply_cart_operations(store, operations):
+    """
+    Apply an ordered list of add/update/remove operations to a cart store.
+    Everything is checked against one stock query before anything is written,
+    so either every operation is applied or none is. Adding to an existing
+    line caps at stock like a single add does
+    """
+    def change(items):
+        original = dict(items.values())
+        quantities = dict(original)
+
+        variant_ids = {op["variant"] for op in operations if op["op"] == Op.ADD}
+        variant_ids |= {items[op["item"]][0] for op in operations if op.get("item") in items}
+        stock = dict(
+            ProductVariant.objects.filter(id__in=variant_ids).values_list('id', 'stock_quantity')
+        )
+
+        errors = {}
+        for index, op in enumerate(operations):
+            if op["op"] == Op.ADD:
+                variant_id = op["variant"]
+                if variant_id not in stock:
+                    errors[index] = "Variant not found"
+                elif variant_id in quantities:
+                    quantities[variant_id] = min(quantities[variant_id] + op["quantity"], stock[variant_id])
+                elif op["quantity"] > stock[variant_id]:
+                    errors[index] = "Insufficient stock for this product variant"
+                else:
+                    quantities[variant_id] = op["quantity"]
+                continue
+
+            variant_id = items[op["item"]][0] if op["item"] in items else None
+            if variant_id not in quantities:
+                errors[index] = "Cart item not found"
+            elif op["op"] == Op.REMOVE:
+                del quantities[variant_id]
+            elif op["quantity"] > stock.get(variant_id, 0):
+                errors[index] = "Insufficient Stock"
+            else:
+                quantities[variant_id] = op["quantity"]
+
+        if errors:
+            raise ValidationError({"operations": errors})
+
+        return (
+            {v: q for v, q in quantities.items() if original.get(v) != q},
+            original.keys() - quantities.keys(),
+        )
+
+    store.update(change)
+
+
+class EmptyCartStore:
+    """Cart of a visitor without a session, so reading it writes nothing"""
+
+    id = None
+
+    def serialize(self, expand_product=False):
+        return {
+            "id": None,
+            "created_at": None,
+            "total_item": 0,
+            "items": [],
+            "total_price": Decimal("0.00"),
+        }
+
+    def line(self, item_id, expand_product=False):
+        return None
+
+    def get_variant(self, item_id):
+        return None
+
+    def remove(self, item_id):
+        return False
+
+
+def get_cart_store(request, create=True):
+    """
+    Cart storage for the current visitor: the user's cart row when signed in,
+    otherwise the guest backend selected by CART_GUEST_BACKEND.
+    Read-only callers pass create=False so anonymous visitors without a
+    session get an empty cart instead of a new session
+    """
+    if request.user.is_authenticated:
+        cart, _ = Cart.objects.get_or_create(user=request.user)
+        return DatabaseCartStore(cart)
+
+    if not create and not request.session.session_key:
+        return EmptyCartStore()
+
+    session_key = ensure_session_key(request)
+    if settings.CART_GUEST_BACKEND == "redis":
+        return RedisCartStore(session_key)
+
+    cart, _ = Cart.objects.get_or_create(session_key=session_key)
+    return DatabaseCartStore(cart)
+
+
+def promote_guest_cart(session_key, user):
+    """
+    Move a Redis guest cart into the user's cart with one bulk upsert,
+    following the same merge policy as database guest carts
+    """
+    if not session_key:
+        return 0
+
+    guest = RedisCartStore(session_key)
+    quantities = guest.quantities()
+    if not quantities:
+        return 0
+
+    with transaction.atomic():
+        cart, _ = Cart.objects.get_or_create(user=user)
+        merged = merge_cart_lines(
+            cart.id,
+            "SELECT * FROM unnest(%s::uuid[], %s::integer[])",
+            [[str(variant_id) for variant_id in quantities], list(quantities.values())],
+        )
+
+    guest.clear()
+    return merged
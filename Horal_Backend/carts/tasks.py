@@ -1,33 +1,35 @@
 from celery import shared_task
-from django.utils import timezone
-from datetime import timedelta
-from .models import Cart
-from .signals import cart_abandoned
+from smtplib import SMTPException
+from .reminder_utils import send_abandoned_cart_reminders, send_reminder_batch
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 @shared_task
 def check_abandoned_carts():
     """
-    Sends reminders for abandoned carts at 1h, 12h, and 48h.
+    Sends reminders for abandoned carts at 2h, 24h, and 48h.
+    Due carts are queued in small batches of ids, see send_cart_reminders_task
     """
-    now = timezone.now()
-
-    reminder_windows = {
-        "2h": (now - timedelta(hours=4), now - timedelta(hours=2)),
-        "24h": (now - timedelta(hours=26), now - timedelta(hours=24)),
-        "48h": (now - timedelta(hours=50), now - timedelta(hours=48)),
-    }
+    return send_abandoned_cart_reminders()
 
-    for label, (start, end) in reminder_windows.items():
-        carts = Cart.objects.filter(
-            updated_at__gte=start,
-            updated_at__lt=end
-        ).exclude(**{f"reminder_{label}_sent": True})
 
-        for cart in carts:
-            cart_abandoned.send(sender=Cart, cart=cart, reminder=label)
-            setattr(cart, f"reminder_{label}_sent", True)
-            cart.save(update_fields=[f"reminder_{label}_sent"])
+@shared_task(
+    bind=True,
+    autoretry_for=(SMTPException, OSError),
+    retry_backoff=60,
+    max_retries=5,
+    default_retry_delay=10*60,
+)
+def send_cart_reminders_task(self, cart_ids, label):
+    """
+    Send one reminder per cart and flag the carts that got it.
+    Carts whose email failed stay unflagged and are retried on their own
+    """
+    sent, failed = send_reminder_batch(cart_ids, label)
 
-    
-    
\ No newline at end of file
+    if failed:
+        logger.warning(f"{len(failed)} abandoned cart reminders ({label}) failed, retrying")
+        raise self.retry(args=[[str(cart_id) for cart_id in failed], label])
+    return len(sent)
@@ -1,3 +1,174 @@
+import unittest
+import uuid
+from decimal import Decimal
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import ValidationError
+from categories.models import Category
+from products.models import GadgetProduct, ProductVariant
+from shops.models import Shop
+from subcategories.models import SubCategory
+from users.models import CustomUser
+from .models import Cart, CartItem
+from .stores import DatabaseCartStore, apply_cart_operations
+from .utils import merge_user_cart
 
-# Create your tests here.
+
+@unittest.skipUnless(connection.vendor == "postgresql", "Cart merge uses INSERT ... ON CONFLICT on Postgres")
+class MergeUserCartTests(TestCase):
+    """merge_user_cart: sum guest lines into the user's cart, capped at stock"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category, _ = Category.objects.get_or_create(name="gadget")
+        sub_category, _ = SubCategory.objects.get_or_create(category=category, name="Phones")
+        cls.shop = Shop.objects.create(owner_type=Shop.OwnerType.PLATFORM, name="merge-tests")
+        cls.product = GadgetProduct.objects.create(
+            shop=cls.shop, category=category, sub_category=sub_category, title="Merge phone",
+            description="Phone", price=Decimal("1000.00"), state="Lagos", local_govt="Ikeja", brand="Horal",
+        )
+        cls.content_type = ContentType.objects.get_for_model(GadgetProduct)
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(
+            email=f"merge-{uuid.uuid4().hex[:8]}@horal.ng", password="Pass12345!@"
+        )
+        self.session_key = uuid.uuid4().hex
+
+    def variant(self, stock, **options):
+        return ProductVariant.objects.create(
+            content_type=self.content_type, object_id=self.product.id,
+            shop=self.shop, stock_quantity=stock, **options,
+        )
+
+    def guest_cart(self, *lines):
+        cart = Cart.objects.create(session_key=self.session_key)
+        CartItem.objects.bulk_create([CartItem(cart=cart, variant=v, quantity=q) for v, q in lines])
+        return cart
+
+    def user_quantities(self):
+        return dict(CartItem.objects.filter(cart__user=self.user).values_list("variant_id", "quantity"))
+
+    def test_guest_lines_move_to_new_user_cart(self):
+        black, red = self.variant(10, color="black"), self.variant(10, color="red")
+        self.guest_cart((black, 2), (red, 3))
+
+        merge_user_cart(self.session_key, self.user)
+
+        self.assertEqual(self.user_quantities(), {black.id: 2, red.id: 3})
+        self.assertFalse(Cart.objects.filter(session_key=self.session_key, user__isnull=True).exists())
+
+    def test_overlapping_lines_are_summed_and_capped_at_stock(self):
+        black, red = self.variant(5, color="black"), self.variant(10, color="red")
+        user_cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=user_cart, variant=black, quantity=4)
+        CartItem.objects.create(cart=user_cart, variant=red, quantity=1)
+        self.guest_cart((black, 3), (red, 2))
+
+        merge_user_cart(self.session_key, self.user)
+
+        self.assertEqual(self.user_quantities(), {black.id: 5, red.id: 3})
+
+    def test_guest_quantity_above_stock_is_capped(self):
+        black = self.variant(2, color="black")
+        self.guest_cart((black, 7))
+
+        merge_user_cart(self.session_key, self.user)
+
+        self.assertEqual(self.user_quantities(), {black.id: 2})
+
+    def test_out_of_stock_guest_line_is_dropped_and_user_line_kept(self):
+        black, red = self.variant(0, color="black"), self.variant(0, color="red")
+        user_cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=user_cart, variant=black, quantity=1)
+        self.guest_cart((black, 2), (red, 1))
+
+        merge_user_cart(self.session_key, self.user)
+
+        self.assertEqual(self.user_quantities(), {black.id: 1})
+
+    def test_missing_guest_cart_is_a_no_op(self):
+        merge_user_cart(self.session_key, self.user)
+        merge_user_cart(None, self.user)
+
+        self.assertFalse(Cart.objects.filter(user=self.user).exists())
+
+    def test_query_count_does_not_grow_with_cart_size(self):
+        colors = ["black", "silver", "red", "blue", "green"]
+        variants = [self.variant(10, color=color) for color in colors]
+
+        counts = []
+        for size in (1, len(variants)):
+            CustomUser.objects.filter(id=self.user.id).delete()
+            self.setUp()
+            self.guest_cart(*[(v, 1) for v in variants[:size]])
+            with CaptureQueriesContext(connection) as queries:
+                merge_user_cart(self.session_key, self.user)
+            counts.append(len(queries))
+            self.assertEqual(len(self.user_quantities()), size)
+
+        self.assertEqual(counts[0], counts[1])
+
+
+class BatchCartOperationTests(TestCase):
+    """apply_cart_operations: every operation is applied or none is"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category, _ = Category.objects.get_or_create(name="gadget")
+        sub_category, _ = SubCategory.objects.get_or_create(category=category, name="Phones")
+        shop = Shop.objects.create(owner_type=Shop.OwnerType.PLATFORM, name="batch-tests")
+        product = GadgetProduct.objects.create(
+            shop=shop, category=category, sub_category=sub_category, title="Batch phone",
+            description="Phone", price=Decimal("1000.00"), state="Lagos", local_govt="Ikeja", brand="Horal",
+        )
+        content_type = ContentType.objects.get_for_model(GadgetProduct)
+        cls.black, cls.red, cls.blue = [
+            ProductVariant.objects.create(
+                content_type=content_type, object_id=product.id, shop=shop, color=color, stock_quantity=stock,
+            )
+            for color, stock in (("black", 5), ("red", 3), ("blue", 2))
+        ]
+
+    def setUp(self):
+        self.cart = Cart.objects.create(session_key=uuid.uuid4().hex)
+        self.store = DatabaseCartStore(self.cart)
+        self.black_line = CartItem.objects.create(cart=self.cart, variant=self.black, quantity=1)
+        self.red_line = CartItem.objects.create(cart=self.cart, variant=self.red, quantity=2)
+
+    def quantities(self):
+        return dict(CartItem.objects.filter(cart=self.cart).values_list("variant_id", "quantity"))
+
+    def test_operations_are_applied_in_order(self):
+        apply_cart_operations(self.store, [
+            {"op": "update", "item": self.black_line.id, "quantity": 4},
+            {"op": "remove", "item": self.red_line.id},
+            {"op": "add", "variant": self.blue.id, "quantity": 2},
+            # Adding to an existing line caps at stock like a single add
+            {"op": "add", "variant": self.black.id, "quantity": 3},
+        ])
+
+        self.assertEqual(self.quantities(), {self.black.id: 5, self.blue.id: 2})
+
+    def test_one_failing_operation_leaves_the_cart_unchanged(self):
+        with self.assertRaises(ValidationError) as raised:
+            apply_cart_operations(self.store, [
+                {"op": "update", "item": self.black_line.id, "quantity": 2},
+                {"op": "add", "variant": self.blue.id, "quantity": 3},
+                {"op": "remove", "item": uuid.uuid4()},
+                {"op": "update", "item": self.red_line.id, "quantity": 4},
+            ])
+
+        self.assertEqual(set(raised.exception.detail["operations"]), {1, 2, 3})
+        self.assertEqual(self.quantities(), {self.black.id: 1, self.red.id: 2})
+
+    def test_line_removed_earlier_in_the_batch_is_not_found(self):
+        with self.assertRaises(ValidationError):
+            apply_cart_operations(self.store, [
+                {"op": "remove", "item": self.red_line.id},
+                {"op": "update", "item": self.red_line.id, "quantity": 1},
+            ])
+
+        self.assertEqual(self.quantities(), {self.black.id: 1, self.red.id: 2})
@@ -2,13 +2,14 @@ from django.urls import path
 from .views import (
     CartView, CartItemUpdateDeleteView, 
     CartItemCreateView,
-    CartDeleteView
+    CartDeleteView, CartBatchView
 )
 
 
 urlpatterns = [
     path('', CartView.as_view(), name='cart'),
     path('add/', CartItemCreateView.as_view(), name='add-to-cart'),
+    path('batch/', CartBatchView.as_view(), name='cart-batch'),
     path('item/<uuid:item_id>/', CartItemUpdateDeleteView.as_view(), name='cart-item-update-delete'),
     path('<uuid:cart_id>/', CartDeleteView.as_view(), name="delete-cart"),
 
@@ -1,34 +1,154 @@
+from django.db import connection, transaction
+from django.db.models import F, Sum, Count, Value, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
+from products.models import ProductIndex, ProductVariant
 from .models import Cart, CartItem
 
 
+PRICE_FIELD = DecimalField(max_digits=12, decimal_places=2)
+
+
+# Guest lines are summed into the user's lines and capped at the variant stock.
+# Lines for variants that are out of stock or gone are dropped, and an existing
+# user line is left as it is when its guest counterpart is dropped.
+# Rows are written in variant order, so concurrent merges lock in the same order
+MERGE_CART_LINES_SQL = """
+    INSERT INTO carts_cartitem (id, cart_id, variant_id, quantity)
+    SELECT gen_random_uuid(), %s, guest.variant_id, LEAST(guest.quantity, pv.stock_quantity)
+    FROM ({source}) AS guest (variant_id, quantity)
+    JOIN products_productvariant pv ON pv.id = guest.variant_id
+    WHERE guest.quantity > 0 AND pv.stock_quantity > 0
+    ORDER BY guest.variant_id
+    ON CONFLICT (cart_id, variant_id) DO UPDATE
+    SET quantity = LEAST(
+        carts_cartitem.quantity + EXCLUDED.quantity,
+        (SELECT stock_quantity FROM products_productvariant WHERE id = EXCLUDED.variant_id)
+    )
+"""
+
+
+def merge_cart_lines(cart_id, source, params):
+    """
+    Merge (variant_id, quantity) rows produced by the `source` SQL into a cart
+    with a single INSERT ... ON CONFLICT DO UPDATE. Returns the rows written
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(MERGE_CART_LINES_SQL.format(source=source), [cart_id, *params])
+        return cursor.rowcount
+
+
 def merge_user_cart(session_key, user):
     """
-    Function to merge anon user with auth user cart after login
+    Function to merge anon user with auth user cart after login.
+    The number of queries does not depend on the size of either cart
     """
     if not session_key:
         return
 
-    anonymous_cart = Cart.objects.filter(session_key=session_key).first()
+    from .stores import promote_guest_cart
+    promote_guest_cart(session_key, user)
+
+    anonymous_cart = Cart.objects.filter(session_key=session_key, user__isnull=True).first()
     if not anonymous_cart:
         return
     user_cart, _ = Cart.objects.get_or_create(user=user)
 
     # avoid self merge
-    if anonymous_cart.id  == user_cart.id:
+    if anonymous_cart.id == user_cart.id:
         return
-    for item in anonymous_cart.cart_item.all():
-        existing_item = CartItem.objects.filter(
-            cart=user_cart, variant=item.variant
-        ).first()
-
-        if existing_item:
-            existing_item.quantity += item.quantity
-            if existing_item.quantity > existing_item.variant.stock_quantity:
-                existing_item.quantity = existing_item.variant.stock_quantity
-            existing_item.save()
-        else:
-           item.cart = user_cart
-           item.save()
-
-    # clean up cart after merge
-    anonymous_cart.delete() 
+
+    with transaction.atomic():
+        merge_cart_lines(
+            user_cart.id,
+            "SELECT variant_id, quantity FROM carts_cartitem WHERE cart_id = %s AND variant_id IS NOT NULL",
+            [anonymous_cart.id],
+        )
+
+        # clean up cart after merge
+        anonymous_cart.delete()
+
+
+def cart_items_with_prices(cart):
+    """Cart items annotated with unit_price and line_total computed in SQL"""
+    return CartItem.objects.filter(cart=cart, variant__isnull=False).annotate(
+        unit_price=F('variant__effective_price'),
+    ).annotate(
+        line_total=ExpressionWrapper(F('unit_price') * F('quantity'), output_field=PRICE_FIELD),
+    )
+
+
+def get_cart_totals(cart):
+    """Total price and number of lines of a cart in one aggregate query"""
+    return cart_items_with_prices(cart).aggregate(
+        total_price=Coalesce(Sum('line_total'), Value(0), output_field=PRICE_FIELD),
+        total_item=Count('id'),
+    )
+
+
+def _stock_status(variant, quantity):
+    if variant.stock_quantity <= 0:
+        return "out_of_stock"
+    if variant.stock_quantity < quantity:
+        return "insufficient_stock"
+    return "in_stock"
+
+
+def variants_with_prices(variant_ids):
+    """Variants annotated with their unit_price, for carts that are not stored in the database"""
+    return ProductVariant.objects.filter(id__in=variant_ids).annotate(unit_price=F('effective_price'))
+
+
+def build_cart_lines(entries):
+    """
+    Compact cart lines from (item id, variant, quantity, unit price) tuples:
+    product summary, selected variant options, unit price and stock status.
+    Product summaries come from ProductIndex in one query
+    """
+    products = ProductIndex.objects.only(
+        'id', 'title', 'slug', 'image', 'category', 'price', 'shop_id', 'is_published'
+    ).in_bulk({variant.object_id for _, variant, _, _ in entries})
+
+    lines = []
+    for item_id, variant, quantity, unit_price in entries:
+        product = products.get(variant.object_id)
+
+        lines.append({
+            "id": item_id,
+            "variant": variant.id,
+            "quantity": quantity,
+            "unit_price": unit_price,
+            "item_total_price": unit_price * quantity if unit_price is not None else None,
+            "product": {
+                "id": product.id,
+                "title": product.title,
+                "slug": product.slug,
+                "image": product.image,
+                "category": product.category,
+                "price": product.price,
+                "shop": product.shop_id,
+                "is_published": product.is_published,
+            } if product else None,
+            "user_selected_variant": {
+                "id": str(variant.id),
+                "sku": variant.sku,
+                "color": variant.color,
+                "size": variant.size,
+                "custom_size_unit": variant.custom_size_unit,
+                "custom_size": variant.standard_size or variant.custom_size_value or None,
+                "stock_quantity": variant.stock_quantity,
+                "price_override": str(variant.price_override) if variant.price_override else None,
+                "stock_status": _stock_status(variant, quantity),
+            },
+        })
+    return lines
+
+
+def get_cart_lines(cart, item_ids=None):
+    """Compact lines of a database cart, two queries regardless of the number of lines"""
+    items = cart_items_with_prices(cart).select_related('variant').order_by('id')
+    if item_ids is not None:
+        items = items.filter(id__in=item_ids)
+
+    return build_cart_lines([
+        (item.id, item.variant, item.quantity, item.unit_price) for item in items
+    ])
@@ -3,14 +3,20 @@ from rest_framework.generics import GenericAPIView
 from rest_framework import status
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
-from .models import Cart, CartItem
-from .serializers import CartItemSerializer, CartSerializer, CartItemCreateSerializer
+from .models import Cart
+from .serializers import CartItemSerializer, CartSerializer, CartItemCreateSerializer, CartBatchSerializer
 from products.utils import BaseResponseMixin
 from .authentication import SessionOrAnonymousAuthentication
+from .stores import get_cart_store, apply_cart_operations, RedisCartStore
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def expands_product(request):
+    """`?expand=product` returns the full product payload on every cart line"""
+    return "product" in request.query_params.get("expand", "").split(",")
+
 # Create your views here.
 class CartView(GenericAPIView, BaseResponseMixin):
     """Handle the cart view endpoint for both authenticated and anonymous users"""
@@ -18,42 +24,13 @@ class CartView(GenericAPIView, BaseResponseMixin):
     permission_classes = [AllowAny]
     authentication_classes = [SessionOrAnonymousAuthentication]
 
-    def get_cart(self, request):
-        """Get or create a cart based on user authentication status"""
-        try:
-            if request.user.is_authenticated:
-                cart, _ = Cart.objects.get_or_create(user=request.user)
-                    
-                return cart
-            else:
-                # Create cart for anonymous users using session key
-                session_key = request.session.session_key
-                if not session_key:
-                    request.session.save() # Create a session if one doesn't exist
-                    session_key = request.session.session_key
-
-                cart, _ = Cart.objects.get_or_create(session_key=session_key)
-
-                return cart
-        except Exception as e:
-            logger.error(f"Error retrieving cart: {str(e)}")
-
-            # Create a new cart as fallback
-            if request.user.is_authenticated:
-                return Cart.objects.create(user=request.user)
-            else:
-                request.session.save()
-                return Cart.objects.create(session_key=request.session.session_key)
-    
-
     def get(self, request, *args, **kwargs):
         """Get or create a cart for a user or anonymous visitor"""
-        cart = self.get_cart(request)
-        serializer = self.get_serializer(cart)
+        store = get_cart_store(request, create=False)
         return self.get_response(
             status.HTTP_200_OK,
             "Cart retrieved successfully",
-            serializer.data
+            store.serialize(expand_product=expands_product(request))
         )
     
 
@@ -66,25 +43,25 @@ class CartDeleteView(GenericAPIView, BaseResponseMixin):
         authentication_classes = [SessionOrAnonymousAuthentication]
 
 
-        def get_cart(self, request):
-            """Get or create a cart based on user authentication status"""
-            cart_view = CartView()
-            return cart_view.get_cart(request)
-
         def delete(self, request, cart_id):
             """
             Method to delete a cart
             """
-            # cart = self.get_cart(request)
-            user_cart = get_object_or_404(Cart, id=cart_id)
-
-            if not user_cart:
-                return self.get_response(
-                    status.HTTP_404_NOT_FOUND,
-                    "User cart not found"
-                )
-            
-            user_cart.delete()
+            store = get_cart_store(request, create=False)
+
+            # Guest carts kept in Redis have no row to look up
+            if isinstance(store, RedisCartStore) and str(store.id) == str(cart_id):
+                store.clear()
+            else:
+                user_cart = get_object_or_404(Cart, id=cart_id)
+
+                if not user_cart:
+                    return self.get_response(
+                        status.HTTP_404_NOT_FOUND,
+                        "User cart not found"
+                    )
+                
+                user_cart.delete()
             return Response({
                 "status": "success",
                 "status_code": status.HTTP_204_NO_CONTENT,
@@ -99,33 +76,25 @@ class CartItemCreateView(GenericAPIView, BaseResponseMixin):
     permission_classes = [AllowAny]
     authentication_classes = [SessionOrAnonymousAuthentication]
 
-    def get_cart(self, request):
-        """Get or create a cart based on user authentication status"""
-        cart_view = CartView()
-        return cart_view.get_cart(request)
-    
-
     def post(self, request, *args, **kwargs):
         """
         Post method to handle product addition inside the cart
         """
         # Make sure we are using the correct cart
-        cart = self.get_cart(request)
+        store = get_cart_store(request)
 
-        # Add cart to the context so serializer can use it
+        # Add the cart store to the context so serializer can use it
         serializer = self.get_serializer(data=request.data, context={
             'request': request,
-            'cart': cart
+            'store': store
         })
         serializer.is_valid(raise_exception=True)
-        cart_item = serializer.save()
-
-        response_serializer = CartItemSerializer(cart_item)
+        item_id = serializer.save()
 
         return self.get_response(
             status.HTTP_201_CREATED,
             "Item added to cart successfully",
-            response_serializer.data
+            store.line(item_id, expand_product=expands_product(request))
         )
 
 
@@ -135,28 +104,12 @@ class CartItemUpdateDeleteView(GenericAPIView, BaseResponseMixin):
     permission_classes = [AllowAny]
     authentication_classes = [SessionOrAnonymousAuthentication]
 
-
-    def get_cart(self, request):
-        """Get current cart"""
-        cart_view = CartView()
-        return cart_view.get_cart(request)
-    
-
-    def get_cart_item(self, request, item_id):
-        """Get cart item based on autehntication status"""
-        try:
-            cart = self.get_cart(request)
-            return get_object_or_404(CartItem, id=item_id, cart=cart)
-        except Exception as e:
-            logger.error(f"Error getting cart item for update: {str(e)}")
-            return None
-        
-
     def put(self, request, item_id, *args, **kwargs):
         """Update quantity of an item in the cart"""
-        cart_item = self.get_cart_item(request, item_id)
+        store = get_cart_store(request, create=False)
+        variant = store.get_variant(item_id)
 
-        if not cart_item:
+        if not variant:
             return self.get_response(
                 status.HTTP_404_NOT_FOUND,
                 "Cart item not found",
@@ -170,34 +123,51 @@ class CartItemUpdateDeleteView(GenericAPIView, BaseResponseMixin):
                 "Quantity must be greater than 0",
             )
         
-        if quantity > cart_item.variant.stock_quantity:
+        if quantity > variant.stock_quantity:
             return self.get_response(
                 status.HTTP_400_BAD_REQUEST,
                 "Insufficient Stock",
             )
         
-        cart_item.quantity = quantity
-        cart_item.save()
-        serializer = self.get_serializer(cart_item)
+        store.set_quantity(item_id, quantity)
         return self.get_response(
             status.HTTP_200_OK,
             "Cart item updated",
-            serializer.data
+            store.line(item_id, expand_product=expands_product(request))
         )
     
 
     def delete(self, request, item_id, *args, **kwargs):
         """Remove item from the cart"""
-        cart_item = self.get_cart_item(request, item_id)
+        store = get_cart_store(request, create=False)
 
-        if not cart_item:
+        if not store.remove(item_id):
             return self.get_response(
                 status.HTTP_400_BAD_REQUEST,
                 "Cart item not found",
             )
-        cart_item.delete()
         return Response({
             "status": status.HTTP_204_NO_CONTENT,
             "message": "Cart item removed"
         })
-    
\ No newline at end of file
+
+
+class CartBatchView(GenericAPIView, BaseResponseMixin):
+    """Apply several cart changes in one request and return the cart once"""
+    serializer_class = CartBatchSerializer
+    permission_classes = [AllowAny]
+    authentication_classes = [SessionOrAnonymousAuthentication]
+
+    def post(self, request, *args, **kwargs):
+        """Apply an ordered list of add/update/remove operations atomically"""
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        store = get_cart_store(request)
+        apply_cart_operations(store, serializer.validated_data["operations"])
+
+        return self.get_response(
+            status.HTTP_200_OK,
+            "Cart updated successfully",
+            store.serialize(expand_product=expands_product(request))
+        )
@@ -1,3 +1,26 @@
 from django.contrib import admin
+from .models import ShippingRate
+from .rate_utils import bump_rate_card_version
 
 # Register your models here.
+
+
+@admin.register(ShippingRate)
+class ShippingRateAdmin(admin.ModelAdmin):
+    list_display = ("origin_state", "destination_state", "max_weight_kg", "service", "price", "live_price", "source")
+    list_filter = ("service", "source")
+    search_fields = ("origin_state", "destination_state")
+
+    # Rates edited here are admin rates, the sync task only checks them for drift
+    def save_model(self, request, obj, form, change):
+        obj.source = ShippingRate.Source.IMPORT
+        super().save_model(request, obj, form, change)
+        bump_rate_card_version()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        bump_rate_card_version()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        bump_rate_card_version()
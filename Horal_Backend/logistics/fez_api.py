@@ -107,12 +107,12 @@ class FEZDeliveryAPI:
         }
     
 
-    def get_price(self, payload):
+    def get_price(self, payload, timeout=15):
         """Get delivery price for shipments order"""
         try:
             url = f"{BASE_URL}/order/cost"
             res = requests.post(
-                url, json=payload, headers=self._headers(), timeout=15
+                url, json=payload, headers=self._headers(), timeout=timeout
             )
             res.raise_for_status()
             return res.json()
@@ -221,11 +221,11 @@ class FEZDeliveryAPI:
             return {"error": str(e), "details": res.text}
         
 
-    def estimate_delivery_time(self, payload):
+    def estimate_delivery_time(self, payload, timeout=15):
         """Return estimated delivery time for an order"""
         try:
             url = f"{BASE_URL}/delivery-time-estimate"
-            res = requests.post(url, json=payload, headers=self._headers(), timeout=15)
+            res = requests.post(url, json=payload, headers=self._headers(), timeout=timeout)
             res.raise_for_status()
             
             return res.json()
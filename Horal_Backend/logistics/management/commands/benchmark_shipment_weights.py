@@ -0,0 +1,153 @@
+import io
+import json
+import math
+import time
+import uuid
+from collections import defaultdict
+from django.core.exceptions import ObjectDoesNotExist
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Q
+from django.test.utils import CaptureQueriesContext
+from logistics.models import Logistics
+from logistics.utils import group_order_items_by_seller
+from orders.models import Order, OrderItem
+from products.import_utils import run_product_import
+from products.models import ProductBulkJob, ProductVariant
+from products.utils import CATEGORY_MODEL_MAP
+from sellers.models import SellerKYC
+from shops.models import Shop
+from subcategories.models import SubCategory
+from users.models import CustomUser
+
+# Product level in kg, product level in grams, variant level in grams
+LOGISTICS = [
+    {"logistics": {"weight_measurement": "KG", "total_weight": "2.50"}},
+    {"logistics": {"weight_measurement": "G", "total_weight": "450.00"}},
+    {"variant_logistics": {"weight_measurement": "G", "total_weight": "800.00"}},
+]
+
+
+def legacy_weight_kg(item, default_kg=1.0):
+    """The previous weighting: two logistics lookups per item"""
+    try:
+        logistics = Logistics.objects.get(product_variant=item.variant)
+    except ObjectDoesNotExist:
+        try:
+            logistics = Logistics.objects.get(object_id=item.variant.object_id)
+        except ObjectDoesNotExist:
+            logistics = None
+
+    quantity = getattr(item, "quantity", 1)
+    if not logistics or not logistics.weight_measurement or not logistics.total_weight:
+        return default_kg * quantity
+    conversion_to_kg = {"g": 0.001, "kg": 1}
+    return math.ceil(float(logistics.total_weight) * quantity * conversion_to_kg[logistics.weight_measurement.lower()])
+
+
+def legacy_group(order):
+    """The previous grouping: a seller lookup and a weight lookup per item"""
+    seller_orders = defaultdict(lambda: {"items": [], "station": None, "weight": 0.0, "seller": None})
+    for item in order.order_items.all():
+        seller = SellerKYC.objects.get(user=item.variant.shop.owner.user)
+        seller_orders[seller]["items"].append(item)
+        seller_orders[seller]["weight"] += legacy_weight_kg(item)
+        seller_orders[seller]["seller"] = seller
+    return seller_orders
+
+
+class Command(BaseCommand):
+    help = "Compare per-item logistics lookups with precomputed variant weights when grouping an order into shipments"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=50, help="Order items")
+        parser.add_argument("--sellers", type=int, default=3)
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def seed(self, shop, sub_category, count):
+        lines = []
+        for n in range(count):
+            logistics = LOGISTICS[n % len(LOGISTICS)]
+            variant = {"color": "black", "stock_quantity": 50}
+            if "variant_logistics" in logistics:
+                variant["logistics"] = logistics["variant_logistics"]
+            lines.append(json.dumps({
+                "category": sub_category.category.name,
+                "sub_category": sub_category.name,
+                "title": f"Weight bench {shop.name} {n}",
+                "description": "Synthetic product used for shipment weight benchmarking",
+                "price": "2500.00", "state": "Lagos", "local_govt": "Ikeja",
+                "is_published": True,
+                "images": [{"url": f"https://cdn.horal.ng/bench/{n}.jpg"}],
+                "variants": [variant],
+                **({"logistics": logistics["logistics"]} if "logistics" in logistics else {}),
+            }))
+        job = ProductBulkJob.objects.create(kind=ProductBulkJob.Kind.IMPORT, shop=shop)
+        job = run_product_import(job, io.BytesIO("\n".join(lines).encode()), "jsonl")
+        if job.failed:
+            raise CommandError(f"Seeding failed: {job.errors[:3]}")
+        return list(ProductVariant.objects.filter(shop=shop).order_by("sku"))
+
+    def measure(self, label, func, order, repeat):
+        best, query_count, grouped = None, 0, None
+        for _ in range(repeat):
+            # A fresh instance so nothing is cached between runs
+            order = Order.objects.get(pk=order.pk)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                grouped = func(order)
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            query_count = len(queries)
+        self.stdout.write(f"{label:<10} {query_count:>9} {best * 1000:>10.1f}")
+        return {seller.pk: data["weight"] for seller, data in grouped.items()}
+
+    def handle(self, *args, **options):
+        sub_category = SubCategory.objects.select_related("category").filter(
+            category__name__in=list(CATEGORY_MODEL_MAP)
+        ).first()
+        if not sub_category:
+            raise CommandError("Create at least one category with a sub category first")
+
+        tag = uuid.uuid4().hex[:8]
+        users = [
+            CustomUser.objects.create_user(
+                email=f"weight-benchmark-{tag}-{n}@horal.ng", password=uuid.uuid4().hex + "!A1", is_active=True,
+            )
+            for n in range(options["sellers"] + 1)
+        ]
+        buyer, seller_users = users[0], users[1:]
+        shops = [
+            Shop.objects.create(owner=SellerKYC.objects.create(user=user), name=f"weight-benchmark-{tag}-{n}")
+            for n, user in enumerate(seller_users)
+        ]
+
+        try:
+            per_shop = math.ceil(options["items"] / len(shops))
+            variants = [variant for shop in shops for variant in self.seed(shop, sub_category, per_shop)]
+            variants = variants[:options["items"]]
+            # Some products lose their logistics and fall back to the default weight
+            dropped = variants[3::7]
+            Logistics.objects.filter(
+                Q(object_id__in=[v.object_id for v in dropped]) | Q(product_variant__in=dropped)
+            ).delete()
+
+            order = Order.objects.create(user=buyer)
+            OrderItem.objects.bulk_create([
+                OrderItem(order=order, variant=variant, quantity=1 + n % 4, unit_price=2500)
+                for n, variant in enumerate(variants)
+            ])
+
+            self.stdout.write(f"{len(variants)} items from {len(shops)} sellers")
+            self.stdout.write(f"{'path':<10} {'queries':>9} {'best ms':>10}")
+            legacy = self.measure("legacy", legacy_group, order, options["repeat"])
+            current = self.measure("current", group_order_items_by_seller, order, options["repeat"])
+            if legacy != current:
+                raise CommandError(f"Shipment weights differ: legacy {legacy}, current {current}")
+            self.stdout.write(self.style.SUCCESS(f"Shipment weights match: {sorted(current.values())}"))
+        finally:
+            self.stdout.write("Cleaning up benchmark data...")
+            for shop in shops:
+                shop.delete()
+            for user in users:
+                user.delete()
@@ -0,0 +1,132 @@
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from logistics import fez_api
+from logistics.fez_api import FEZDeliveryAPI
+from logistics.quote_utils import get_shipping_quotes, quote_key, run_concurrently
+
+STATES = ["Lagos", "Oyo", "Ogun", "Kano", "Kaduna", "Rivers", "Enugu", "Edo", "Delta", "Abia",
+          "Anambra", "Imo", "Kwara", "Osun", "Ondo", "Ekiti", "Plateau", "Benue", "Niger", "Sokoto"]
+
+
+class StubFEZDeliveryAPI(FEZDeliveryAPI):
+    """Talks to the local stub without touching the cached FEZ token"""
+
+    def __init__(self):
+        self.authtoken, self.secret_key = "stub", "stub"
+
+
+def stub_handler(latency, jitter):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])) or b"{}")
+            pickup = payload.get("pickUpState") or payload.get("pick_up_state") or ""
+            if pickup == "Slow":
+                time.sleep(30)
+            time.sleep(latency + random.uniform(0, jitter))
+
+            if pickup == "Fail":
+                code, body = 500, {"status": "Error", "description": "Injected failure"}
+            elif self.path.endswith("/order/cost"):
+                code, body = 200, {"status": "Success", "Cost": {"state": payload["state"], "cost": 2500}}
+            else:
+                code, body = 200, {"status": "Success", "data": {"eta": "2 - 3 days"}}
+
+            content = json.dumps(body).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class Command(BaseCommand):
+    help = "Compare sequential and concurrent FEZ pricing and ETA calls against a local stub with injected latency"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--latency-ms", type=int, default=300, help="Stub latency per call")
+        parser.add_argument("--jitter-ms", type=int, default=100)
+        parser.add_argument("--sellers", default="1,3,5,10,20", help="Comma separated seller counts")
+        parser.add_argument("--budget", type=float, default=2.0, help="Checkout budget for the partial failure run")
+
+    def payloads(self, count):
+        return [
+            {"state": "Lagos", "pickUpState": STATES[n % len(STATES)], "weight": 1 + n // len(STATES)}
+            for n in range(count)
+        ]
+
+    def handle(self, *args, **options):
+        server = ThreadingHTTPServer(
+            ("127.0.0.1", 0), stub_handler(options["latency_ms"] / 1000, options["jitter_ms"] / 1000)
+        )
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = fez_api.BASE_URL
+        fez_api.BASE_URL = f"http://127.0.0.1:{server.server_port}"
+        api = StubFEZDeliveryAPI()
+        # A throwaway service name keeps benchmark quotes apart from real cache entries
+        service = f"bench-{uuid.uuid4().hex[:8]}"
+        used_keys = []
+
+        def concurrent_quotes(payloads, budget=None):
+            used_keys.extend(quote_key(p["pickUpState"], p["state"], p["weight"], service) for p in payloads)
+            return get_shipping_quotes(payloads, lambda: api, service=service, budget=budget)
+
+        def timed(func):
+            start = time.perf_counter()
+            result = func()
+            return result, (time.perf_counter() - start) * 1000
+
+        try:
+            self.stdout.write(f"Stub latency {options['latency_ms']}ms (+ up to {options['jitter_ms']}ms jitter)")
+            self.stdout.write(
+                f"{'sellers':>7} {'price seq ms':>13} {'price conc ms':>14} {'cached ms':>10} "
+                f"{'eta seq ms':>11} {'eta conc ms':>12}"
+            )
+            for count in [int(n) for n in options["sellers"].split(",")]:
+                payloads = self.payloads(count)
+                eta_payloads = {
+                    n: {"delivery_type": "local", "pick_up_state": p["pickUpState"], "drop_off_state": p["state"]}
+                    for n, p in enumerate(payloads)
+                }
+
+                _, price_seq = timed(lambda: [api.get_price(p) for p in payloads])
+                prices, price_conc = timed(lambda: concurrent_quotes(payloads))
+                _, cached = timed(lambda: concurrent_quotes(payloads))
+                _, eta_seq = timed(lambda: [api.estimate_delivery_time(p) for p in eta_payloads.values()])
+                _, eta_conc = timed(lambda: run_concurrently(
+                    lambda _, p: api.estimate_delivery_time(p, timeout=5), eta_payloads
+                ))
+                assert all(price == 2500 for price in prices), prices
+
+                self.stdout.write(
+                    f"{count:>7} {price_seq:>13.0f} {price_conc:>14.0f} {cached:>10.1f} "
+                    f"{eta_seq:>11.0f} {eta_conc:>12.0f}"
+                )
+
+            # Partial failure: one route errors, one hangs past the budget
+            payloads = self.payloads(5) + [
+                {"state": "Lagos", "pickUpState": "Fail", "weight": 1},
+                {"state": "Lagos", "pickUpState": "Slow", "weight": 1},
+            ]
+            results, elapsed = timed(lambda: concurrent_quotes(payloads, budget=options["budget"]))
+            failed = [str(result) for result in results if isinstance(result, Exception)]
+            self.stdout.write(
+                f"Partial failure with a {options['budget']}s budget: {len(results) - len(failed)} priced, "
+                f"{len(failed)} failed in {elapsed:.0f}ms"
+            )
+            for message in failed:
+                self.stdout.write(f"  {message}")
+        finally:
+            fez_api.BASE_URL = base_url
+            cache.delete_many(used_keys)
+            server.shutdown()
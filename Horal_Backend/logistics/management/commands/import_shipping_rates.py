@@ -0,0 +1,27 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from logistics.rate_utils import import_shipping_rates
+
+
+class Command(BaseCommand):
+    help = (
+        "Import rate card bands from a CSV with origin_state, destination_state, "
+        "max_weight_kg, price and an optional service column"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("file")
+
+    def handle(self, *args, **options):
+        with open(options["file"], newline="") as fileobj:
+            rows = list(csv.DictReader(fileobj))
+
+        required = {"origin_state", "destination_state", "max_weight_kg", "price"}
+        if not rows or not required.issubset(rows[0]):
+            raise CommandError(f"The CSV needs the columns: {', '.join(sorted(required))}")
+
+        try:
+            written = import_shipping_rates(rows)
+        except (ValueError, ArithmeticError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"{written} rate card bands imported"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from logistics.quote_utils import shipping_quote_stats
+
+
+class Command(BaseCommand):
+    help = "Report the shipping quote cache hit ratio and the FEZ latency it saved"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Zero the counters after reporting")
+
+    def handle(self, *args, **options):
+        stats = shipping_quote_stats(reset=options["reset"])
+        for name, value in stats.items():
+            self.stdout.write(f"{name:<18} {value}")
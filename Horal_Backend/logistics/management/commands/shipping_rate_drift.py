@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+from logistics.fez_api import FEZDeliveryAPI
+from logistics.models import ShippingRate
+from logistics.rate_utils import refresh_shipping_rates
+
+
+class Command(BaseCommand):
+    help = "Compare rate card prices with live FEZ quotes and list the bands that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threshold", type=float, default=5, help="Report bands drifting by at least this %%")
+        parser.add_argument("--source", choices=ShippingRate.Source.values)
+        parser.add_argument("--update", action="store_true", help="Also move FEZ learned bands to the live price")
+
+    def handle(self, *args, **options):
+        queryset = ShippingRate.objects.all()
+        if options["source"]:
+            queryset = queryset.filter(source=options["source"])
+
+        report = refresh_shipping_rates(
+            FEZDeliveryAPI, update=options["update"], queryset=queryset, threshold_pct=options["threshold"]
+        )
+
+        self.stdout.write(
+            f"{report['checked']} bands checked, {report['failed']} failed, {report['updated']} updated; "
+            f"drift mean {report['mean_drift_pct']}%, max {report['max_drift_pct']}%"
+        )
+        for row in report["drifted"]:
+            self.stdout.write(
+                f"  {row['route']:<30} {row['max_weight_kg']:>4}KG {row['service']:<10} {row['source']:<7} "
+                f"card {row['card_price']:>10} live {row['live_price']:>10} ({row['drift_pct']:+}%)"
+            )
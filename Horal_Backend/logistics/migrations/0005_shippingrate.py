@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-19 10:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0004_delete_giglexperiencecentre_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShippingRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('service', models.CharField(default='standard', max_length=30)),
+                ('origin_state', models.CharField(max_length=50)),
+                ('destination_state', models.CharField(max_length=50)),
+                ('max_weight_kg', models.PositiveIntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('source', models.CharField(choices=[('fez', 'FEZ'), ('import', 'Import')], default='fez', max_length=10)),
+                ('live_price', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('live_checked_at', models.DateTimeField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('service', 'origin_state', 'destination_state', 'max_weight_kg'), name='unique_shipping_rate_band')],
+            },
+        ),
+    ]
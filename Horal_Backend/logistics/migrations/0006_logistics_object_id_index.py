@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('logistics', '0005_shippingrate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='logistics',
+            index=models.Index(fields=['object_id', 'content_type'], name='logistics_l_object__1405db_idx'),
+        ),
+    ]
@@ -22,8 +22,54 @@ class Logistics(models.Model):
 
     weight_measurement = models.CharField(max_length=10, choices=LogisticSizeUnit.choices)
     total_weight = models.DecimalField(max_digits=5, decimal_places=2)
-    
+
+    class Meta:
+        indexes = [
+            # Product-level lookups by object_id alone or with content_type
+            models.Index(fields=["object_id", "content_type"]),
+        ]
 
     def __str__(self):
         target = self.product_variant or self.product
         return f"{target} - {self.total_weight}{self.weight_measurement}"
+
+
+class ShippingRate(models.Model):
+    """
+    Rate card entry: price of a parcel of up to max_weight_kg between two states,
+    evaluated in-process at checkout instead of asking FEZ
+    """
+    class Source(models.TextChoices):
+        FEZ = "fez", "FEZ"  # learned from a live quote, refreshed by the sync task
+        IMPORT = "import", "Import"  # set by an admin, only checked for drift
+
+    service = models.CharField(max_length=30, default="standard")
+    # Normalized by quote_utils (lower case, Abuja as fct)
+    origin_state = models.CharField(max_length=50)
+    destination_state = models.CharField(max_length=50)
+    max_weight_kg = models.PositiveIntegerField()
+    price = models.DecimalField(max_digits=12, decimal_places=2)
+    source = models.CharField(max_length=10, choices=Source.choices, default=Source.FEZ)
+
+    # Last live FEZ price seen for the route, for drift reports
+    live_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    live_checked_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['service', 'origin_state', 'destination_state', 'max_weight_kg'],
+                name='unique_shipping_rate_band'
+            )
+        ]
+
+    def save(self, *args, **kwargs):
+        from .quote_utils import normalize_state
+
+        self.origin_state = normalize_state(self.origin_state)
+        self.destination_state = normalize_state(self.destination_state)
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.origin_state} -> {self.destination_state} up to {self.max_weight_kg}KG: {self.price}"
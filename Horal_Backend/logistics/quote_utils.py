@@ -0,0 +1,199 @@
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from decimal import Decimal, InvalidOperation
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django_redis import get_redis_connection
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+QUOTE_KEY_PREFIX = "shipping:quote"
+STATS_KEY = "shipping:quote:stats"
+# Cached in place of a price when the provider failed, so retries do not hammer it
+NEGATIVE = "error"
+DEFAULT_SERVICE = "standard"
+
+
+def normalize_state(state):
+    """Case and whitespace folded state name, Abuja and FCT are the same zone"""
+    state = " ".join(str(state or "").split()).lower()
+    return "fct" if state in ("abuja", "fct", "federal capital territory") else state
+
+
+def weight_bucket(weight_kg):
+    """Round a weight up to the quote bucket, the price for the bucket is quoted and cached"""
+    bucket = settings.SHIPPING_QUOTE_WEIGHT_BUCKET_KG
+    return max(math.ceil(float(weight_kg) / bucket), 1) * bucket
+
+
+def quote_key(origin_state, destination_state, weight_kg, service=DEFAULT_SERVICE):
+    return (
+        f"{QUOTE_KEY_PREFIX}:{service}:{normalize_state(origin_state)}:"
+        f"{normalize_state(destination_state)}:{weight_bucket(weight_kg)}"
+    )
+
+
+def record_stat(field, amount=1):
+    try:
+        redis = get_redis_connection("default")
+        if isinstance(amount, float):
+            redis.hincrbyfloat(STATS_KEY, field, amount)
+        else:
+            redis.hincrby(STATS_KEY, field, amount)
+    except Exception as e:
+        logger.warning(f"Could not record shipping quote stats: {e}")
+
+
+def fez_state(state):
+    """State name as FEZ spells it, from a normalized one"""
+    return "FCT" if state == "fct" else state.title()
+
+
+def parse_price(result):
+    """Delivery price from a FEZ /order/cost reply, None when it has no usable price"""
+    if not isinstance(result, dict) or str(result.get("status", "")).lower() != "success":
+        return None
+    cost = result.get("Cost") or {}
+    try:
+        price = Decimal(str(cost.get("cost")))
+    except (InvalidOperation, AttributeError):
+        return None
+    return price if price > 0 else None
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=settings.FEZ_MAX_CONCURRENCY, thread_name_prefix="fez")
+    return _pool
+
+
+def run_concurrently(func, items, budget=None):
+    """
+    Call func(key, value) for every item of the `items` dict on the FEZ thread
+    pool and return {key: result or exception}. Calls still running after
+    `budget` seconds (FEZ_CHECKOUT_BUDGET) get a TimeoutError; their threads
+    finish on their own within FEZ_CALL_TIMEOUT. func must not use the database
+    """
+    budget = settings.FEZ_CHECKOUT_BUDGET if budget is None else budget
+    futures = {_executor().submit(func, key, value): key for key, value in items.items()}
+    _, not_done = wait(futures, timeout=budget)
+
+    results = {}
+    for future, key in futures.items():
+        if future in not_done:
+            future.cancel()
+            results[key] = TimeoutError(f"No answer within the {budget}s budget")
+        elif future.exception() is not None:
+            results[key] = future.exception()
+        else:
+            results[key] = future.result()
+    return results
+
+
+def fetch_quote(api, key, payload):
+    """Ask FEZ for one route and cache the answer, a failure is cached as NEGATIVE"""
+    start = time.perf_counter()
+    try:
+        result = api.get_price(
+            {**payload, "weight": weight_bucket(payload["weight"])}, timeout=settings.FEZ_CALL_TIMEOUT
+        )
+    except Exception as e:
+        logger.error(f"FEZ price request failed for {key}: {e}")
+        result = None
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    record_stat("misses")
+    record_stat("miss_ms", elapsed_ms)
+
+    price = parse_price(result)
+    if price is None:
+        record_stat("errors")
+        logger.error(f"No valid shipping price returned for {key}. Result: {result}")
+        cache.set(key, NEGATIVE, timeout=settings.SHIPPING_QUOTE_ERROR_TTL)
+        raise ValidationError("Could not retrieve shipping price for this route")
+
+    cache.set(key, str(price), timeout=settings.SHIPPING_QUOTE_TTL)
+    return price
+
+
+def get_shipping_quotes(payloads, get_api, service=DEFAULT_SERVICE, budget=None):
+    """
+    Prices for FEZ price payloads ({"state", "pickUpState", "weight"}), as a
+    list aligned with `payloads` holding a Decimal or the ValidationError of
+    that route. Cached routes are read with one cache round trip, shipments
+    sharing a route are quoted once and the rest are fetched concurrently.
+    `get_api` returns a FEZDeliveryAPI and is only called on a miss, so fully
+    cached checkouts never authenticate
+    """
+    keys = [
+        quote_key(payload["pickUpState"], payload["state"], payload["weight"], service)
+        for payload in payloads
+    ]
+    cached = cache.get_many(keys)
+
+    results, misses = {}, {}
+    for key, payload in zip(keys, payloads):
+        if key in results or key in misses:
+            continue
+        if cached.get(key) == NEGATIVE:
+            record_stat("negative_hits")
+            results[key] = ValidationError(
+                "Shipping price is temporarily unavailable for this route, please try again shortly"
+            )
+        elif key in cached:
+            record_stat("hits")
+            results[key] = Decimal(cached[key])
+        else:
+            misses[key] = payload
+
+    if misses:
+        api = get_api()
+        for key, result in run_concurrently(partial(fetch_quote, api), misses, budget).items():
+            if isinstance(result, TimeoutError):
+                record_stat("errors")
+                logger.error(f"FEZ price for {key} missed the checkout budget")
+                result = ValidationError("Shipping provider did not answer in time, please try again")
+            elif isinstance(result, Exception) and not isinstance(result, ValidationError):
+                result = ValidationError(f"Could not retrieve shipping price for this route: {result}")
+            results[key] = result
+
+    return [results[key] for key in keys]
+
+
+def shipping_quote_stats(reset=False):
+    """Hit ratio and the provider latency the cache saved since the last reset"""
+    redis = get_redis_connection("default")
+    raw = redis.hgetall(STATS_KEY)
+    if reset:
+        redis.delete(STATS_KEY)
+    stats = {key.decode(): float(value) for key, value in raw.items()}
+
+    card_hits, hits, misses = (int(stats.get(field, 0)) for field in ("card_hits", "hits", "misses"))
+    negative_hits = int(stats.get("negative_hits", 0))
+    served = card_hits + hits + negative_hits
+    lookups = served + misses
+    average_miss_ms = stats.get("miss_ms", 0) / misses if misses else 0
+
+    return {
+        "lookups": lookups,
+        "card_hits": card_hits,
+        "hits": hits,
+        "negative_hits": negative_hits,
+        "misses": misses,
+        "errors": int(stats.get("errors", 0)),
+        "hit_ratio": round(served / lookups, 4) if lookups else 0,
+        "average_miss_ms": round(average_miss_ms, 1),
+        # Every hit would otherwise have paid an average provider round trip
+        "latency_saved_ms": round(served * average_miss_ms, 1),
+    }
@@ -0,0 +1,209 @@
+import math
+import threading
+import uuid
+from collections import defaultdict
+from decimal import Decimal
+from functools import partial
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from .models import ShippingRate
+from .quote_utils import (
+    DEFAULT_SERVICE, fez_state, get_shipping_quotes, normalize_state,
+    parse_price, record_stat, run_concurrently, weight_bucket,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Bumped on every rate card write, processes reload their copy when it changes
+VERSION_KEY = "shipping:rates:version"
+SYNC_BATCH_SIZE = 200
+
+_card = {"version": None, "bands": {}}
+_card_lock = threading.Lock()
+
+
+def bump_rate_card_version():
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def rate_card():
+    """
+    {(service, origin, destination): [(max_weight_kg, price, source)] by weight},
+    loaded once per process and reloaded when the card version changes
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        bump_rate_card_version()
+        version = cache.get(VERSION_KEY)
+
+    with _card_lock:
+        if _card["version"] != version:
+            bands = defaultdict(list)
+            for service, origin, destination, max_weight_kg, price, source in ShippingRate.objects.values_list(
+                'service', 'origin_state', 'destination_state', 'max_weight_kg', 'price', 'source'
+            ).order_by('max_weight_kg'):
+                bands[(service, origin, destination)].append((max_weight_kg, price, source))
+            _card.update(version=version, bands=dict(bands))
+        return _card["bands"]
+
+
+def card_price(payload, card, service=DEFAULT_SERVICE):
+    """
+    Rate card price of a FEZ price payload, None for routes the card does not cover.
+    The smallest band that fits the weight applies; bands learned from FEZ
+    only price their own weight, so a lighter parcel is never overcharged
+    """
+    route = (service, normalize_state(payload["pickUpState"]), normalize_state(payload["state"]))
+    weight = weight_bucket(payload["weight"])
+    for max_weight_kg, price, source in card.get(route, ()):
+        if weight <= max_weight_kg:
+            if source == ShippingRate.Source.IMPORT or weight == max_weight_kg:
+                return price
+            return None
+    return None
+
+
+def learn_rates(quotes, service=DEFAULT_SERVICE):
+    """Add live (payload, price) quotes of unknown routes to the card"""
+    checked_at = timezone.now()
+    ShippingRate.objects.bulk_create([
+        ShippingRate(
+            service=service,
+            origin_state=normalize_state(payload["pickUpState"]),
+            destination_state=normalize_state(payload["state"]),
+            max_weight_kg=weight_bucket(payload["weight"]),
+            price=price,
+            live_price=price,
+            live_checked_at=checked_at,
+            source=ShippingRate.Source.FEZ,
+        )
+        for payload, price in quotes
+    ], ignore_conflicts=True)
+    bump_rate_card_version()
+
+
+def price_shipments(payloads, get_api, service=DEFAULT_SERVICE):
+    """
+    Prices for FEZ price payloads, aligned with `payloads` as a Decimal or the
+    ValidationError of that route. The rate card is evaluated in-process and
+    only routes it does not cover go to the live quote path; their prices are
+    then added to the card
+    """
+    card = rate_card()
+    prices = [card_price(payload, card, service) for payload in payloads]
+    unknown = [index for index, price in enumerate(prices) if price is None]
+    if len(unknown) < len(payloads):
+        record_stat("card_hits", len(payloads) - len(unknown))
+    if not unknown:
+        return prices
+
+    live = get_shipping_quotes([payloads[index] for index in unknown], get_api, service)
+    learned = []
+    for index, result in zip(unknown, live):
+        prices[index] = result
+        if not isinstance(result, Exception):
+            learned.append((payloads[index], result))
+    if learned:
+        try:
+            learn_rates(learned, service)
+        except Exception as e:
+            logger.warning(f"Could not add {len(learned)} live quotes to the rate card: {e}")
+    return prices
+
+
+def import_shipping_rates(rows, service=DEFAULT_SERVICE):
+    """
+    Upsert admin rate card rows (dicts with origin_state, destination_state,
+    max_weight_kg, price and optionally service). Imported bands are kept by
+    the sync task and only checked for drift. Returns the number of rows written
+    """
+    rates = {}
+    for row in rows:
+        rate = ShippingRate(
+            service=(row.get("service") or service).strip(),
+            origin_state=normalize_state(row["origin_state"]),
+            destination_state=normalize_state(row["destination_state"]),
+            max_weight_kg=int(row["max_weight_kg"]),
+            price=Decimal(str(row["price"])),
+            source=ShippingRate.Source.IMPORT,
+        )
+        if not rate.origin_state or not rate.destination_state or rate.max_weight_kg <= 0 or rate.price <= 0:
+            raise ValueError(f"Invalid rate card row: {row}")
+        # The last row wins for a band listed twice
+        rates[(rate.service, rate.origin_state, rate.destination_state, rate.max_weight_kg)] = rate
+
+    ShippingRate.objects.bulk_create(
+        rates.values(),
+        update_conflicts=True,
+        unique_fields=['service', 'origin_state', 'destination_state', 'max_weight_kg'],
+        update_fields=['price', 'source', 'updated_at'],
+    )
+    bump_rate_card_version()
+    return len(rates)
+
+
+def _fetch_live(api, _, rate):
+    return parse_price(api.get_price({
+        "state": fez_state(rate.destination_state),
+        "pickUpState": fez_state(rate.origin_state),
+        "weight": rate.max_weight_kg,
+    }, timeout=settings.FEZ_CALL_TIMEOUT))
+
+
+def refresh_shipping_rates(get_api, update=True, queryset=None, threshold_pct=5):
+    """
+    Ask FEZ for the live price of every rate card band, concurrently and in
+    batches, and record it as live_price. With `update`, bands learned from
+    FEZ take the live price; imported bands are never overwritten.
+    Returns a drift report comparing the card with live prices
+    """
+    api = get_api()
+    queryset = (queryset if queryset is not None else ShippingRate.objects.all()).order_by('id')
+    report = {"checked": 0, "failed": 0, "updated": 0, "drifted": []}
+    drifts = []
+
+    rates = list(queryset)
+    for start in range(0, len(rates), SYNC_BATCH_SIZE):
+        batch = rates[start:start + SYNC_BATCH_SIZE]
+        # Enough time for every wave of the pool to use its full per-call timeout
+        budget = settings.FEZ_CALL_TIMEOUT * math.ceil(len(batch) / settings.FEZ_MAX_CONCURRENCY) + 1
+        results = run_concurrently(partial(_fetch_live, api), {rate.id: rate for rate in batch}, budget)
+
+        checked_at = timezone.now()
+        changed = []
+        for rate in batch:
+            live = results[rate.id]
+            if isinstance(live, Exception) or live is None:
+                report["failed"] += 1
+                continue
+
+            report["checked"] += 1
+            drift_pct = float((live - rate.price) / rate.price * 100)
+            drifts.append(abs(drift_pct))
+            if abs(drift_pct) >= threshold_pct:
+                report["drifted"].append({
+                    "route": f"{rate.origin_state} -> {rate.destination_state}",
+                    "max_weight_kg": rate.max_weight_kg,
+                    "service": rate.service,
+                    "source": rate.source,
+                    "card_price": str(rate.price),
+                    "live_price": str(live),
+                    "drift_pct": round(drift_pct, 2),
+                })
+
+            rate.live_price, rate.live_checked_at = live, checked_at
+            if update and rate.source == ShippingRate.Source.FEZ and rate.price != live:
+                rate.price = live
+                report["updated"] += 1
+            changed.append(rate)
+
+        ShippingRate.objects.bulk_update(changed, ['price', 'live_price', 'live_checked_at'])
+
+    if report["updated"]:
+        bump_rate_card_version()
+    report["mean_drift_pct"] = round(sum(drifts) / len(drifts), 2) if drifts else 0
+    report["max_drift_pct"] = round(max(drifts), 2) if drifts else 0
+    return report
@@ -0,0 +1,18 @@
+from celery import shared_task
+from .fez_api import FEZDeliveryAPI
+from .rate_utils import refresh_shipping_rates
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def sync_shipping_rates_task():
+    """Refresh rate card bands learned from FEZ and record drift on imported ones"""
+    report = refresh_shipping_rates(FEZDeliveryAPI)
+    logger.info(
+        f"Shipping rate sync: {report['checked']} checked, {report['updated']} updated, "
+        f"{report['failed']} failed, {len(report['drifted'])} drifted "
+        f"(mean {report['mean_drift_pct']}%, max {report['max_drift_pct']}%)"
+    )
+    return {key: value for key, value in report.items() if key != "drifted"}
@@ -1,3 +1,61 @@
-from django.test import TestCase
+from decimal import Decimal
+from unittest import mock
+from django.test import TestCase, override_settings
+from .models import ShippingRate
+from .rate_utils import bump_rate_card_version, card_price, import_shipping_rates, price_shipments, rate_card
 
-# Create your tests here.
+
+def payload(origin, destination, weight):
+    return {"pickUpState": origin, "state": destination, "weight": weight}
+
+
+@override_settings(SHIPPING_QUOTE_WEIGHT_BUCKET_KG=1)
+class RateCardTests(TestCase):
+    """Shipping prices come from the in-process rate card, FEZ only prices unknown routes"""
+
+    def setUp(self):
+        import_shipping_rates([
+            {"origin_state": "Lagos", "destination_state": "Abuja", "max_weight_kg": 2, "price": "2500"},
+            {"origin_state": "Lagos", "destination_state": "Abuja", "max_weight_kg": 10, "price": "6000"},
+        ])
+        ShippingRate.objects.create(
+            origin_state="Lagos", destination_state="Oyo", max_weight_kg=3,
+            price=Decimal("3000.00"), source=ShippingRate.Source.FEZ,
+        )
+        # Rows created directly do not bump the card version
+        bump_rate_card_version()
+        patcher = mock.patch("logistics.rate_utils.record_stat")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_smallest_fitting_imported_band_applies(self):
+        card = rate_card()
+
+        self.assertEqual(card_price(payload(" lagos ", "FCT", 1.5), card), Decimal("2500.00"))
+        self.assertEqual(card_price(payload("Lagos", "Federal Capital Territory", 2.1), card), Decimal("6000.00"))
+        self.assertIsNone(card_price(payload("Lagos", "Abuja", 11), card))
+
+    def test_learned_band_only_prices_its_own_weight(self):
+        card = rate_card()
+
+        self.assertEqual(card_price(payload("Lagos", "Oyo", 2.5), card), Decimal("3000.00"))
+        self.assertIsNone(card_price(payload("Lagos", "Oyo", 1), card))
+
+    def test_unknown_route_is_not_on_the_card(self):
+        card = rate_card()
+
+        self.assertIsNone(card_price(payload("Oyo", "Lagos", 1), card))
+        self.assertIsNone(card_price(payload("Lagos", "Abuja", 1), card, service="express"))
+
+    def test_card_hits_skip_fez_and_unknown_routes_are_learned(self):
+        get_api = mock.Mock()
+        with mock.patch("logistics.rate_utils.get_shipping_quotes", return_value=[Decimal("4100.00")]) as live:
+            prices = price_shipments([payload("Lagos", "Abuja", 1), payload("Kano", "Lagos", 4)], get_api)
+
+        self.assertEqual(prices, [Decimal("2500.00"), Decimal("4100.00")])
+        live.assert_called_once_with([payload("Kano", "Lagos", 4)], get_api, "standard")
+        get_api.assert_not_called()
+
+        with mock.patch("logistics.rate_utils.get_shipping_quotes") as live:
+            self.assertEqual(price_shipments([payload("Kano", "Lagos", 4)], get_api), [Decimal("4100.00")])
+        live.assert_not_called()
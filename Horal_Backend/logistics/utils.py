@@ -1,6 +1,8 @@
 from django.conf import settings
 from .fez_api import FEZDeliveryAPI
-from sellers.models import SellerKYC, SellerKYCAddress
+from .quote_utils import run_concurrently
+from .rate_utils import price_shipments
+from sellers.models import SellerKYCAddress
 from decimal import Decimal
 from datetime import date
 import googlemaps, math
@@ -66,51 +68,17 @@ def _seller_full_address(seller_kyc: SellerKYCAddress) -> str:
 
 def _extract_weight_kg(item, default_kg: float=1.0) -> float:
     """
-    Get the weight from product variant multiplied by the quantity
-    properly handling quantity and unit conversion.
+    Get the weight from product variant multiplied by the quantity,
+    rounded up to whole kg. Reads the precomputed shipping_weight_kg,
+    items without logistics weigh default_kg per unit
     """
-    from .models import Logistics
-    from django.core.exceptions import ObjectDoesNotExist
-
-    try:
-        logistics = Logistics.objects.get(product_variant=item.variant)
-    except ObjectDoesNotExist as e:
-        logger.warning(f"Logistics entry not found for variant {item.variant.id}: {str(e)}")
-        try:
-            logistics = Logistics.objects.get(object_id=item.variant.object_id)
-        except ObjectDoesNotExist as e:
-            logger.warning(f"Logistics entry not found for product {item.variant.object_id}: {str(e)}")
-            logistics = None  # or raise a validation error
-    
     quantity = getattr(item, "quantity", 1)
+    weight_kg = item.variant.shipping_weight_kg
 
-    if not logistics:
+    if not weight_kg:
         return default_kg * quantity
-    
-    weight_value = getattr(logistics, "weight_measurement", None)
-    weight_unit = getattr(logistics, "total_weight", None)
-
-    if not weight_value or not weight_unit:
-        weight = default_kg * quantity
-
-        return weight
-    
-    # weight_unit = str(weight_unit).upper()
-
-    # Conversion factors to KG
-    conversion_to_kg = {
-        "g": 0.001,
-        "kg": 1,
-    }
-
-    # Ensure consistent lowercase
-    weight_value = str(weight_value).lower()
-
-    total_weight_kg = float(weight_unit) * quantity * conversion_to_kg[weight_value]
-    total_weight_int = math.ceil(total_weight_kg)
-
-    return total_weight_int
 
+    return math.ceil(weight_kg * quantity)
 
 
 def haversine_distance(coord1, coord2):
@@ -187,11 +155,12 @@ def group_order_items_by_seller(order):
     """
     try:
         seller_orders = defaultdict(lambda: {"items": [], "station": None, "weight": 0.0, "seller": None})
-        # item_weight = 0
-        for item in order.order_items.all():
-            shop = item.variant.shop
-            seller = SellerKYC.objects.get(user=shop.owner.user)
-            
+        # Items, variant weights and sellers in a single query
+        for item in order.order_items.select_related("variant__shop__owner"):
+            seller = item.variant.shop.owner
+            if seller is None:
+                raise ValueError(f"Variant {item.variant_id} is not sold by a seller")
+
             # Extract weight
             item_weight = _extract_weight_kg(item)
             # Store order info
@@ -433,10 +402,10 @@ def create_price_payload(order):
 def calculate_shipping_for_order(order):
     """
     Calculate and update shipping cost for every item in an order.
+    Prices come from the rate card, routes it does not know from the quote cache or FEZ.
     Returns (items_shipping_total, updated_items_list)
     """
     try:
-        api = FEZDeliveryAPI()
         shipping_total = Decimal("0.00")
         updated_items = []
 
@@ -447,24 +416,15 @@ def calculate_shipping_for_order(order):
             logger.error(f"Error creating pricing payloads for order {order.id}: {str(e)}\n{str(traceback.format_exc())}")
             raise ValidationError(f"Error creating pricing payload for order: {str(e)}")
 
-        for shipment, payload in shipment_payloads:
-            result = api.get_price(payload)
-
-            # Ensure result is valid and contains deliveryPrice
-            if result.get("status", "").lower() == "success":
-                cost_list = result.get("Cost", [])
-                delivery_price = cost_list.get("cost")
-
-            if not delivery_price or Decimal(str(delivery_price)) <= 0:
-                logger.error(f"No valid shipping price returned for shipment {shipment.id}. Result: {result}")
-                raise ValidationError(f"Could not retrieve shipping price for shipment {shipment.id}")
-
-            try:
-                price = Decimal(str(delivery_price))
-            except Exception as e:
-                logger.warning(f"Error parsing price for shipment {shipment.id}: {e}")
-                raise ValueError(f"Error retrieving shipment price from GIGL: {str(e)}")
+        # Priced from the rate card, unknown routes are quoted live and concurrently;
+        # shipments that could not be priced fail the checkout together
+        prices = price_shipments([payload for _, payload in shipment_payloads], FEZDeliveryAPI)
+        failed = [str(shipment.id) for (shipment, _), price in zip(shipment_payloads, prices) if isinstance(price, Exception)]
+        if failed:
+            logger.error(f"No valid shipping price for shipments {failed} of order {order.id}: {prices}")
+            raise ValidationError(f"Could not retrieve shipping price for shipment {', '.join(failed)}")
 
+        for (shipment, _), price in zip(shipment_payloads, prices):
             # Apply shipping price back to each shipment item
             shipment.shipping_cost = price
             shipment.save(update_fields=["shipping_cost"])
@@ -575,18 +535,26 @@ def create_delivery_estimate_payload(order):
 
 
 def estimate_shipment_delivery_time(order):
-    """Function that returns the delivery estimate for orders"""
+    """
+    Function that returns the delivery estimate for orders.
+    Shipments are estimated concurrently; one that fails or misses the
+    budget gets eta None instead of failing the others
+    """
     try:
-        delivery_estimates = []
-
         api = FEZDeliveryAPI()
         delivery_payload = create_delivery_estimate_payload(order)
 
-        for shipment, payload in delivery_payload:
-            result = api.estimate_delivery_time(payload)
+        results = run_concurrently(
+            lambda _, payload: api.estimate_delivery_time(payload, timeout=settings.FEZ_CALL_TIMEOUT),
+            {shipment.id: payload for shipment, payload in delivery_payload},
+        )
+
+        delivery_estimates = []
+        for shipment, _ in delivery_payload:
+            result = results[shipment.id]
             data = {}
 
-            if result.get("status", "").lower() == "success":
+            if isinstance(result, dict) and result.get("status", "").lower() == "success":
                 eta = result.get("data", {}).get("eta")
                 data["eta"] = eta
             else:
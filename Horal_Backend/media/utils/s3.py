@@ -1,5 +1,6 @@
 import boto3
 import logging
+import tempfile
 from django.conf import settings
 from botocore.exceptions import NoCredentialsError, ClientError
 
@@ -32,6 +33,19 @@ def upload_file(file_obj, key, content_type=None, is_private=False):
         raise
     return key
 
+def download_file(key):
+    """Fetch an object into a temporary file positioned at the start"""
+    s3 = get_s3_client()
+    tmp = tempfile.SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+    try:
+        s3.download_fileobj(settings.AWS_STORAGE_BUCKET_NAME, key, tmp)
+    except ClientError:
+        tmp.close()
+        logger.exception("S3 client error during download")
+        raise
+    tmp.seek(0)
+    return tmp
+
 def delete_file(key):
     s3 = get_s3_client()
     try:
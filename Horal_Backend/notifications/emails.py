@@ -1,8 +1,11 @@
 from django.core.mail import send_mail
 from django.conf import settings
 import requests
+import logging
 from .tasks import send_email_task
 
+logger = logging.getLogger(__name__)
+
 
 def send_registration_otp_email(to_email, otp_code, name):
     """Send an OTP email to the user."""
@@ -199,3 +202,35 @@ def send_kyc_final_status_email(user, status):
         }
     )
 
+
+def send_email_batch(messages, from_email=None):
+    """
+    Send many already rendered emails over a single backend connection.
+    Each message is sent on its own so one bad address does not stop the rest.
+
+    :param messages: list of dicts with recipient, subject, html and optional body
+    :param from_email: sender email, defaults to settings.DEFAULT_FROM_EMAIL
+    :return: list of booleans, True where the message was sent
+    """
+    from django.core.mail import EmailMultiAlternatives, get_connection
+
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+
+    sent = []
+    # Opening the connection may raise, callers decide whether to retry
+    with get_connection() as connection:
+        for message in messages:
+            email = EmailMultiAlternatives(
+                subject=message["subject"],
+                body=message.get("body") or "",
+                from_email=from_email,
+                to=[message["recipient"]],
+                connection=connection,
+            )
+            email.attach_alternative(message["html"], "text/html")
+            try:
+                sent.append(bool(email.send()))
+            except Exception as e:
+                logger.error(f"Failed to send '{message['subject']}' to {message['recipient']}: {e}")
+                sent.append(False)
+    return sent
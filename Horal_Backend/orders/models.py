@@ -44,10 +44,13 @@ class Order(ShippingSnapshotMixin, models.Model):
     shipping_total = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
 
     status = models.CharField(max_length=50, choices=Status.choices, default=Status.PENDING)
+    # Reserved stock of a pending order is released at this time unless it is paid
+    reservation_expires_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         indexes = [
             models.Index(fields=["status"]),
+            models.Index(fields=["status", "reservation_expires_at"]),
         ]
 
     def __str__(self):
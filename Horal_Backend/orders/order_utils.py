@@ -1,55 +1,108 @@
+from django.conf import settings
 from django.utils.timezone import now
 from django.db import transaction
+from django.db.models import Count, F, Min, Q, Sum
 
-from .models import Order, OrderShipment
+from .models import Order, OrderItem, OrderShipment
+from products.flash_sale_utils import release_order_stock
 from products.models import ProductVariant
-from products.utils import update_quantity
 from datetime import timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-def cancel_expired_pending_orders():
+def schedule_reservation_expiry(order):
     """
-    Cancels pending orders older than 30 minutes and updates reserved product variant quantities.
+    Set when the order's reserved stock is released and queue a task for that
+    moment once the checkout commits. A re-checkout pushes the time back, the
+    task it replaces finds the order not yet due and does nothing
     """
-    expired_time = now() - timedelta(minutes=30)
-    expired_orders = Order.objects.filter(
-        status=Order.Status.PENDING,
-        created_at__lte=expired_time
-    ).prefetch_related('order_items__variant')
+    from .tasks import release_order_reservation_task
+
+    order.reservation_expires_at = now() + timedelta(seconds=settings.ORDER_RESERVATION_TTL)
+    expires_at = order.reservation_expires_at
+    transaction.on_commit(
+        lambda: release_order_reservation_task.apply_async(args=[str(order.id)], eta=expires_at)
+    )
+
+
+def _cancel_orders(order_ids):
+    """Release the stock of pending orders with one stock update, drop their shipments and cancel them"""
+    release_order_stock(
+        OrderItem.objects.filter(order_id__in=order_ids).values_list('order_id', 'variant_id', 'quantity')
+    )
+    # delete related shipments to keep things clean
+    OrderShipment.objects.filter(order_id__in=order_ids).delete()
+    Order.objects.filter(id__in=order_ids).update(status=Order.Status.CANCELLED)
+
+
+def release_order_reservation(order_id):
+    """Cancel one pending order whose reservation has expired, returns whether it was cancelled"""
+    with transaction.atomic():
+        # Waits for a payment being recorded (payment.utils locks the order), which then leaves it PAID
+        due = Order.objects.select_for_update().filter(
+            id=order_id,
+            status=Order.Status.PENDING,
+            reservation_expires_at__lte=now(),
+        ).exists()
+        if due:
+            _cancel_orders([order_id])
+
+    if due:
+        logger.info(f"Reservation of order {order_id} expired, stock released.")
+    return due
 
-    variants_to_update = {}
-    products_to_update = set()
-    orders_to_update = []
+
+def cancel_expired_pending_orders():
+    """
+    Fallback for expiry tasks that were lost (worker restarts, broker outages):
+    cancels every pending order past its reservation expiry and releases its stock.
+    Orders checked out before expiry times existed fall back to created_at
+    """
+    current = now()
 
     with transaction.atomic():
-        for order in expired_orders:
-            for item in order.order_items.all():
-                variant = item.variant
-                if variant.id not in variants_to_update:
-                    variants_to_update[variant.id] = variant
-                variant.reserved_quantity = max(variant.reserved_quantity - item.quantity, 0)
-                products_to_update.add(variant.product)
-
-            order.status = Order.Status.CANCELLED
-            orders_to_update.append(order)
-            
-            # delete related shipments to keep things clean
-            order.shipments.all().delete()
-
-        if variants_to_update:
-            ProductVariant.objects.bulk_update(variants_to_update.values(), ['reserved_quantity'])
-
-        # Update product quantities
-        for product in products_to_update:
-            update_quantity(product)
-            
-        if orders_to_update:
-            Order.objects.bulk_update(orders_to_update, ['status'])
-
-    logger.info(f"{len(orders_to_update)} expired orders processed.")
+        expired_orders = list(
+            Order.objects.select_for_update(skip_locked=True).filter(
+                Q(reservation_expires_at__lte=current) | Q(
+                    reservation_expires_at__isnull=True,
+                    created_at__lte=current - timedelta(seconds=settings.ORDER_RESERVATION_TTL),
+                ),
+                status=Order.Status.PENDING,
+            ).values_list('id', flat=True)
+        )
+        if expired_orders:
+            _cancel_orders(expired_orders)
+
+    logger.info(f"{len(expired_orders)} expired orders processed.")
+
+
+def reservation_metrics():
+    """Stock held by unpaid orders, and how far expiry is lagging behind"""
+    current = now()
+    held = OrderItem.objects.filter(order__status=Order.Status.PENDING).aggregate(
+        reserved_units=Sum('quantity'),
+        reserved_value=Sum(F('quantity') * F('unit_price')),
+        overdue_units=Sum('quantity', filter=Q(order__reservation_expires_at__lte=current)),
+    )
+    orders = Order.objects.filter(status=Order.Status.PENDING).aggregate(
+        pending_orders=Count('id'),
+        overdue_orders=Count('id', filter=Q(reservation_expires_at__lte=current)),
+        oldest_overdue=Min('reservation_expires_at', filter=Q(reservation_expires_at__lte=current)),
+        next_expiry=Min('reservation_expires_at', filter=Q(reservation_expires_at__gt=current)),
+    )
+    oldest_overdue = orders.pop('oldest_overdue')
+
+    return {
+        **orders,
+        "reserved_units": held['reserved_units'] or 0,
+        "reserved_value": held['reserved_value'] or 0,
+        "overdue_units": held['overdue_units'] or 0,
+        # Seconds the most overdue order has kept its stock past expiry
+        "max_expiry_lag": (current - oldest_overdue).total_seconds() if oldest_overdue else 0,
+        "variant_reserved_units": ProductVariant.objects.aggregate(total=Sum('reserved_quantity'))['total'] or 0,
+    }
 
 
 
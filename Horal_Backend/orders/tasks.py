@@ -1,7 +1,9 @@
 from celery import shared_task
 from .order_utils import (
     cancel_expired_pending_orders,
-    automatic_order_completion
+    automatic_order_completion,
+    release_order_reservation,
+    reservation_metrics,
 )
 from orders.models import OrderItem, OrderShipment, Order
 from sellers.models import SellerKYC, SellerKYCAddress
@@ -14,13 +16,22 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+@shared_task
+def release_order_reservation_task(order_id):
+    """
+    Celery task queued by checkout for the moment the order's reservation expires
+    """
+    return release_order_reservation(order_id)
+
+
 @shared_task
 def expire_pending_orders_task():
     """
-    Celery task to cancel pending orders older than 30 minutes.
+    Celery task to cancel pending orders whose reservation expired
+    without their own release task running.
     """
     cancel_expired_pending_orders()
-    logger.info("✅ Expired pending orders processed.")
+    logger.info(f"✅ Expired pending orders processed. Reservations: {reservation_metrics()}")
 
 
 @shared_task
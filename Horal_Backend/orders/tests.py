@@ -1,3 +1,107 @@
+import uuid
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
+from django.utils.timezone import now
+from categories.models import Category
+from products.flash_sale_utils import reserve_order_stock
+from products.models import GadgetProduct, ProductVariant
+from shops.models import Shop
+from subcategories.models import SubCategory
+from users.models import CustomUser
+from .models import Order, OrderItem
+from .order_utils import (
+    cancel_expired_pending_orders,
+    release_order_reservation,
+    schedule_reservation_expiry,
+)
 
-# Create your tests here.
+
+class ReservationExpiryTests(TestCase):
+    """Per-order expiry tasks and the sweep that catches lost ones"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category, _ = Category.objects.get_or_create(name="gadget")
+        sub_category, _ = SubCategory.objects.get_or_create(category=category, name="Phones")
+        shop = Shop.objects.create(owner_type=Shop.OwnerType.PLATFORM, name="expiry-tests")
+        product = GadgetProduct.objects.create(
+            shop=shop, category=category, sub_category=sub_category, title="Expiry phone",
+            description="Phone", price=Decimal("1000.00"), state="Lagos", local_govt="Ikeja", brand="Horal",
+        )
+        cls.variant = ProductVariant.objects.create(
+            content_type=ContentType.objects.get_for_model(GadgetProduct), object_id=product.id,
+            shop=shop, color="black", stock_quantity=10,
+        )
+        cls.user = CustomUser.objects.create_user(
+            email=f"expiry-{uuid.uuid4().hex[:8]}@horal.ng", password="Pass12345!@"
+        )
+
+    def order(self, quantity, expires_in):
+        """A pending order holding `quantity` units, expiring `expires_in` seconds from now"""
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, variant=self.variant, quantity=quantity, unit_price=Decimal("1000.00"))
+        reserve_order_stock(order.id, [(self.variant.id, quantity)])
+        if expires_in is not None:
+            Order.objects.filter(id=order.id).update(reservation_expires_at=now() + timedelta(seconds=expires_in))
+        return order
+
+    def stock(self):
+        self.variant.refresh_from_db()
+        return self.variant.stock_quantity, self.variant.reserved_quantity
+
+    def status(self, order):
+        return Order.objects.values_list("status", flat=True).get(id=order.id)
+
+    def test_checkout_queues_release_for_expiry_time(self):
+        order = Order.objects.create(user=self.user)
+
+        with mock.patch("orders.tasks.release_order_reservation_task.apply_async") as apply_async:
+            with self.captureOnCommitCallbacks(execute=True):
+                schedule_reservation_expiry(order)
+
+        apply_async.assert_called_once_with(args=[str(order.id)], eta=order.reservation_expires_at)
+        self.assertGreater(order.reservation_expires_at, now())
+
+    def test_early_task_leaves_reservation(self):
+        order = self.order(3, expires_in=60)
+
+        self.assertFalse(release_order_reservation(order.id))
+        self.assertEqual(self.stock(), (7, 3))
+        self.assertEqual(self.status(order), Order.Status.PENDING)
+
+    def test_due_task_releases_stock_once(self):
+        order = self.order(3, expires_in=-1)
+
+        self.assertTrue(release_order_reservation(order.id))
+        self.assertEqual(self.stock(), (10, 0))
+        self.assertEqual(self.status(order), Order.Status.CANCELLED)
+
+        self.assertFalse(release_order_reservation(order.id))
+        self.assertEqual(self.stock(), (10, 0))
+
+    def test_due_task_skips_paid_order(self):
+        order = self.order(3, expires_in=-1)
+        Order.objects.filter(id=order.id).update(status=Order.Status.PAID)
+
+        self.assertFalse(release_order_reservation(order.id))
+        self.assertEqual(self.stock(), (7, 3))
+
+    def test_sweep_cancels_only_overdue_orders(self):
+        overdue = self.order(2, expires_in=-1)
+        not_due = self.order(3, expires_in=60)
+        legacy = self.order(1, expires_in=None)
+        # Checked out before expiry times existed, falls back to created_at
+        Order.objects.filter(id=legacy.id).update(created_at=now() - timedelta(days=1))
+
+        cancel_expired_pending_orders()
+
+        self.assertEqual(self.status(overdue), Order.Status.CANCELLED)
+        self.assertEqual(self.status(legacy), Order.Status.CANCELLED)
+        self.assertEqual(self.status(not_due), Order.Status.PENDING)
+        self.assertEqual(self.stock(), (7, 3))
+
+        cancel_expired_pending_orders()
+        self.assertEqual(self.stock(), (7, 3))
@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
     CheckoutView, OrderDeleteView,
-    AdminAllOrderView, UserOrderListView, OrderDetailView,
+    AdminAllOrderView, AdminReservationMetricsView, UserOrderListView, OrderDetailView,
     OrderReturnRequestView, ApproveReturnView,
     RejectReturnView, 
     ReturnsEmailWebhookView
@@ -13,6 +13,7 @@ urlpatterns = [
     path('get/<uuid:order_id>/', OrderDetailView.as_view(), name='order-detail'),
     path('checkout/', CheckoutView.as_view(), name='checkout'),
     path('admin/all/', AdminAllOrderView.as_view(), name='admin-all-orders'),
+    path('admin/reservations/', AdminReservationMetricsView.as_view(), name='admin-reservation-metrics'),
     path('user-orders/', UserOrderListView.as_view(), name='user-order-list'),
     path('cancel/', OrderReturnRequestView.as_view(), name='order-cancellation'),
     path('return-approval/', ApproveReturnView.as_view(), name='return-approval'),
@@ -1,5 +1,7 @@
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import Sum, F, Value, DecimalField
+from django.db.models.functions import Coalesce
 from products.utils import update_quantity
 from products.models import ProductVariant
 from payment.utils import update_order_status
@@ -38,6 +40,16 @@ def generate_reference():
     return f"RET-{uuid.uuid4().hex[:8].upper()}"
 
 
+def get_order_product_total(order):
+    """Sum of unit_price * quantity over the order items in one SQL query"""
+    return order.order_items.aggregate(
+        total=Coalesce(
+            Sum(F('unit_price') * F('quantity')), Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )
+    )["total"]
+
+
 def create_shipments_for_order(order):
     """
     Group order items by seller and create OrderShipment records.
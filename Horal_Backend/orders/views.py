@@ -12,18 +12,25 @@ from payment.models import PaystackTransaction, OrderStatusLog
 from payment.utils import update_order_status
 from users.models import CustomUser
 from .discounts import apply_coupon_discount
-from .utils import approve_return, create_shipments_for_order, get_consistent_checkout_payload
+from .utils import (
+    approve_return, create_shipments_for_order,
+    get_consistent_checkout_payload, get_order_product_total
+)
 from .models import Order, OrderItem, OrderShipment
+from .order_utils import reservation_metrics, schedule_reservation_expiry
 from .serializers import (
     OrderReturnRequest, OrderSerializer,
     OrderReturnRequestSerializer, OrderShipmentSerializer,
     OrderWithShipmentSerializer
 )
 from carts.models import Cart
+from carts.stores import promote_guest_cart
 from users.authentication import CookieTokenAuthentication
 from logistics.utils import calculate_shipping_for_order
-from products.utils import BaseResponseMixin, update_quantity
-from products.models import ProductVariant
+from products.utils import BaseResponseMixin
+from products.flash_sale_utils import flash_checkout_hold, reserve_order_stock, release_order_stock
+from products.reservation_utils import InsufficientStock, InventoryModeChanged
+from Horal_Backend.idempotency import idempotent
 from django.utils.timezone import now
 from support.serializers import MessageSerializer
 from support.utils import handle_mailgun_attachments, create_message_for_instance
@@ -47,11 +54,19 @@ class CheckoutView(GenericAPIView, BaseResponseMixin):
         return Order.objects.filter(user=self.request.user, status=Order.Status.PENDING)
 
 
+    @idempotent("checkout")
     def post(self, request, *args, **kwargs):
         """
         Post method to create an order based on user's cart
         """
         user = request.user
+
+        # A guest cart still held in Redis joins the user's cart before checkout
+        try:
+            promote_guest_cart(request.session.session_key, user)
+        except Exception as e:
+            logger.error(f"Guest cart promotion failed for user {user.id}: {e}")
+
         cart = Cart.objects.filter(user=user).first()
 
         if not cart or not cart.cart_item.exists():
@@ -61,7 +76,7 @@ class CheckoutView(GenericAPIView, BaseResponseMixin):
             )
         
         try:
-            with transaction.atomic():
+            with flash_checkout_hold() as hold_flash_stock, transaction.atomic():
                 # Instead of getting existing order, recreate the order to allow
                 # users to remove item from cart if them choose maybe because of shipping cost
                 # WIthout them abandoning the order
@@ -89,43 +104,28 @@ class CheckoutView(GenericAPIView, BaseResponseMixin):
                     )
                     update_order_status(order, Order.Status.PENDING, user, force=True)
 
-                # Release stock for existing order items
-                for order_item in order.order_items.select_related("variant").all():
-                    variant = (
-                        ProductVariant.objects.select_for_update()
-                        .get(pk=order_item.variant.pk)
-                    )
-                    variant.reserved_quantity -= order_item.quantity
-                    variant.stock_quantity += order_item.quantity
-                    variant.save()
-                    update_quantity(variant.product)
+                # Re-checkout: give back what the previous attempt reserved and
+                # reserve the cart again, all variants locked in one ordered query
+                # (flash sale variants are held in Redis at the end instead)
+                previous = list(order.order_items.values_list("variant_id", "quantity"))
+                lines = list(
+                    cart.cart_item.filter(variant__isnull=False).values_list("variant_id", "quantity")
+                )
+                try:
+                    variants = reserve_order_stock(order.id, lines, release=previous)
+                except (InsufficientStock, InventoryModeChanged) as e:
+                    raise ValidationError(str(e))
 
                 # Clear existing order items to resync with cart
                 order.order_items.all().delete()
 
                 # Add order items
-                for item in cart.cart_item.all():
-                    variant = (
-                        ProductVariant.objects.select_for_update()
-                        .get(pk=item.variant.pk)
-                    )
-
-                    # Check if requested quantity can be reserved
-                    if item.quantity > variant.stock_quantity:
-                        raise ValidationError(
-                            f"Only {variant.stock_quantity} items available for {variant}"
-                        )
-                    # Reserve the stock
-                    variant.reserved_quantity += item.quantity
-                    variant.stock_quantity -= item.quantity  # Deduct immediately upon reservation
-                    variant.save()
-                    update_quantity(variant.product)
-
+                for variant_id, quantity in lines:
                     OrderItem.objects.create(
                         order=order,
-                        variant=item.variant,
-                        quantity=item.quantity,
-                        unit_price=item.variant.price_override or item.variant.product.price,
+                        variant=variants[variant_id],
+                        quantity=quantity,
+                        unit_price=variants[variant_id].effective_price,
                     )
 
                 #--------------------
@@ -144,43 +144,53 @@ class CheckoutView(GenericAPIView, BaseResponseMixin):
                 # Only calculate shipping if we have a full address
                 if has_address:
                     shipping_total, items = calculate_shipping_for_order(order)
-                product_total = sum(
-                    i.unit_price * i.quantity for i in order.order_items.all()
-                )
+                product_total = get_order_product_total(order)
                 grand_total = product_total + shipping_total
 
                 # Save them to DB
                 order.product_total = product_total
                 order.shipping_total = shipping_total
                 order.total_amount = grand_total
-                order.save(update_fields=["product_total", "shipping_total", "total_amount", "discount_applied"])
+                # The reservation is released at this time unless the order is paid
+                schedule_reservation_expiry(order)
+                order.save(update_fields=[
+                    "product_total", "shipping_total", "total_amount", "discount_applied", "reservation_expires_at"
+                ])
                 if order.discount_applied:
                     apply_coupon_discount(order)
 
                 # Get consistent order payload              
                 shipments = get_consistent_checkout_payload(order)
-
-                return self.get_response(
-                    status.HTTP_201_CREATED,
-                    "Order placed and shipping cost calculated",
-                    {
-                        "order_id": str(order.id),
-                        "user_email": order.user.email,
-                        "shipments": shipments,
-                        "product_total": str(order.product_total),
-                        "shipping_total": str(order.shipping_total),
-                        "total_amount": str(order.total_amount),
-                        "address": {
-                            "street": order.street_address,
-                            "local_govt": order.local_govt,
-                            "state": order.state,
-                            "landmark": order.landmark,
-                            "country": order.country,
-                            "phone_number": order.phone_number,
-                        },
+                data = {
+                    "order_id": str(order.id),
+                    "user_email": order.user.email,
+                    "shipments": shipments,
+                    "product_total": str(order.product_total),
+                    "shipping_total": str(order.shipping_total),
+                    "total_amount": str(order.total_amount),
+                    "address": {
+                        "street": order.street_address,
+                        "local_govt": order.local_govt,
+                        "state": order.state,
+                        "landmark": order.landmark,
+                        "country": order.country,
+                        "phone_number": order.phone_number,
                     },
-                )
-                
+                }
+
+                # Redis does not roll back with the transaction, so flash sale
+                # stock is held only once every step above has succeeded
+                try:
+                    hold_flash_stock(order.id, lines, variants)
+                except (InsufficientStock, InventoryModeChanged) as e:
+                    raise ValidationError(str(e))
+
+            return self.get_response(
+                status.HTTP_201_CREATED,
+                "Order placed and shipping cost calculated",
+                data,
+            )
+
         except ValidationError as e:
             logger.warning(f"Validation error during checkout for user {user.id}: {str(e)}")
             return self.get_response(
@@ -231,7 +241,7 @@ class CheckoutView(GenericAPIView, BaseResponseMixin):
                 "Unexpected error calculating shipping"
             )
 
-        product_total = sum(i.unit_price * i.quantity for i in order.order_items.all())
+        product_total = get_order_product_total(order)
         grand_total = product_total + shipping_total
         
         # Save them to DB
@@ -360,17 +370,8 @@ class OrderDeleteView(GenericAPIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
         with transaction.atomic():
-            for item in order.order_items.all():
-                variant = item.variant
-
-                # reset the reserved quantity
-                variant.reserved_quantity = max(0, variant.reserved_quantity - item.quantity)
-                variant.stock_quantity += item.quantity
-                variant.save()
-
-                # Recalculate total quantity for the product
-                update_quantity(variant.product)
-
+            # reset the reserved quantity
+            release_order_stock(order.order_items.values_list("order_id", "variant_id", "quantity"))
             order.delete()
 
         return Response({
@@ -399,6 +400,19 @@ class AdminAllOrderView(GenericAPIView, BaseResponseMixin):
         )
     
 
+class AdminReservationMetricsView(GenericAPIView, BaseResponseMixin):
+    """Stock held by unpaid orders and how far their expiry is lagging"""
+    permission_classes = [IsSuperAdminPermission]
+    authentication_classes = [CookieTokenAuthentication]
+
+    def get(self, request):
+        return self.get_response(
+            status.HTTP_200_OK,
+            "Reservation metrics retrieved successfully.",
+            reservation_metrics()
+        )
+
+
 class UserOrderListView(GenericAPIView, BaseResponseMixin):
     """List all order from a single user"""
     permission_classes = [IsAuthenticated]
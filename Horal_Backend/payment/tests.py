@@ -1,3 +1,149 @@
-from django.test import TestCase
+import hashlib
+import hmac
+import json
+import uuid
+from decimal import Decimal
+from unittest import mock
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from carts.models import Cart, CartItem
+from categories.models import Category
+from orders.models import Order, OrderItem
+from orders.order_utils import release_order_reservation
+from products.flash_sale_utils import reserve_order_stock
+from products.models import GadgetProduct, ProductVariant
+from shops.models import Shop
+from subcategories.models import SubCategory
+from users.models import CustomUser
+from .models import PaystackTransaction
 
-# Create your tests here.
+
+@override_settings(PAYSTACK_SECRET_KEY="webhook-tests")
+class TransactionWebhookTests(TestCase):
+    """Paystack charge events settle an order's stock exactly once"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category, _ = Category.objects.get_or_create(name="gadget")
+        sub_category, _ = SubCategory.objects.get_or_create(category=category, name="Phones")
+        shop = Shop.objects.create(owner_type=Shop.OwnerType.PLATFORM, name="webhook-tests")
+        product = GadgetProduct.objects.create(
+            shop=shop, category=category, sub_category=sub_category, title="Webhook phone",
+            description="Phone", price=Decimal("1000.00"), state="Lagos", local_govt="Ikeja", brand="Horal",
+        )
+        cls.variant = ProductVariant.objects.create(
+            content_type=ContentType.objects.get_for_model(GadgetProduct), object_id=product.id,
+            shop=shop, color="black", stock_quantity=10,
+        )
+        cls.user = CustomUser.objects.create_user(
+            email=f"webhook-{uuid.uuid4().hex[:8]}@horal.ng", password="Pass12345!@"
+        )
+
+    def setUp(self):
+        # Paid orders queue FEZ shipments and receipt emails
+        for target in ("orders.signals.create_fez_shipment_on_each_shipment", "orders.signals.send_email_task"):
+            patcher = mock.patch(target)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def checkout(self, quantity):
+        """A pending order holding `quantity` units, with its Paystack transaction"""
+        order = Order.objects.create(user=self.user)
+        OrderItem.objects.create(order=order, variant=self.variant, quantity=quantity, unit_price=Decimal("1000.00"))
+        reserve_order_stock(order.id, [(self.variant.id, quantity)])
+        return order, PaystackTransaction.objects.create(
+            reference=uuid.uuid4().hex, email=self.user.email, amount=quantity * 100000, order=order,
+        )
+
+    def post(self, event, tx):
+        body = json.dumps({"event": event, "data": {"reference": tx.reference}}).encode()
+        signature = hmac.new(b"webhook-tests", body, hashlib.sha512).hexdigest()
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(
+                reverse("paystack-webhook"), body, content_type="application/json",
+                HTTP_X_PAYSTACK_SIGNATURE=signature,
+            )
+
+    def stock(self):
+        self.variant.refresh_from_db()
+        return self.variant.stock_quantity, self.variant.reserved_quantity
+
+    def status(self, order):
+        return Order.objects.values_list("status", flat=True).get(id=order.id)
+
+    def test_success_commits_reservation_once(self):
+        order, tx = self.checkout(3)
+        cart = Cart.objects.create(user=self.user)
+        CartItem.objects.create(cart=cart, variant=self.variant, quantity=3)
+
+        self.post("charge.success", tx)
+        self.post("charge.success", tx)
+
+        self.assertEqual(self.stock(), (7, 0))
+        self.assertEqual(self.status(order), Order.Status.PAID)
+        self.assertFalse(CartItem.objects.filter(cart=cart).exists())
+
+    def test_failed_releases_reservation_once(self):
+        order, tx = self.checkout(3)
+        _, other_tx = self.checkout(2)
+
+        self.post("charge.failed", tx)
+        self.post("charge.failed", tx)
+
+        # The other order keeps its reservation
+        self.assertEqual(self.stock(), (8, 2))
+        self.assertEqual(self.status(order), Order.Status.FAILED)
+
+    def test_failed_after_expiry_does_not_release_again(self):
+        order, tx = self.checkout(3)
+        self.checkout(2)
+        Order.objects.filter(id=order.id).update(reservation_expires_at="2000-01-01T00:00:00Z")
+        release_order_reservation(order.id)
+
+        self.post("charge.failed", tx)
+
+        self.assertEqual(self.stock(), (8, 2))
+        self.assertEqual(self.status(order), Order.Status.CANCELLED)
+
+    def test_success_after_expiry_refunds_instead_of_committing(self):
+        order, tx = self.checkout(3)
+        self.checkout(2)
+        Order.objects.filter(id=order.id).update(reservation_expires_at="2000-01-01T00:00:00Z")
+        release_order_reservation(order.id)
+
+        with mock.patch("payment.utils.trigger_refund") as trigger_refund:
+            self.post("charge.success", tx)
+            self.post("charge.success", tx)
+
+        trigger_refund.assert_called_once_with(tx.reference)
+        self.assertEqual(self.stock(), (8, 2))
+        self.assertEqual(self.status(order), Order.Status.CANCELLED)
+
+    def test_success_after_failed_charge_reserves_again(self):
+        order, failed_tx = self.checkout(3)
+        self.post("charge.failed", failed_tx)
+        retry_tx = PaystackTransaction.objects.create(
+            reference=uuid.uuid4().hex, email=self.user.email, amount=300000, order=order,
+        )
+
+        self.post("charge.success", retry_tx)
+
+        self.assertEqual(self.stock(), (7, 0))
+        self.assertEqual(self.status(order), Order.Status.PAID)
+
+    def test_success_after_failed_charge_refunds_when_stock_is_gone(self):
+        order, failed_tx = self.checkout(3)
+        self.post("charge.failed", failed_tx)
+        ProductVariant.objects.filter(id=self.variant.id).update(stock_quantity=1)
+        retry_tx = PaystackTransaction.objects.create(
+            reference=uuid.uuid4().hex, email=self.user.email, amount=300000, order=order,
+        )
+
+        with mock.patch("payment.utils.trigger_refund") as trigger_refund:
+            self.post("charge.success", retry_tx)
+
+        trigger_refund.assert_called_once_with(retry_tx.reference)
+        self.assertEqual(self.stock(), (1, 0))
+        self.assertEqual(self.status(order), Order.Status.FAILED)
@@ -1,4 +1,5 @@
 from django.conf import settings
+from django.db import transaction
 from .models import PaystackTransaction, OrderStatusLog
 from notifications.emails import send_refund_email
 from .models import OrderStatusLog
@@ -87,6 +88,86 @@ def update_order_status(order, new_status, changed_by=None, \
         order.save(update_fields=["status"])
 
 
+
+def record_failed_payment(tx_id):
+    """
+    Mark a transaction failed and give back the stock of its pending order, once.
+    The transaction and order rows are locked, so a retried webhook waits and then
+    finds the transaction already settled. An order that is no longer pending
+    (paid, or cancelled when its reservation expired) has nothing to give back
+    """
+    from orders.models import Order
+    from products.flash_sale_utils import release_order_stock
+
+    with transaction.atomic():
+        tx = PaystackTransaction.objects.select_for_update().get(id=tx_id)
+        if tx.status in (PaystackTransaction.StatusChoices.FAILED, PaystackTransaction.StatusChoices.SUCCESS):
+            return tx
+
+        tx.status = PaystackTransaction.StatusChoices.FAILED
+        tx.save(update_fields=["status", "updated_at"])
+
+        order = Order.objects.select_for_update().filter(
+            id=tx.order_id, status=Order.Status.PENDING
+        ).first() if tx.order_id else None
+        if order:
+            release_order_stock(order.order_items.values_list("order_id", "variant_id", "quantity"))
+            update_order_status(order, Order.Status.FAILED)
+    return tx
+
+
+def record_successful_payment(tx_id, paid_at=None, gateway_response=None, changed_by=None):
+    """
+    Mark a transaction successful and consume its order's reserved stock, once.
+    The transaction and order rows are locked, so a retried webhook, the verify
+    endpoint and the reservation expiry task run one after the other and each
+    sees what the others left:
+    - a pending order commits its reservation and becomes PAID
+    - a failed order (an earlier charge gave its stock back) reserves again first
+    - a cancelled order (reservation expired, stock and shipments gone), or a
+      failed one whose stock has since sold, is refunded once the transaction commits
+    """
+    from carts.models import CartItem
+    from orders.models import Order
+    from products.flash_sale_utils import commit_order_stock, hold_order_flash_stock, reserve_order_stock
+    from products.reservation_utils import InsufficientStock, InventoryModeChanged
+
+    with transaction.atomic():
+        tx = PaystackTransaction.objects.select_for_update().get(id=tx_id)
+        if tx.status == PaystackTransaction.StatusChoices.SUCCESS:
+            return tx
+
+        tx.status = PaystackTransaction.StatusChoices.SUCCESS
+        tx.paid_at = paid_at
+        tx.gateway_response = gateway_response
+        tx.save(update_fields=["status", "paid_at", "gateway_response", "updated_at"])
+
+        order = Order.objects.select_for_update().filter(id=tx.order_id).first() if tx.order_id else None
+        if not order:
+            return tx
+
+        items = list(order.order_items.values_list("order_id", "variant_id", "quantity"))
+        reserved = order.status == Order.Status.PENDING
+        if order.status == Order.Status.FAILED:
+            lines = [(variant_id, quantity) for _, variant_id, quantity in items]
+            try:
+                with transaction.atomic():
+                    variants = reserve_order_stock(order.id, lines)
+                    hold_order_flash_stock(order.id, lines, variants)
+                reserved = True
+            except (InsufficientStock, InventoryModeChanged) as e:
+                logger.warning(f"Stock of failed order {order.id} is gone, refunding its payment: {e}")
+
+        if reserved:
+            commit_order_stock(items)
+            CartItem.objects.filter(cart__user=order.user).delete()
+            update_order_status(order, Order.Status.PAID, changed_by)
+        elif order.status in (Order.Status.CANCELLED, Order.Status.FAILED):
+            logger.warning(f"Payment {tx.reference} arrived for {order.status} order {order.id}, refunding it")
+            reference = tx.reference
+            transaction.on_commit(lambda: trigger_refund(reference))
+    return tx
+
 def fetch_and_store_bank():
     """
     Function to fetch bank details from paystack
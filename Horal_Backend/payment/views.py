@@ -12,12 +12,13 @@ from orders.models import Order, OrderItem
 from rest_framework.views import APIView
 from django.utils.timezone import now
 from carts.models import CartItem
-from .utils import trigger_refund, update_order_status
+from .utils import trigger_refund, update_order_status, record_failed_payment, record_successful_payment
 from orders.serializers import OrderSerializer
-from products.utils import update_quantity, IsAdminOrSuperuser
+from products.utils import IsAdminOrSuperuser
 from django.utils.decorators import method_decorator
 from rest_framework.exceptions import ValidationError
 from users.authentication import CookieTokenAuthentication
+from Horal_Backend.idempotency import idempotent
 import uuid, os
 from wallet.models import Payout
 import logging
@@ -34,6 +35,7 @@ class InitializeTransaction(APIView):
     permission_classes = [IsAuthenticated]
     authentication_classes = [CookieTokenAuthentication]
 
+    @idempotent("payment-initialize")
     def post(self, request):
         """Function to handle payment initialization on paystack"""
         email = request.data.get("email")
@@ -168,16 +170,13 @@ class VerifyTransaction(APIView):
             }, status=status.HTTP_404_NOT_FOUND)
         
         if res_data['data']['status'] == "success":
-            # If already marked successful, skip update
-            if tx.status != PaystackTransaction.StatusChoices.SUCCESS:
-                tx.status = PaystackTransaction.StatusChoices.SUCCESS
-                tx.paid_at = res_data['data']['paid_at']
-                tx.gateway_response = res_data['data'].get('gateway_response')
-                tx.save()
-
-                # Check and update order if necessary
-                if tx.order and tx.order.status != Order.Status.PAID:
-                    update_order_status(tx.order, Order.Status.PAID, request.user)
+            # Skipped when already marked successful, the webhook and this share one locked path
+            record_successful_payment(
+                tx.id,
+                paid_at=res_data['data']['paid_at'],
+                gateway_response=res_data['data'].get('gateway_response'),
+                changed_by=request.user,
+            )
 
             model_data = Order.objects.get(id=tx.order.id)
             serializer = OrderSerializer(model_data)
@@ -242,42 +241,20 @@ def transaction_webhook(request):
         reference = data.get('reference')
 
     if event_type == 'charge.success':
-        tx.status = PaystackTransaction.StatusChoices.SUCCESS
-        tx.paid_at = data.get('paid_at')
-        tx.gateway_response = data.get('gateway_response')
-        tx.save()
-
-        if order and order.status != Order.Status.PAID:
-            try:
-                with transaction.atomic():
-                    for item in order.order_items.all():
-                        variant = item.variant
-                        variant.reserved_quantity -= item.quantity
-                        variant.save()
-                        update_quantity(variant.product)
-                    CartItem.objects.filter(cart__user=order.user).delete()
-                    update_order_status(order, Order.Status.PAID)
-            except Exception as e:
-                logger.error(f"Error updating order {order.id} on charge.success webhook: {str(e)}")
-                raise
-                # pass
+        try:
+            record_successful_payment(
+                tx.id, paid_at=data.get('paid_at'), gateway_response=data.get('gateway_response')
+            )
+        except Exception as e:
+            logger.error(f"Error updating order {tx.order_id} on charge.success webhook: {str(e)}")
+            raise
+            # pass
     elif event_type == "charge.failed":
-        tx.status = PaystackTransaction.StatusChoices.FAILED
-        tx.save()
-
-        if order:
-            try:
-                with transaction.atomic():
-                    for item in order.order_items.all():
-                        variant = item.variant
-                        variant.reserved_squantity -= item.quantity
-                        variant.stock_quantity += item.quantity
-                        variant.save()
-                        update_quantity(variant.product)
-                    update_order_status(order, Order.Status.FAILED)
-            except Exception as e:
-                logger.error(f"Error updating order {order.id} on charge.failed webhook: {str(e)}")
-                pass
+        try:
+            record_failed_payment(tx.id)
+        except Exception as e:
+            logger.error(f"Error updating order {tx.order_id} on charge.failed webhook: {str(e)}")
+            pass
 
     elif event_type in ["transfer.success", "transfer.failed"]:
         payout = Payout.objects.filter(reference_id=reference).first()
@@ -0,0 +1,200 @@
+import csv
+import json
+from collections import defaultdict
+from django.contrib.contenttypes.models import ContentType
+from logistics.models import Logistics
+from .import_utils import (
+    PRODUCT_COLUMNS, VARIANT_COLUMNS, VARIANT_FIELDS, IMAGE_SEPARATOR,
+    RESERVED_KEYS, PROTECTED_FIELDS
+)
+from .models import ProductVariant
+from .utils import CATEGORY_MODEL_MAP, image_model_map
+from .xlsx_utils import xlsx_stream
+
+
+EXPORT_CHUNK_SIZE = 500
+# sku and version let a re-import update the same variants, and reject
+# rows whose variant changed (a sale, a stock sync) since the export
+EXPORT_VARIANT_FIELDS = ["sku", "version"] + VARIANT_FIELDS
+
+
+def _product_fields(model):
+    """Concrete product fields that the import accepts back"""
+    return [
+        f.name for f in model._meta.concrete_fields
+        if f.name not in PROTECTED_FIELDS and f.name not in RESERVED_KEYS
+    ]
+
+
+def category_columns():
+    """Category specific columns, so one header covers all eight models"""
+    columns = []
+    for model in CATEGORY_MODEL_MAP.values():
+        for name in _product_fields(model):
+            if name not in PRODUCT_COLUMNS and name not in columns:
+                columns.append(name)
+    return columns
+
+
+def export_header():
+    return PRODUCT_COLUMNS + VARIANT_COLUMNS + category_columns()
+
+
+def _value(value):
+    """Plain JSON/CSV value for a model attribute"""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float, str)):
+        return value
+    return str(value)
+
+
+def _logistics(row):
+    if not row:
+        return None
+    return {"weight_measurement": row.weight_measurement, "total_weight": str(row.total_weight)}
+
+
+def iter_shop_payloads(shop, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield every product of a shop in the create/import payload shape,
+    the handle being the product id so the file can be imported back as updates.
+    Products stream from a server-side cursor per category model and their
+    variants, logistics and images are fetched in one query each per chunk
+    """
+    content_types = ContentType.objects.get_for_models(*CATEGORY_MODEL_MAP.values())
+
+    for category, model in CATEGORY_MODEL_MAP.items():
+        fields = _product_fields(model)
+        products = model.objects.filter(shop=shop).select_related(
+            'sub_category'
+        ).order_by('created_at', 'id').iterator(chunk_size=chunk_size)
+
+        chunk = []
+        for product in products:
+            chunk.append(product)
+            if len(chunk) >= chunk_size:
+                yield from _chunk_payloads(chunk, category, fields, content_types[model])
+                chunk = []
+        if chunk:
+            yield from _chunk_payloads(chunk, category, fields, content_types[model])
+
+
+def _chunk_payloads(products, category, fields, content_type):
+    ids = [p.id for p in products]
+    image_model = image_model_map[products[0].__class__.__name__]
+
+    images = defaultdict(list)
+    for image in image_model.objects.filter(product_id__in=ids).order_by('id'):
+        images[image.product_id].append({"url": image.url, "alt_text": image.alt_text})
+
+    variants = defaultdict(list)
+    variant_rows = list(
+        ProductVariant.objects.filter(content_type=content_type, object_id__in=ids).order_by('sku')
+    )
+    for variant in variant_rows:
+        variants[variant.object_id].append(variant)
+
+    variant_logistics, product_logistics = {}, {}
+    logistics_rows = Logistics.objects.filter(
+        product_variant__in=[v.id for v in variant_rows]
+    ) | Logistics.objects.filter(content_type=content_type, object_id__in=ids)
+    for row in logistics_rows:
+        if row.product_variant_id:
+            variant_logistics[row.product_variant_id] = row
+        else:
+            product_logistics[row.object_id] = row
+
+    for product in products:
+        payload = {
+            "handle": str(product.id),
+            "category": category,
+            "sub_category": product.sub_category.name,
+        }
+        for name in fields:
+            value = _value(getattr(product, name))
+            if value is not None:
+                payload[name] = value
+
+        payload["images"] = images.get(product.id, [])
+        payload["variants"] = []
+        for variant in variants.get(product.id, []):
+            data = {
+                name: _value(getattr(variant, name))
+                for name in EXPORT_VARIANT_FIELDS if getattr(variant, name) is not None
+            }
+            logistics = _logistics(variant_logistics.get(variant.id))
+            if logistics:
+                data["logistics"] = logistics
+            payload["variants"].append(data)
+
+        logistics = _logistics(product_logistics.get(product.id))
+        if logistics:
+            payload["logistics"] = logistics
+
+        yield payload
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def iter_rows(payloads, header):
+    """Flatten payloads into import compatible rows, one per variant"""
+    for payload in payloads:
+        base = {
+            key: value for key, value in payload.items()
+            if key not in ("images", "variants", "logistics")
+        }
+        base["images"] = IMAGE_SEPARATOR.join(img["url"] for img in payload["images"])
+        if payload.get("logistics"):
+            base.update(payload["logistics"])
+
+        variants = payload["variants"] or [{}]
+        for variant in variants:
+            row = dict(base)
+            for name, value in variant.items():
+                if name == "logistics":
+                    row["variant_weight_measurement"] = value["weight_measurement"]
+                    row["variant_total_weight"] = value["total_weight"]
+                else:
+                    row[f"variant_{name}"] = value
+            yield [_cell(row.get(column)) for column in header]
+
+
+class _Echo:
+    """Pseudo buffer so csv.writer hands back each row instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def csv_stream(shop):
+    header = export_header()
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header).encode("utf-8")
+    for row in iter_rows(iter_shop_payloads(shop), header):
+        yield writer.writerow(row).encode("utf-8")
+
+
+def jsonl_stream(shop):
+    for payload in iter_shop_payloads(shop):
+        yield (json.dumps(payload, default=str) + "\n").encode("utf-8")
+
+
+def xlsx_export_stream(shop):
+    header = export_header()
+    return xlsx_stream(header, iter_rows(iter_shop_payloads(shop), header))
+
+
+EXPORT_FORMATS = {
+    "csv": (csv_stream, "text/csv"),
+    "jsonl": (jsonl_stream, "application/x-ndjson"),
+    "xlsx": (xlsx_export_stream, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
@@ -0,0 +1,315 @@
+import csv
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+from xml.sax.saxutils import escape
+from django.conf import settings
+from django.utils import timezone
+from media.utils.s3 import upload_file, delete_file
+from .index_utils import format_sync_token, get_sync_head, has_changes_after
+from .models import ProductIndex, ProductFeedShard
+from .textchoices import ProductCondition
+
+logger = logging.getLogger(__name__)
+
+
+SITEMAP_SHARD_SIZE = 50000  # sitemaps.org per-file URL limit
+FEED_FIELDS = (
+    "id", "title", "slug", "description", "price",
+    "image", "brand", "condition", "quantity", "created_at",
+)
+FEED_CSV_HEADER = [
+    "id", "title", "description", "link", "image_link",
+    "price", "availability", "brand", "condition",
+]
+FEED_MAX_DESCRIPTION = 5000
+
+SITEMAP_INDEX_NAME = "sitemap.xml.gz"
+FEED_CSV_NAME = "products.csv.gz"
+FEED_XML_NAME = "products.xml.gz"
+
+
+class _Echo:
+    """Pseudo buffer so csv.writer hands back each row instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def product_url(slug):
+    return f"{settings.FRONTEND_BASE_URL}/product/{slug}"
+
+
+def iter_published_rows(chunk_size=2000):
+    """
+    Stream published index rows with a server-side cursor.
+    Ordered by creation so new products are appended to the last sitemap shard
+    """
+    return ProductIndex.objects.filter(
+        is_published=True
+    ).order_by('created_at', 'id').values(*FEED_FIELDS).iterator(chunk_size=chunk_size)
+
+
+def sitemap_shard_name(number):
+    return f"sitemap-{number}.xml.gz"
+
+
+def sitemap_chunks(rows):
+    """Yield a sitemap urlset for the given rows"""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    )
+    for row in rows:
+        yield (
+            f"<url><loc>{escape(product_url(row['slug']))}</loc>"
+            f"<lastmod>{row['created_at'].date().isoformat()}</lastmod></url>\n"
+        )
+    yield "</urlset>\n"
+
+
+def sitemap_index_chunks(shard_urls):
+    """Yield a sitemap index pointing at each (url, lastmod) shard"""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+    )
+    for url, lastmod in shard_urls:
+        yield (
+            f"<sitemap><loc>{escape(url)}</loc>"
+            f"<lastmod>{lastmod.isoformat()}</lastmod></sitemap>\n"
+        )
+    yield "</sitemapindex>\n"
+
+
+def _feed_item(row):
+    """Map an index row to merchant feed values"""
+    condition = "new" if row["condition"] == ProductCondition.NEW else "used"
+    return {
+        "id": str(row["id"]),
+        "title": row["title"],
+        "description": (row["description"] or "")[:FEED_MAX_DESCRIPTION],
+        "link": product_url(row["slug"]),
+        "image_link": row["image"] or "",
+        "price": f"{row['price']} NGN",
+        "availability": "in_stock" if row["quantity"] > 0 else "out_of_stock",
+        "brand": row["brand"] or "",
+        "condition": condition,
+    }
+
+
+def feed_csv_chunks(rows):
+    """Yield the product feed as CSV lines"""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FEED_CSV_HEADER)
+    for row in rows:
+        item = _feed_item(row)
+        yield writer.writerow([item[column] for column in FEED_CSV_HEADER])
+
+
+def feed_xml_chunks(rows):
+    """Yield the product feed as an RSS 2.0 merchant feed"""
+    yield (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0" xmlns:g="http://base.google.com/ns/1.0"><channel>\n'
+        f"<title>Horal</title><link>{escape(settings.FRONTEND_BASE_URL)}</link>\n"
+    )
+    for row in rows:
+        item = _feed_item(row)
+        yield "<item>" + "".join(
+            f"<g:{key}>{escape(value)}</g:{key}>" for key, value in item.items()
+        ) + "</item>\n"
+    yield "</channel></rss>\n"
+
+
+class FeedWriter:
+    """
+    Writes generated files to S3 through media/utils/s3.py,
+    or to a local directory when one is given.
+    `destination` keys the shard rows, so a local run never marks S3 files as written
+    """
+
+    def __init__(self, output_dir=None, base_url=None, prefix="feeds"):
+        self.output_dir = output_dir
+        self.prefix = prefix
+        self.destination = os.path.abspath(output_dir) if output_dir else ""
+        if base_url:
+            self.base_url = base_url.rstrip("/")
+        elif output_dir:
+            self.base_url = settings.FRONTEND_BASE_URL
+        else:
+            self.base_url = f"{settings.MEDIA_URL}{prefix}"
+
+    def url_for(self, name):
+        return f"{self.base_url}/{name}"
+
+    def stage(self, chunks):
+        """
+        Gzip chunks into a temp file and checksum the raw content,
+        so memory use stays flat whatever the catalog size
+        """
+        digest = hashlib.sha256()
+        tmp = tempfile.TemporaryFile()
+        with gzip.GzipFile(fileobj=tmp, mode="wb", mtime=0) as gz:
+            for chunk in chunks:
+                data = chunk.encode("utf-8")
+                digest.update(data)
+                gz.write(data)
+        tmp.seek(0)
+        return digest.hexdigest(), tmp
+
+    def publish(self, name, tmp):
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+            with open(os.path.join(self.output_dir, name), "wb") as f:
+                while block := tmp.read(1024 * 1024):
+                    f.write(block)
+        else:
+            upload_file(tmp, f"{self.prefix}/{name}", content_type="application/gzip")
+
+    def remove(self, name):
+        if self.output_dir:
+            path = os.path.join(self.output_dir, name)
+            if os.path.exists(path):
+                os.remove(path)
+        else:
+            delete_file(f"{self.prefix}/{name}")
+
+
+def _store(writer, name, chunks, token, force):
+    """Write one file, only publishing when its content actually changed"""
+    checksum, tmp = writer.stage(chunks)
+    shard = ProductFeedShard.objects.filter(destination=writer.destination, name=name).first()
+    last_txid, last_seq = token
+
+    with tmp:
+        if shard and shard.checksum == checksum and not force:
+            shard.last_txid, shard.last_seq = last_txid, last_seq
+            shard.save(update_fields=["last_txid", "last_seq"])
+            return shard, False
+
+        writer.publish(name, tmp)
+
+    shard, _ = ProductFeedShard.objects.update_or_create(
+        destination=writer.destination,
+        name=name,
+        defaults={
+            "checksum": checksum,
+            "last_txid": last_txid,
+            "last_seq": last_seq,
+            "generated_at": timezone.now(),
+        }
+    )
+    return shard, True
+
+
+class _Counter:
+    """Wrap an iterator, counting items and stopping after a limit"""
+
+    def __init__(self, iterator, limit=None):
+        self.iterator = iterator
+        self.limit = limit
+        self.count = 0
+        self.exhausted = False
+
+    def __iter__(self):
+        while self.limit is None or self.count < self.limit:
+            try:
+                item = next(self.iterator)
+            except StopIteration:
+                self.exhausted = True
+                return
+            self.count += 1
+            yield item
+
+
+def generate_sitemaps(writer, token, force=False, chunk_size=2000):
+    """Write sitemap shards in a single cursor pass, then the index"""
+    rows = iter_published_rows(chunk_size=chunk_size)
+    shards, written, number = [], 0, 0
+
+    while True:
+        number += 1
+        counter = _Counter(rows, SITEMAP_SHARD_SIZE)
+        name = sitemap_shard_name(number)
+        shard, changed = _store(writer, name, sitemap_chunks(counter), token, force)
+
+        if counter.count == 0 and number > 1:
+            # Nothing left for this shard, drop the empty file we just staged
+            ProductFeedShard.objects.filter(destination=writer.destination, name=name).delete()
+            if changed:
+                writer.remove(name)
+            number -= 1
+            break
+
+        if shard.item_count != counter.count:
+            shard.item_count = counter.count
+            shard.save(update_fields=["item_count"])
+        shards.append(shard)
+        written += changed
+
+        if counter.exhausted:
+            break
+
+    # Remove shards left over from a larger catalog
+    stale = ProductFeedShard.objects.filter(
+        destination=writer.destination, name__startswith="sitemap-"
+    ).exclude(name__in=[sitemap_shard_name(n) for n in range(1, number + 1)])
+    for shard in stale:
+        writer.remove(shard.name)
+    stale.delete()
+
+    index_urls = [(writer.url_for(s.name), s.generated_at) for s in shards]
+    index, changed = _store(writer, SITEMAP_INDEX_NAME, sitemap_index_chunks(index_urls), token, force)
+    ProductFeedShard.objects.filter(pk=index.pk).update(item_count=len(shards))
+    return {"shards": len(shards), "written": written + changed}
+
+
+def generate_product_feeds(writer, token, force=False, chunk_size=2000):
+    """Write the CSV and XML merchant feeds"""
+    written = 0
+    for name, render in ((FEED_CSV_NAME, feed_csv_chunks), (FEED_XML_NAME, feed_xml_chunks)):
+        counter = _Counter(iter_published_rows(chunk_size=chunk_size))
+        shard, changed = _store(writer, name, render(counter), token, force)
+        ProductFeedShard.objects.filter(pk=shard.pk).update(item_count=counter.count)
+        written += changed
+    return {"written": written}
+
+
+def generate_all(output_dir=None, base_url=None, force=False, chunk_size=2000, only=None):
+    """
+    Regenerate sitemaps and feeds, skipping the whole run when the catalog
+    change log has no entries after the token of the last generation.
+    The token is taken before reading, so a change committing mid-run is
+    after it and picked up next time
+    """
+    token = get_sync_head()
+    names = {
+        "sitemap": [SITEMAP_INDEX_NAME],
+        "feed": [FEED_CSV_NAME, FEED_XML_NAME],
+    }
+    targets = [only] if only else list(names)
+
+    results = {}
+    writer = FeedWriter(output_dir=output_dir, base_url=base_url)
+    for target in targets:
+        tokens = list(ProductFeedShard.objects.filter(
+            destination=writer.destination, name__in=names[target]
+        ).values_list('last_txid', 'last_seq'))
+        up_to_date = (
+            len(tokens) == len(names[target])
+            and len(set(tokens)) == 1
+            and not has_changes_after(tokens[0])
+        )
+
+        if up_to_date and not force:
+            results[target] = {"skipped": True}
+            continue
+
+        generate = generate_sitemaps if target == "sitemap" else generate_product_feeds
+        results[target] = generate(writer, token, force=force, chunk_size=chunk_size)
+        logger.info(f"Generated {target} at change token {format_sync_token(token)}: {results[target]}")
+
+    return results
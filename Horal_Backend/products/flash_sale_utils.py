@@ -0,0 +1,438 @@
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django_redis import get_redis_connection
+from .inventory_utils import refresh_product_quantities
+from .models import ProductVariant
+from .reservation_utils import (
+    InsufficientStock, InventoryModeChanged, _quantities, _per_variant,
+    lock_variants, reserve_stock, release_stock, commit_stock,
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Available units of a flash sale variant, only present while the sale runs
+STOCK_PREFIX = "flash:stock:"
+# Hash of variant id -> quantity held by one reservation token (the order id)
+HOLD_PREFIX = "flash:hold:"
+# Sorted set of hold tokens scored by expiry time
+HOLDS_KEY = "flash:holds"
+# "seq:variant:stock delta:reserved delta" entries waiting to be applied to Postgres
+JOURNAL_KEY = "flash:journal"
+SEQ_KEY = "flash:seq"
+RECONCILE_LOCK = "flash:reconcile"
+# Marks a committed, released or swept hold, so settling the order again moves no stock
+SETTLED_FIELD = "_settled"
+SETTLED_TTL = 60 * 60 * 24
+
+
+# Scripts take KEYS = holds, journal, seq and ARGV = stock prefix, hold prefix, ...
+# Stock and hold keys are derived from ids inside the script, which needs a
+# single Redis instance (not Redis Cluster)
+SETTLE_LUA = """
+local function settle(token, restock)
+    local hold = ARGV[2] .. token
+    local fields = redis.call('HGETALL', hold)
+    redis.call('ZREM', KEYS[1], token)
+    if #fields == 0 or redis.call('HEXISTS', hold, '""" + SETTLED_FIELD + """') == 1 then
+        return fields
+    end
+    local seq = redis.call('INCR', KEYS[3])
+    for i = 1, #fields, 2 do
+        local variant, quantity = fields[i], fields[i + 1]
+        local stock_delta = 0
+        -- A stopped sale has no counter left, Postgres gets the units back through the journal
+        if restock == 1 then
+            stock_delta = quantity
+            if redis.call('EXISTS', ARGV[1] .. variant) == 1 then
+                redis.call('INCRBY', ARGV[1] .. variant, quantity)
+            end
+        end
+        redis.call('RPUSH', KEYS[2], seq .. ':' .. variant .. ':' .. stock_delta .. ':-' .. quantity)
+    end
+    redis.call('HSET', hold, '""" + SETTLED_FIELD + """', 1)
+    redis.call('EXPIRE', hold, """ + str(SETTLED_TTL) + """)
+    return fields
+end
+"""
+
+# ARGV[3] token, ARGV[4] expires at, then variant id, quantity pairs
+RESERVE_LUA = """
+local hold = ARGV[2] .. ARGV[3]
+local held = {}
+if redis.call('HEXISTS', hold, '""" + SETTLED_FIELD + """') == 0 then
+    local fields = redis.call('HGETALL', hold)
+    for i = 1, #fields, 2 do
+        held[fields[i]] = tonumber(fields[i + 1])
+    end
+end
+
+local wanted = {}
+local shortages = {}
+for i = 5, #ARGV, 2 do
+    local variant, quantity = ARGV[i], tonumber(ARGV[i + 1])
+    wanted[variant] = quantity
+    local stock = redis.call('GET', ARGV[1] .. variant)
+    if not stock then
+        return {'missing', variant}
+    end
+    local available = tonumber(stock) + (held[variant] or 0)
+    if available < quantity then
+        table.insert(shortages, variant)
+        table.insert(shortages, available)
+    end
+end
+if #shortages > 0 then
+    return {'short', unpack(shortages)}
+end
+
+-- Net move per variant: the previous hold goes back, the new one comes out
+local moved = {}
+for variant, quantity in pairs(held) do
+    moved[variant] = -quantity
+end
+for variant, quantity in pairs(wanted) do
+    moved[variant] = (moved[variant] or 0) + quantity
+end
+
+local seq = redis.call('INCR', KEYS[3])
+for variant, quantity in pairs(moved) do
+    if quantity ~= 0 then
+        if redis.call('EXISTS', ARGV[1] .. variant) == 1 then
+            redis.call('DECRBY', ARGV[1] .. variant, quantity)
+        end
+        redis.call('RPUSH', KEYS[2], seq .. ':' .. variant .. ':' .. -quantity .. ':' .. quantity)
+    end
+end
+
+redis.call('DEL', hold)
+if next(wanted) then
+    for variant, quantity in pairs(wanted) do
+        redis.call('HSET', hold, variant, quantity)
+    end
+    redis.call('ZADD', KEYS[1], ARGV[4], ARGV[3])
+else
+    redis.call('ZREM', KEYS[1], ARGV[3])
+end
+return {'ok'}
+"""
+
+# ARGV[3] 1 to give the units back (release), 0 to consume them (commit), then tokens
+SETTLE_MANY_LUA = SETTLE_LUA + """
+local settled = {}
+for i = 4, #ARGV do
+    table.insert(settled, settle(ARGV[i], tonumber(ARGV[3])))
+end
+return settled
+"""
+
+# ARGV[3] now, ARGV[4] limit
+SWEEP_LUA = SETTLE_LUA + """
+local tokens = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[3], 'LIMIT', 0, ARGV[4])
+for _, token in ipairs(tokens) do
+    settle(token, 1)
+end
+return #tokens
+"""
+
+_scripts = {}
+
+
+def _redis():
+    return get_redis_connection("default")
+
+
+def _run(name, source, *args):
+    """Run a Lua script by sha, loading it once per process"""
+    if name not in _scripts:
+        _scripts[name] = _redis().register_script(source)
+    return _scripts[name](keys=[HOLDS_KEY, JOURNAL_KEY, SEQ_KEY], args=[STOCK_PREFIX, HOLD_PREFIX, *args])
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _hold_lines(fields):
+    """{variant id: quantity} from a flat HGETALL reply, without the settled marker"""
+    lines = {}
+    for variant_id, quantity in zip(fields[::2], fields[1::2]):
+        variant_id = _decode(variant_id)
+        if variant_id != SETTLED_FIELD:
+            lines[uuid.UUID(variant_id)] = int(quantity)
+    return lines
+
+
+def held_flash_stock(token, active_only=False):
+    """
+    Variants and quantities held in Redis for a reservation token, including a
+    settled hold's lines unless `active_only`
+    """
+    fields = {_decode(field): value for field, value in _redis().hgetall(f"{HOLD_PREFIX}{token}").items()}
+    if active_only and SETTLED_FIELD in fields:
+        return {}
+    return {
+        uuid.UUID(variant_id): int(quantity)
+        for variant_id, quantity in fields.items()
+        if variant_id != SETTLED_FIELD
+    }
+
+
+def flash_sale_stock(variant_ids):
+    """Units still available in the Redis counters, None for variants not on sale"""
+    variant_ids = list(variant_ids)
+    values = _redis().mget([f"{STOCK_PREFIX}{variant_id}" for variant_id in variant_ids])
+    return {
+        variant_id: int(value) if value is not None else None
+        for variant_id, value in zip(variant_ids, values)
+    }
+
+
+def reserve_flash_stock(token, quantities, variants=None):
+    """
+    Atomically replace the hold of `token` with `quantities` ({variant id: quantity})
+    in one Lua call. Every line is checked before anything is decremented, so
+    the counters never go below zero.
+    Raises InsufficientStock, or InventoryModeChanged when a variant is not on sale
+    """
+    variants = variants or {}
+    expires_at = time.time() + settings.FLASH_SALE_HOLD_TTL
+    args = []
+    for variant_id, quantity in quantities.items():
+        args += [str(variant_id), quantity]
+
+    status, *rest = _run("reserve", RESERVE_LUA, str(token), expires_at, *args)
+    status = _decode(status)
+    if status == "missing":
+        variant_id = uuid.UUID(_decode(rest[0]))
+        raise InventoryModeChanged([variants.get(variant_id, variant_id)])
+    if status == "short":
+        shortages = {}
+        for variant_id, available in zip(rest[::2], rest[1::2]):
+            variant_id = uuid.UUID(_decode(variant_id))
+            shortages[variants.get(variant_id, variant_id)] = available
+        raise InsufficientStock(shortages)
+
+
+def settle_flash_holds(tokens, commit):
+    """
+    Consume (commit) or give back (release) the holds of many tokens in one
+    Lua call. Returns {token: {variant id: quantity}} for tokens that had a hold.
+    Holds are marked settled instead of deleted, so settling a token again (a
+    replay after the Postgres transaction around it rolled back) returns the
+    same lines without moving any stock
+    """
+    tokens = [str(token) for token in tokens]
+    if not tokens:
+        return {}
+    replies = _run("settle", SETTLE_MANY_LUA, 0 if commit else 1, *tokens)
+    return {token: _hold_lines(fields) for token, fields in zip(tokens, replies) if fields}
+
+
+def release_expired_flash_holds(now=None, limit=1000):
+    """Give back the stock of holds past FLASH_SALE_HOLD_TTL, returns how many were released"""
+    released = 0
+    while True:
+        count = _run("sweep", SWEEP_LUA, now or time.time(), limit)
+        released += count
+        if count < limit:
+            return released
+
+
+def _apply_journal(entries):
+    """Apply journal entries to the stock columns, skipping any already applied"""
+    parsed = []
+    for entry in entries:
+        seq, variant_id, stock_delta, reserved_delta = _decode(entry).split(":")
+        parsed.append((int(seq), uuid.UUID(variant_id), int(stock_delta), int(reserved_delta)))
+
+    with transaction.atomic():
+        variants = lock_variants({variant_id for _, variant_id, _, _ in parsed})
+
+        stock, reserved, seqs = defaultdict(int), defaultdict(int), {}
+        for seq, variant_id, stock_delta, reserved_delta in parsed:
+            variant = variants.get(variant_id)
+            # Entries survive a crash between the Postgres commit and the trim, the seq makes replays no-ops
+            if not variant or seq <= variant.flash_sale_seq:
+                continue
+            stock[variant_id] += stock_delta
+            reserved[variant_id] += reserved_delta
+            seqs[variant_id] = max(seq, seqs.get(variant_id, 0))
+
+        if seqs:
+            ProductVariant.objects.filter(id__in=seqs.keys()).update(
+                stock_quantity=F('stock_quantity') + _per_variant(stock),
+                reserved_quantity=F('reserved_quantity') + _per_variant(reserved),
+                flash_sale_seq=_per_variant(seqs),
+                version=F('version') + 1,
+            )
+
+        # Only commits change stock + reserved
+        refresh_product_quantities({
+            (variants[variant_id].content_type_id, variants[variant_id].object_id)
+            for variant_id in seqs if stock[variant_id] + reserved[variant_id]
+        })
+    return len(seqs)
+
+
+def _drain_journal(redis, batch_size=None):
+    batch_size = batch_size or settings.FLASH_SALE_RECONCILE_BATCH
+    consumed = 0
+    while True:
+        entries = redis.lrange(JOURNAL_KEY, 0, batch_size - 1)
+        if not entries:
+            return consumed
+        _apply_journal(entries)
+        redis.ltrim(JOURNAL_KEY, len(entries), -1)
+        consumed += len(entries)
+
+
+def _reconcile_lock(redis, blocking=True):
+    # Always taken before any variant row lock, so reconcilers and start/stop never wait on each other in a cycle
+    return redis.lock(RECONCILE_LOCK, timeout=300, blocking=blocking, blocking_timeout=30)
+
+
+def reconcile_flash_journal(batch_size=None):
+    """
+    Apply the Redis journal to Postgres in batches. One reconciler runs at a
+    time; returns the number of journal entries consumed, or None when another
+    reconciler holds the lock
+    """
+    redis = _redis()
+    lock = _reconcile_lock(redis, blocking=False)
+    if not lock.acquire():
+        return None
+    try:
+        return _drain_journal(redis, batch_size)
+    finally:
+        lock.release()
+
+
+def start_flash_sale(variant_ids):
+    """
+    Flag the variants and load their stock into Redis counters. The variant
+    rows stay locked until the counters exist, so no Postgres checkout can
+    reserve the same units
+    """
+    redis = _redis()
+    with _reconcile_lock(redis), transaction.atomic():
+        _drain_journal(redis)
+        variants = lock_variants(variant_ids)
+        ProductVariant.objects.filter(id__in=variants.keys()).update(is_flash_sale=True)
+
+        pipe = redis.pipeline()
+        for variant in variants.values():
+            pipe.set(f"{STOCK_PREFIX}{variant.id}", variant.stock_quantity)
+        pipe.execute()
+    return list(variants.values())
+
+
+def stop_flash_sale(variant_ids):
+    """
+    Drop the Redis counters, apply the journal and clear the flag, all while
+    holding the variant rows, so Postgres checkouts resume on exact stock.
+    Outstanding holds can still be committed or released afterwards
+    """
+    redis = _redis()
+    with _reconcile_lock(redis), transaction.atomic():
+        variants = lock_variants(variant_ids)
+        if variants:
+            redis.delete(*[f"{STOCK_PREFIX}{variant_id}" for variant_id in variants])
+        _drain_journal(redis)
+        ProductVariant.objects.filter(id__in=variants.keys()).update(is_flash_sale=False)
+    return list(variants.values())
+
+
+def reserve_order_stock(order_id, lines, release=()):
+    """
+    Reserve an order's (variant_id, quantity) lines, replacing what the
+    previous checkout of the same order reserved. Everything but flash sale
+    variants goes through reserve_stock; those are only looked up here and
+    held in Redis by hold_order_flash_stock once nothing else can fail.
+    Returns the variants by id
+    """
+    quantities = _quantities(lines)
+    flash = {
+        variant.id: variant
+        for variant in ProductVariant.objects.filter(id__in=quantities.keys(), is_flash_sale=True)
+    } if quantities else {}
+    held = held_flash_stock(order_id)
+
+    variants = reserve_stock(
+        [(variant_id, quantity) for variant_id, quantity in quantities.items() if variant_id not in flash],
+        release=[(variant_id, quantity) for variant_id, quantity in release if variant_id not in held],
+    )
+    return {**variants, **flash}
+
+
+def hold_order_flash_stock(order_id, lines, variants):
+    """
+    Replace the Redis hold of an order with its flash sale lines, `variants`
+    as returned by reserve_order_stock. Returns the previous hold, empty when
+    it was already settled
+    """
+    quantities = _quantities(lines)
+    flash = {variant_id: variant for variant_id, variant in variants.items() if variant.is_flash_sale}
+    previous = held_flash_stock(order_id, active_only=True)
+    if flash or previous:
+        reserve_flash_stock(order_id, {variant_id: quantities[variant_id] for variant_id in flash}, flash)
+    return previous
+
+
+@contextmanager
+def flash_checkout_hold():
+    """
+    Wraps a checkout transaction and yields hold(order_id, lines, variants),
+    to be called as its very last step. Redis does not roll back with
+    Postgres, so a hold taken earlier would outlive a failed checkout; if the
+    transaction still fails after the hold (the COMMIT itself), the order's
+    previous hold is put back
+    """
+    taken = []
+
+    def hold(order_id, lines, variants):
+        taken.append((order_id, hold_order_flash_stock(order_id, lines, variants)))
+
+    try:
+        yield hold
+    except BaseException:
+        for order_id, previous in taken:
+            try:
+                if previous:
+                    reserve_flash_stock(order_id, previous)
+                else:
+                    settle_flash_holds([order_id], commit=False)
+            except Exception as e:
+                logger.error(f"Could not restore the flash sale hold of order {order_id}: {e}")
+        raise
+
+
+def _settle_orders(items, commit):
+    by_order = defaultdict(list)
+    for order_id, variant_id, quantity in items:
+        by_order[order_id].append((variant_id, quantity))
+
+    held = settle_flash_holds(by_order.keys(), commit=commit)
+    lines = [
+        (variant_id, quantity)
+        for order_id, order_lines in by_order.items()
+        for variant_id, quantity in order_lines
+        if variant_id not in held.get(str(order_id), ())
+    ]
+    (commit_stock if commit else release_stock)(lines)
+
+
+def release_order_stock(items):
+    """Give back the stock of (order_id, variant_id, quantity) items from Redis holds and Postgres"""
+    _settle_orders(items, commit=False)
+
+
+def commit_order_stock(items):
+    """Consume the stock of paid (order_id, variant_id, quantity) items from Redis holds and Postgres"""
+    _settle_orders(items, commit=True)
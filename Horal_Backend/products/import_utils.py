@@ -0,0 +1,691 @@
+import copy
+import csv
+import io
+import json
+import logging
+import uuid
+from collections import defaultdict
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import serializers
+from categories.models import Category
+from subcategories.models import SubCategory
+from logistics.models import Logistics
+from .models import ProductBulkJob, ProductIndex, ProductVariant, product_slug
+from .index_utils import (
+    index_fields, record_index_changes, bump_catalog_version,
+    build_index_rows, write_index_rows, UPSERT, DELETE,
+)
+from .utils import CATEGORY_MODEL_MAP, image_model_map, validate_logistics_placement
+from .inventory_utils import refresh_product_quantities
+from .variant_utils import allocate_skus, refresh_effective_prices, refresh_shipping_weights
+from .xlsx_utils import iter_xlsx_rows
+
+logger = logging.getLogger(__name__)
+
+
+IMPORT_CHUNK_SIZE = 500
+MAX_REPORTED_ERRORS = 1000
+
+# CSV/XLSX layout: one row per variant, rows sharing a handle form one product.
+# Any other column is passed to the product as a category specific field.
+# A handle that is the id of a product in the shop updates that product, and
+# its variants are matched by SKU (see export_utils)
+PRODUCT_COLUMNS = [
+    "handle", "category", "sub_category", "title", "description", "specifications",
+    "price", "brand", "condition", "state", "local_govt", "is_published",
+    "images", "weight_measurement", "total_weight",
+]
+VARIANT_COLUMNS = [
+    "variant_sku", "variant_version",
+    "variant_color", "variant_standard_size", "variant_size",
+    "variant_custom_size_unit", "variant_custom_size_value",
+    "variant_stock_quantity", "variant_price_override",
+    "variant_weight_measurement", "variant_total_weight",
+]
+# Variant fields a file may set, sku and version only identify the row
+VARIANT_FIELDS = [
+    "color", "standard_size", "size", "custom_size_unit",
+    "custom_size_value", "stock_quantity", "price_override",
+]
+IMAGE_SEPARATOR = "|"
+
+# Keys of the create API payload that are not plain product fields
+RESERVED_KEYS = {"handle", "category", "sub_category", "images", "variants", "logistics", "shop"}
+PROTECTED_FIELDS = {"id", "slug", "quantity", "created_at", "updated_at"}
+
+
+class ImportRowError(Exception):
+    """A row that failed validation, reported back with its line number"""
+
+
+def _handle_id(payload):
+    """The product id a handle names, None for handles that are not ids"""
+    try:
+        return uuid.UUID(str(payload.get("handle", "")).strip())
+    except ValueError:
+        return None
+
+
+def _clean(row):
+    """Drop empty cells so optional fields fall back to model defaults"""
+    return {k.strip(): v.strip() for k, v in row.items() if k and v is not None and v.strip() != ""}
+
+
+def _csv_logistics(row, prefix=""):
+    weight = row.get(f"{prefix}total_weight")
+    if weight is None:
+        return None
+    return {
+        "total_weight": weight,
+        "weight_measurement": row.get(f"{prefix}weight_measurement", "KG"),
+    }
+
+
+def _csv_variant(row):
+    variant = {
+        column[len("variant_"):]: row[column]
+        for column in VARIANT_COLUMNS
+        if column in row and "weight" not in column
+    }
+    logistics = _csv_logistics(row, prefix="variant_")
+    if logistics:
+        variant["logistics"] = logistics
+    return variant
+
+
+def _csv_payload(rows):
+    """Fold the rows of one handle into the create API payload shape"""
+    first = rows[0]
+    payload = {
+        key: value for key, value in first.items()
+        if key not in VARIANT_COLUMNS and key not in ("images", "weight_measurement", "total_weight")
+    }
+    payload["images"] = [
+        {"url": url.strip()}
+        for url in first.get("images", "").split(IMAGE_SEPARATOR) if url.strip()
+    ]
+    payload["variants"] = [_csv_variant(row) for row in rows if any(c in row for c in VARIANT_COLUMNS)]
+
+    logistics = _csv_logistics(first)
+    if logistics:
+        payload["logistics"] = logistics
+    return payload
+
+
+def _group_rows(rows):
+    """Fold consecutive (line number, row) pairs sharing a handle into products"""
+    group, group_line, handle = [], None, None
+
+    for line, row in rows:
+        row = _clean(row)
+        if not row:
+            continue
+        row_handle = row.get("handle")
+
+        if group and (row_handle is None or row_handle != handle):
+            yield group_line, _csv_payload(group)
+            group = []
+
+        if not group:
+            group_line, handle = line, row_handle
+        group.append(row)
+
+    if group:
+        yield group_line, _csv_payload(group)
+
+
+def iter_csv_products(fileobj):
+    """Yield (line number, payload) for each product in a CSV file"""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig", newline="")
+    try:
+        yield from _group_rows(enumerate(csv.DictReader(text), start=2))
+    finally:
+        # Leave the underlying file open for the caller
+        text.detach()
+
+
+def iter_xlsx_products(fileobj):
+    """Yield (line number, payload) for each product in the first sheet of an xlsx file"""
+    rows = iter_xlsx_rows(fileobj)
+    _, header = next(rows, (None, []))
+    header = [column.strip() for column in header]
+    yield from _group_rows(
+        (line, dict(zip(header, values))) for line, values in rows
+    )
+
+
+def iter_jsonl_products(fileobj):
+    """Yield (line number, payload) for each product in a JSONL file"""
+    text = io.TextIOWrapper(fileobj, encoding="utf-8-sig")
+    try:
+        for line, raw in enumerate(text, start=1):
+            if not raw.strip():
+                continue
+            try:
+                payload = json.loads(raw)
+            except ValueError as e:
+                yield line, ImportRowError(f"Invalid JSON: {str(e)}")
+                continue
+            if not isinstance(payload, dict):
+                yield line, ImportRowError("Each line must be a JSON object")
+                continue
+            yield line, payload
+    finally:
+        text.detach()
+
+
+IMPORT_READERS = {
+    "csv": iter_csv_products,
+    "jsonl": iter_jsonl_products,
+    "xlsx": iter_xlsx_products,
+}
+
+
+def _normalize_fields(instance):
+    """
+    Case-insensitive match of choice values, like normalize_choice on the API,
+    and spreadsheet style booleans such as "TRUE" or "yes"
+    """
+    for field in instance._meta.concrete_fields:
+        value = getattr(instance, field.attname)
+        if not isinstance(value, str):
+            continue
+
+        if isinstance(field, models.BooleanField):
+            lowered = value.strip().lower()
+            if lowered in ("true", "yes", "1", "t", "y"):
+                setattr(instance, field.attname, True)
+            elif lowered in ("false", "no", "0", "f", "n"):
+                setattr(instance, field.attname, False)
+        elif field.choices:
+            for choice, _ in field.choices:
+                if str(choice).lower() == value.lower():
+                    setattr(instance, field.attname, choice)
+                    break
+
+
+def _error_message(error):
+    if isinstance(error, ValidationError):
+        if hasattr(error, "message_dict"):
+            return "; ".join(f"{k}: {', '.join(v)}" for k, v in error.message_dict.items())
+        return "; ".join(error.messages)
+    if isinstance(error, serializers.ValidationError):
+        detail = error.detail
+        if isinstance(detail, list):
+            return "; ".join(str(d) for d in detail)
+        return str(detail)
+    return str(error)
+
+
+class _PendingProduct:
+    """
+    A validated product and the rows to write alongside it.
+    `versions` holds the version each existing variant was read at and
+    `read_at` the product's updated_at, both only set for updates
+    """
+
+    def __init__(self, line, category, product, images, variants, logistics, versions=None):
+        self.line = line
+        self.category = category
+        self.product = product
+        self.images = images
+        self.variants = variants
+        self.logistics = logistics
+        self.versions = versions
+        self.is_update = versions is not None
+        self.read_at = product.updated_at if self.is_update else None
+
+
+class ProductImporter:
+    """
+    Validates and writes products in chunks.
+    Lookups are preloaded once, existing products and duplicate checks
+    take a few queries per chunk, and each chunk is written in bulk
+    inside a transaction
+    """
+
+    def __init__(self, job, chunk_size=IMPORT_CHUNK_SIZE):
+        self.job = job
+        self.shop = job.shop
+        self.chunk_size = chunk_size
+        self.errors = []
+        self.succeeded = 0
+        self.failed = 0
+        self.processed = 0
+
+        self.categories = {
+            c.name.lower(): c for c in Category.objects.all()
+            if c.name.lower() in CATEGORY_MODEL_MAP
+        }
+        self.sub_categories = {}
+        for sub in SubCategory.objects.filter(category__in=self.categories.values()):
+            self.sub_categories[(sub.category_id, sub.name.lower())] = sub
+            self.sub_categories[(sub.category_id, str(sub.id))] = sub
+
+        self.content_types = ContentType.objects.get_for_models(*CATEGORY_MODEL_MAP.values())
+        self.model_fields = {
+            model: {f.name for f in model._meta.concrete_fields} - PROTECTED_FIELDS
+            for model in CATEGORY_MODEL_MAP.values()
+        }
+        # Products of the current chunk that already exist, by id, and their variants by SKU
+        self.existing = {}
+        self.existing_variants = {}
+
+    def load_existing(self, rows):
+        """
+        Fetch the shop's products named by the chunk's handles and their
+        variants, with one query per category plus one for the variants
+        """
+        ids = defaultdict(set)
+        for _, payload in rows:
+            if isinstance(payload, dict):
+                model = CATEGORY_MODEL_MAP.get(str(payload.get("category", "")).strip().lower())
+                product_id = _handle_id(payload)
+                if model and product_id:
+                    ids[model].add(product_id)
+
+        self.existing, self.existing_variants = {}, defaultdict(dict)
+        for model, product_ids in ids.items():
+            for product in model.objects.filter(shop=self.shop, id__in=product_ids):
+                self.existing[product.id] = product
+        if self.existing:
+            for variant in ProductVariant.objects.filter(object_id__in=self.existing.keys()):
+                self.existing_variants[variant.object_id][variant.sku] = variant
+
+    # Validation
+    def build(self, line, payload):
+        """Turn one payload into unsaved model instances, without queries"""
+        if isinstance(payload, ImportRowError):
+            raise payload
+
+        category_name = str(payload.get("category", "")).strip().lower()
+        model = CATEGORY_MODEL_MAP.get(category_name)
+        category = self.categories.get(category_name)
+        if not model or not category:
+            raise ImportRowError(f"Invalid category: {payload.get('category')}")
+
+        sub_category = self.sub_categories.get(
+            (category.id, str(payload.get("sub_category", "")).strip().lower())
+        )
+        if not sub_category:
+            raise ImportRowError(f"Invalid sub_category: {payload.get('sub_category')}")
+
+        fields = {k: v for k, v in payload.items() if k not in RESERVED_KEYS}
+        unknown = set(fields) - self.model_fields[model]
+        if unknown:
+            raise ImportRowError(f"Unknown field(s) for {category_name}: {', '.join(sorted(unknown))}")
+
+        variant_data = payload.get("variants") or []
+        logistics_data = payload.get("logistics") or {}
+        image_data = payload.get("images") or []
+        if not image_data:
+            raise ImportRowError("At least one image is required.")
+
+        validate_logistics_placement(logistics_data, variant_data)
+
+        existing = self.existing.get(_handle_id(payload))
+        if isinstance(existing, model):
+            # Copies, so a row that fails validation leaves the loaded rows as they were
+            product = copy.copy(existing)
+            product.category, product.sub_category = category, sub_category
+            for name, value in fields.items():
+                setattr(product, name, value)
+            current = {sku: copy.copy(v) for sku, v in self.existing_variants[product.id].items()}
+        else:
+            product = model(shop=self.shop, category=category, sub_category=sub_category, **fields)
+            current = None
+
+        _normalize_fields(product)
+        product.full_clean(
+            exclude=["shop", "category", "sub_category", "slug"],
+            validate_unique=False, validate_constraints=False,
+        )
+        if current is None:
+            product.slug = product_slug(product.title, product.id)
+
+        image_model = image_model_map[model.__name__]
+        images = []
+        for img in image_data:
+            if isinstance(img, str):
+                img = {"url": img}
+            image = image_model(product=product, **img)
+            image.full_clean(exclude=["product"])
+            images.append(image)
+
+        content_type = self.content_types[model]
+        variants = []
+        versions = None if current is None else {}
+        for data in variant_data:
+            data = dict(data)
+            variant_logistics = data.pop("logistics", None)
+            sku = str(data.pop("sku", "") or "").strip()
+            version = data.pop("version", None)
+
+            variant = current.pop(sku, None) if current is not None else None
+            if variant is not None:
+                unknown = set(data) - set(VARIANT_FIELDS)
+                if unknown:
+                    raise ImportRowError(f"Variant field(s) that cannot be updated: {', '.join(sorted(unknown))}")
+                if version not in (None, "") and int(version) != variant.version:
+                    raise ImportRowError(f"Variant {sku} changed since it was exported, export the product again.")
+                stock = variant.stock_quantity
+                versions[variant.id] = variant.version
+                for name, value in data.items():
+                    setattr(variant, name, value)
+            else:
+                # Unknown or missing SKUs add a variant, it gets a fresh SKU on insert
+                variant = ProductVariant(
+                    content_type=content_type, object_id=product.id, shop=self.shop, **data
+                )
+
+            _normalize_fields(variant)
+            variant.refresh_effective_price(product)
+            variant.full_clean(
+                exclude=["content_type", "shop", "sku"],
+                validate_unique=False, validate_constraints=False,
+            )
+            if variant.id in (versions or {}) and variant.is_flash_sale and variant.stock_quantity != stock:
+                raise ImportRowError(f"Stock of {sku} is managed by a running flash sale.")
+
+            logistics = None
+            if variant_logistics:
+                logistics = self._build_logistics(variant_logistics, product_variant=variant)
+            variants.append((variant, logistics))
+
+        # Variants left out of the file are kept as they are
+        kept = list(current.values()) if current is not None else []
+        product.quantity = sum(v.stock_quantity + v.reserved_quantity for v, _ in variants) + sum(
+            v.stock_quantity + v.reserved_quantity for v in kept
+        )
+
+        logistics = None
+        if logistics_data:
+            logistics = self._build_logistics(
+                logistics_data, content_type=content_type, object_id=product.id
+            )
+
+        return _PendingProduct(line, category_name, product, images, variants, logistics, versions)
+
+    def _build_logistics(self, data, **target):
+        data = {"weight_measurement": "KG", **data}
+        logistics = Logistics(**target, **data)
+        _normalize_fields(logistics)
+        logistics.full_clean(exclude=["product_variant", "content_type", "object_id"])
+        return logistics
+
+    def drop_duplicates(self, pending):
+        """
+        Reject products that would duplicate another product of the shop
+        or of the file, with one query per category in the chunk.
+        An update may keep its own title
+        """
+        by_model = defaultdict(list)
+        for item in pending:
+            by_model[item.product.__class__].append(item)
+
+        kept, updated = [], set()
+        for model, items in by_model.items():
+            existing = {
+                (title, brand): product_id
+                for product_id, title, brand in model.objects.filter(
+                    shop=self.shop,
+                    category=items[0].product.category,
+                    title__in={i.product.title for i in items},
+                ).values_list("id", "title", "brand")
+            }
+            for item in items:
+                key = (item.product.title, item.product.brand)
+                if existing.get(key, item.product.id) != item.product.id:
+                    self.fail(item.line, "This product already exists in your shop.")
+                elif item.product.id in updated:
+                    self.fail(item.line, "This product appears more than once in the file.")
+                else:
+                    existing[key] = item.product.id
+                    if item.is_update:
+                        updated.add(item.product.id)
+                    kept.append(item)
+        return kept
+
+    # Writes
+    def insert(self, pending):
+        """
+        Write a chunk across every table in one transaction.
+        Returns the updates left out because their variants changed meanwhile
+        """
+        with transaction.atomic():
+            self.create([item for item in pending if not item.is_update])
+            return self.update([item for item in pending if item.is_update])
+
+    def create(self, pending):
+        """Bulk insert new products"""
+        if not pending:
+            return
+
+        by_model = defaultdict(list)
+        images = defaultdict(list)
+        variants, variant_logistics, product_logistics = [], [], []
+
+        for item in pending:
+            by_model[item.product.__class__].append(item.product)
+            images[item.images[0].__class__].extend(item.images)
+            for variant, logistics in item.variants:
+                variant.sku = ""
+                variants.append(variant)
+                if logistics:
+                    variant_logistics.append(logistics)
+            if item.logistics:
+                product_logistics.append(item.logistics)
+
+        allocate_skus(variants, {item.product.id: item.product.title for item in pending})
+
+        for model, products in by_model.items():
+            model.objects.bulk_create(products)
+        for image_model, rows in images.items():
+            image_model.objects.bulk_create(rows)
+        ProductVariant.objects.bulk_create(variants)
+        Logistics.objects.bulk_create(variant_logistics + product_logistics)
+        refresh_shipping_weights(ProductVariant.objects.filter(id__in=[v.id for v in variants]))
+
+        ProductIndex.objects.bulk_create([
+            ProductIndex(
+                id=item.product.id,
+                content_type=self.content_types[item.product.__class__],
+                object_id=item.product.id,
+                image=item.images[0].url,
+                **index_fields(item.product, item.category),
+            )
+            for item in pending
+        ])
+        record_index_changes([i.product.id for i in pending if i.product.is_published], UPSERT)
+        record_index_changes([i.product.id for i in pending if not i.product.is_published], DELETE)
+
+    def update(self, pending):
+        """
+        Bulk write edited products: fields, images and the file's logistics are
+        replaced, variants matched by SKU are updated and the rest are added.
+        Variants then products are locked in id order, the same order checkout
+        takes them in. Products edited, or whose variants changed (a sale, a
+        stock sync), since the chunk was read are left out and returned.
+        Written versions come from what was read, so a row by row retry after a
+        failed batch writes the same values
+        """
+        if not pending:
+            return []
+
+        read_at = {variant_id: version for item in pending for variant_id, version in item.versions.items()}
+        locked = dict(
+            ProductVariant.objects.select_for_update().filter(
+                id__in=read_at.keys()
+            ).order_by('id').values_list('id', 'version')
+        )
+        ids_by_model = defaultdict(list)
+        for item in pending:
+            ids_by_model[item.product.__class__].append(item.product.id)
+        for model, product_ids in ids_by_model.items():
+            locked.update(
+                model.objects.select_for_update().filter(
+                    id__in=product_ids
+                ).order_by('id').values_list('id', 'updated_at')
+            )
+
+        conflicts = [
+            item for item in pending
+            if locked.get(item.product.id) != item.read_at
+            or any(locked.get(variant_id) != version for variant_id, version in item.versions.items())
+        ]
+        pending = [item for item in pending if item not in conflicts]
+        if not pending:
+            return conflicts
+
+        now = timezone.now()
+        by_model = defaultdict(list)
+        images = defaultdict(list)
+        changed, added, logistics = [], [], []
+        for item in pending:
+            item.product.updated_at = now
+            by_model[item.product.__class__].append(item.product)
+            images[item.images[0].__class__].extend(item.images)
+            for variant, variant_logistics in item.variants:
+                if variant.id in item.versions:
+                    variant.version = item.versions[variant.id] + 1
+                    changed.append(variant)
+                else:
+                    variant.sku = ""
+                    added.append(variant)
+                if variant_logistics:
+                    logistics.append(variant_logistics)
+            if item.logistics:
+                logistics.append(item.logistics)
+
+        allocate_skus(added, {item.product.id: item.product.title for item in pending})
+        product_ids = [item.product.id for item in pending]
+
+        for model, products in by_model.items():
+            # quantity follows the variants, recomputed below from the locked rows
+            model.objects.bulk_update(products, [
+                f.name for f in model._meta.concrete_fields
+                if not f.primary_key and f.name not in ("created_at", "quantity")
+            ])
+        for image_model, rows in images.items():
+            image_model.objects.filter(product_id__in=product_ids).delete()
+            image_model.objects.bulk_create(rows)
+        ProductVariant.objects.bulk_update(changed, VARIANT_FIELDS + ["version"])
+        ProductVariant.objects.bulk_create(added)
+
+        # Variants left out of the file keep their own logistics
+        Logistics.objects.filter(
+            Q(product_variant_id__in=[variant.id for variant in changed])
+            | Q(product_variant__isnull=True, object_id__in=product_ids)
+        ).delete()
+        Logistics.objects.bulk_create(logistics)
+
+        variants = ProductVariant.objects.filter(object_id__in=product_ids)
+        refresh_effective_prices(variants)
+        refresh_shipping_weights(variants)
+        refresh_product_quantities({
+            (self.content_types[model].id, product.id)
+            for model, products in by_model.items() for product in products
+        })
+
+        for model, products in by_model.items():
+            write_index_rows(build_index_rows(model, [p.id for p in products]).values())
+        return conflicts
+
+    def insert_chunk(self, pending):
+        """Write a chunk, isolating the offending rows if the batch fails"""
+        try:
+            self.written(pending, self.insert(pending))
+            return
+        except IntegrityError as e:
+            if len(pending) == 1:
+                self.fail(pending[0].line, f"Could not save product: {str(e).splitlines()[0]}")
+                return
+
+        # Retry row by row so one bad product doesn't sink the chunk
+        for item in pending:
+            try:
+                self.written([item], self.insert([item]))
+            except IntegrityError as e:
+                self.fail(item.line, f"Could not save product: {str(e).splitlines()[0]}")
+
+    def written(self, pending, conflicts):
+        for item in conflicts:
+            self.fail(item.line, "This product changed since it was exported, export it again.")
+        self.succeeded += len(pending) - len(conflicts)
+
+    # Bookkeeping
+    def fail(self, line, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def flush_progress(self):
+        ProductBulkJob.objects.filter(pk=self.job.pk).update(
+            processed=self.processed,
+            succeeded=self.succeeded,
+            failed=self.failed,
+            errors=self.errors,
+        )
+
+    def process_chunk(self, rows):
+        self.load_existing(rows)
+        pending = []
+        for line, payload in rows:
+            try:
+                pending.append(self.build(line, payload))
+            except (ImportRowError, ValidationError, serializers.ValidationError, ValueError, TypeError) as e:
+                self.fail(line, _error_message(e))
+
+        pending = self.drop_duplicates(pending)
+        if pending:
+            self.insert_chunk(pending)
+
+        self.processed += len(rows)
+        self.flush_progress()
+
+    def run(self, rows):
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= self.chunk_size:
+                self.process_chunk(chunk)
+                chunk = []
+        if chunk:
+            self.process_chunk(chunk)
+
+
+def run_product_import(job, fileobj, file_format, chunk_size=IMPORT_CHUNK_SIZE):
+    """Run an import job over an open binary file"""
+    reader = IMPORT_READERS[file_format]
+
+    # Cheap counting pass so progress can be reported against a total
+    total = sum(1 for _ in reader(fileobj))
+    fileobj.seek(0)
+
+    ProductBulkJob.objects.filter(pk=job.pk).update(
+        status=ProductBulkJob.Status.RUNNING, total=total, started_at=timezone.now()
+    )
+
+    importer = ProductImporter(job, chunk_size=chunk_size)
+    try:
+        importer.run(reader(fileobj))
+    except Exception as e:
+        logger.exception(f"Product import {job.id} failed")
+        importer.errors.append({"line": None, "error": f"Import aborted: {str(e)}"})
+        importer.flush_progress()
+        ProductBulkJob.objects.filter(pk=job.pk).update(
+            status=ProductBulkJob.Status.FAILED, finished_at=timezone.now()
+        )
+        raise
+
+    ProductBulkJob.objects.filter(pk=job.pk).update(
+        status=ProductBulkJob.Status.COMPLETED, finished_at=timezone.now()
+    )
+    if importer.succeeded:
+        bump_catalog_version()
+    job.refresh_from_db()
+    return job
@@ -0,0 +1,356 @@
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.utils import timezone
+from datetime import timedelta
+from .models import ProductIndex, ProductIndexChange
+from .utils import CATEGORY_MODEL_MAP, image_model_map
+
+logger = logging.getLogger(__name__)
+
+
+UPSERT = ProductIndexChange.Operation.UPSERT
+DELETE = ProductIndexChange.Operation.DELETE
+
+PRUNED_THROUGH_CACHE_KEY = "products:changes:pruned_through_token"
+
+# Bumped after every committed catalog write, caches keyed on it go stale at once
+CATALOG_VERSION_CACHE_KEY = "catalog:version"
+
+MODEL_CATEGORY_MAP = {v: k for k, v in CATEGORY_MODEL_MAP.items()}
+
+# Columns rewritten on every index upsert, and compared when verifying the index
+INDEX_UPDATE_FIELDS = [
+    "content_type", "object_id", "shop", "category", "sub_category", "title", "slug",
+    "price", "image", "description", "specifications", "state", "local_govt",
+    "condition", "is_published", "quantity", "brand",
+]
+
+# Products waiting for an index flush, per model. Set by deferred_index_sync()
+# for the length of a request, otherwise collected per thread until commit
+_deferred = ContextVar("product_index_deferred", default=None)
+_unscoped = ContextVar("product_index_unscoped", default=None)
+
+
+def index_fields(product, category):
+    """Denormalized ProductIndex values for a concrete product"""
+    return {
+        "shop": product.shop,
+        "category": category,
+        "sub_category": product.sub_category.name,
+        "title": product.title,
+        "slug": product.slug,
+        "price": product.price,
+        "description": product.description,
+        "specifications": product.specifications,
+        "state": product.state,
+        "local_govt": product.local_govt,
+        "condition": product.condition,
+        "is_published": product.is_published,
+        "quantity": product.quantity,
+        "brand": getattr(product, "brand", "") or "",
+    }
+
+
+def build_index_rows(model, product_ids):
+    """
+    Unsaved ProductIndex rows for the given products of one model, keyed by id.
+    Products that no longer exist are simply absent from the result
+    """
+    category = MODEL_CATEGORY_MAP[model]
+    content_type = ContentType.objects.get_for_model(model)
+    image_model = image_model_map[model.__name__]
+
+    products = model.objects.filter(id__in=product_ids).select_related(
+        'shop', 'sub_category'
+    ).annotate(
+        first_image=Subquery(
+            image_model.objects.filter(product=OuterRef('pk')).order_by('pk').values('url')[:1]
+        )
+    )
+
+    return {
+        product.id: ProductIndex(
+            id=product.id,
+            content_type=content_type,
+            object_id=product.id,
+            image=product.first_image,
+            **index_fields(product, category),
+        )
+        for product in products
+    }
+
+
+def sync_product_index(model, product_ids):
+    """
+    Bring the index rows of the given products in line with the product tables
+    in one upsert and one delete, and log the result for delta sync clients
+    """
+    product_ids = set(product_ids)
+    rows = build_index_rows(model, product_ids)
+    missing = product_ids - rows.keys()
+
+    with transaction.atomic():
+        write_index_rows(rows.values())
+        delete_index_rows(missing)
+
+    return len(rows), len(missing)
+
+
+def write_index_rows(rows, changed_ids=None):
+    """
+    Upsert index rows in one statement and log them for delta sync clients.
+    `changed_ids` limits the log to rows known to differ, e.g. during a rebuild
+    """
+    rows = list(rows)
+    if not rows:
+        return
+
+    ProductIndex.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['id'],
+        update_fields=INDEX_UPDATE_FIELDS,
+    )
+
+    if changed_ids is not None:
+        changed_ids = set(changed_ids)
+        rows = [row for row in rows if row.id in changed_ids]
+
+    # Unpublishing reaches delta sync clients as a tombstone
+    record_index_changes([row.id for row in rows if row.is_published], UPSERT)
+    record_index_changes([row.id for row in rows if not row.is_published], DELETE)
+
+
+def delete_index_rows(product_ids):
+    """Remove the index rows of deleted products"""
+    if not product_ids:
+        return
+
+    ProductIndex.objects.filter(id__in=product_ids).delete()
+    record_index_changes(product_ids, DELETE)
+
+
+def index_drift(model, product_ids):
+    """
+    Compare the index rows of the given products with their expected values.
+    Returns the expected rows, the ids without a row and {id: [fields]} of stale rows
+    """
+    expected = build_index_rows(model, product_ids)
+    columns = [ProductIndex._meta.get_field(name).attname for name in INDEX_UPDATE_FIELDS]
+    current = {
+        row.pop('id'): row
+        for row in ProductIndex.objects.filter(id__in=expected.keys()).values('id', *columns)
+    }
+
+    missing, stale = [], {}
+    for product_id, row in expected.items():
+        if product_id not in current:
+            missing.append(product_id)
+            continue
+        fields = [
+            column for column in columns
+            if getattr(row, column) != current[product_id][column]
+        ]
+        if fields:
+            stale[product_id] = fields
+
+    return expected, missing, stale
+
+
+def orphaned_index_ids(model):
+    """Index rows of a category whose product no longer exists"""
+    return list(
+        ProductIndex.objects.filter(
+            content_type=ContentType.objects.get_for_model(model)
+        ).exclude(
+            id__in=model.objects.values('id')
+        ).values_list('id', flat=True)
+    )
+
+
+def get_catalog_version():
+    return cache.get(CATALOG_VERSION_CACHE_KEY) or 0
+
+
+def bump_catalog_version():
+    """Invalidate everything cached against the current catalog version"""
+    try:
+        return cache.incr(CATALOG_VERSION_CACHE_KEY)
+    except ValueError:
+        # Key missing or evicted, any fresh value differs from what readers saw
+        version = int(timezone.now().timestamp() * 1000)
+        cache.set(CATALOG_VERSION_CACHE_KEY, version, timeout=None)
+        return version
+
+
+def _flush(pending):
+    """Sync and empty a pending {model: ids} batch"""
+    if not pending:
+        return
+
+    while pending:
+        model, product_ids = pending.popitem()
+        try:
+            sync_product_index(model, product_ids)
+        except Exception as e:
+            # The product write itself already committed, a rebuild repairs the row
+            logger.error(f"ProductIndex sync failed for {model.__name__} {sorted(map(str, product_ids))}: {str(e)}")
+
+    bump_catalog_version()
+
+
+def mark_index_dirty(model, product_id):
+    """
+    Queue a product for index sync instead of writing its row immediately.
+    Inside deferred_index_sync() the flush happens once when the scope ends,
+    elsewhere once when the current transaction commits
+    """
+    pending = _deferred.get()
+    if pending is not None:
+        pending.setdefault(model, set()).add(product_id)
+        return
+
+    pending = _unscoped.get()
+    if pending is None:
+        pending = {}
+        _unscoped.set(pending)
+    pending.setdefault(model, set()).add(product_id)
+
+    # Every mark registers a callback, the first one to run drains the batch.
+    # Entries of a rolled back transaction stay queued and sync with the next
+    # commit, which is harmless as rows are rebuilt from current data
+    transaction.on_commit(partial(_flush, pending))
+
+
+@contextmanager
+def deferred_index_sync():
+    """Collect index writes for the enclosed block and flush them in bulk at the end"""
+    if _deferred.get() is not None:
+        # Nested scopes fold into the outer one
+        yield
+        return
+
+    pending = {}
+    token = _deferred.set(pending)
+    try:
+        yield
+    finally:
+        _deferred.reset(token)
+        if pending:
+            transaction.on_commit(partial(_flush, pending))
+
+
+def record_index_changes(product_ids, operation=UPSERT):
+    """
+    Append change log entries for the given product ids.
+    Runs in the caller's transaction so the entry commits with the index write
+    """
+    entries = [
+        ProductIndexChange(product_id=product_id, operation=operation)
+        for product_id in dict.fromkeys(product_ids)
+    ]
+    if entries:
+        ProductIndexChange.objects.bulk_create(entries)
+
+
+def parse_sync_token(value):
+    """'<txid>.<seq>' to a (txid, seq) tuple, raises ValueError when malformed"""
+    txid, seq = value.split(".")
+    return int(txid), int(seq)
+
+
+def format_sync_token(token):
+    """(txid, seq) to the '<txid>.<seq>' string handed to clients"""
+    return f"{token[0]}.{token[1]}"
+
+
+def _visible_horizon():
+    """
+    Oldest transaction still running for the current snapshot. Every txid below
+    it has committed or rolled back, so its change entries can no longer appear
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint")
+        return cursor.fetchone()[0]
+
+
+def _after(token):
+    """Change entries after a (txid, seq) token, served by the (txid, seq) index"""
+    txid, seq = token
+    return ProductIndexChange.objects.filter(Q(txid__gt=txid) | Q(txid=txid, seq__gt=seq))
+
+
+def has_changes_after(token):
+    """True when the change log holds entries after a (txid, seq) token"""
+    return _after(token).exists()
+
+
+def get_index_changes(since, limit):
+    """
+    Return a page of catalog changes after the `since` (txid, seq) token.
+    Only entries from finished transactions are served, so a transaction that
+    took a lower seq but commits later is never skipped by a client's token.
+    Changes are collapsed per product so a client only sees the latest state
+    """
+    changes = _after(since).filter(txid__lt=_visible_horizon())
+
+    # Fetch one extra row to know whether another page follows
+    batch = list(
+        changes.order_by('txid', 'seq').values_list('txid', 'seq', 'product_id', 'operation')[:limit + 1]
+    )
+    has_more = len(batch) > limit
+    batch = batch[:limit]
+
+    latest = {}
+    for _, _, product_id, operation in batch:
+        latest[product_id] = operation
+
+    upsert_ids = [pid for pid, op in latest.items() if op == UPSERT]
+    rows = list(ProductIndex.objects.filter(id__in=upsert_ids, is_published=True))
+    found = {row.id for row in rows}
+
+    # Anything logged as deleted, since removed or unpublished again is a tombstone
+    deleted = [pid for pid in latest if pid not in found]
+
+    return {
+        "changed": rows,
+        "deleted": deleted,
+        "next_token": batch[-1][:2] if batch else since,
+        "has_more": has_more,
+    }
+
+
+def get_sync_head():
+    """
+    Token handed to clients starting from a full snapshot. Everything before the
+    horizon is already in the snapshot, everything from it on is served as changes
+    """
+    return (_visible_horizon(), 0)
+
+
+def needs_resync(since):
+    """True when entries after the token have already been pruned"""
+    pruned_through = cache.get(PRUNED_THROUGH_CACHE_KEY)
+    return pruned_through is not None and since < tuple(pruned_through)
+
+
+def prune_index_changes():
+    """Delete change log entries older than the retention window"""
+    cutoff = timezone.now() - timedelta(days=settings.PRODUCT_CHANGES_RETENTION_DAYS)
+    expired = ProductIndexChange.objects.filter(changed_at__lt=cutoff)
+
+    pruned_through = expired.order_by('-txid', '-seq').values_list('txid', 'seq').first()
+    if pruned_through is None:
+        return 0
+
+    txid, seq = pruned_through
+    deleted, _ = ProductIndexChange.objects.filter(Q(txid__lt=txid) | Q(txid=txid, seq__lte=seq)).delete()
+    cache.set(PRUNED_THROUGH_CACHE_KEY, pruned_through, timeout=None)
+    return deleted
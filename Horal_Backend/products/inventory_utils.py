@@ -0,0 +1,114 @@
+from collections import defaultdict
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import Sum, F
+from .index_utils import mark_index_dirty
+from .variant_utils import refresh_effective_prices
+from .models import ProductVariant
+
+
+INVENTORY_FIELDS = ["stock_quantity", "price_override"]
+
+
+def _variant_state(variant):
+    return {
+        "sku": variant.sku,
+        "version": variant.version,
+        "stock_quantity": variant.stock_quantity,
+        "price_override": variant.price_override,
+    }
+
+
+def refresh_product_quantities(product_keys):
+    """
+    Recompute quantity for the given (content_type_id, product_id) pairs with one
+    aggregate query and one UPDATE per product whose total changed,
+    then queue their index rows for a single refresh
+    """
+    by_content_type = defaultdict(set)
+    for content_type_id, product_id in product_keys:
+        by_content_type[content_type_id].add(product_id)
+
+    for content_type_id, product_ids in by_content_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+
+        totals = dict(
+            ProductVariant.objects.filter(
+                content_type_id=content_type_id, object_id__in=product_ids
+            ).values_list('object_id').annotate(
+                total=Sum(F('stock_quantity') + F('reserved_quantity'))
+            )
+        )
+        current = dict(model.objects.filter(id__in=product_ids).values_list('id', 'quantity'))
+
+        changed = [
+            model(id=product_id, quantity=totals.get(product_id) or 0)
+            for product_id, quantity in current.items()
+            if quantity != (totals.get(product_id) or 0)
+        ]
+        if changed:
+            model.objects.bulk_update(changed, ['quantity'])
+
+        for product_id in current:
+            mark_index_dirty(model, product_id)
+
+
+def bulk_update_inventory(shop, items):
+    """
+    Apply stock and price updates keyed by SKU for one shop.
+    Rows are locked in id order, so concurrent syncs cannot deadlock,
+    and written with a single bulk_update. An item carrying a `version`
+    that no longer matches, or changing the stock of a variant in a running
+    flash sale, is skipped and reported as a conflict.
+    Returns a dict of updated, unchanged, conflicts and not_found
+    """
+    items = {item["sku"]: item for item in items}
+    result = {"updated": [], "unchanged": [], "conflicts": [], "not_found": []}
+
+    with transaction.atomic():
+        variants = {
+            variant.sku: variant
+            for variant in ProductVariant.objects.select_for_update().filter(
+                shop=shop, sku__in=items.keys()
+            ).order_by('id')
+        }
+
+        changed = []
+        for sku, item in items.items():
+            variant = variants.get(sku)
+            if variant is None:
+                result["not_found"].append(sku)
+                continue
+
+            if "version" in item and item["version"] != variant.version:
+                result["conflicts"].append(_variant_state(variant))
+                continue
+
+            # Stock of a flash sale variant is held in Redis until the sale settles
+            stock = item.get("stock_quantity", variant.stock_quantity)
+            if variant.is_flash_sale and stock != variant.stock_quantity:
+                result["conflicts"].append(_variant_state(variant))
+                continue
+
+            fields = [
+                name for name in INVENTORY_FIELDS
+                if name in item and item[name] != getattr(variant, name)
+            ]
+            if not fields:
+                result["unchanged"].append(_variant_state(variant))
+                continue
+
+            for name in fields:
+                setattr(variant, name, item[name])
+            variant.version += 1
+            changed.append(variant)
+
+        if changed:
+            ProductVariant.objects.bulk_update(changed, INVENTORY_FIELDS + ["version"], batch_size=500)
+            repriced = [v.id for v in changed if "price_override" in items[v.sku]]
+            if repriced:
+                refresh_effective_prices(ProductVariant.objects.filter(id__in=repriced))
+            refresh_product_quantities({(v.content_type_id, v.object_id) for v in changed})
+
+    result["updated"] = [_variant_state(v) for v in changed]
+    return result
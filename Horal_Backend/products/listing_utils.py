@@ -0,0 +1,147 @@
+import logging
+from collections import defaultdict
+from django.db import transaction
+from django.utils import timezone
+from .index_utils import (
+    bump_catalog_version, deferred_index_sync, record_index_changes, UPSERT, DELETE
+)
+from .models import ProductBulkJob, ProductIndex
+from .utils import CATEGORY_MODEL_MAP
+
+logger = logging.getLogger(__name__)
+
+
+LISTING_CHUNK_SIZE = 1000
+
+PUBLISH = ProductBulkJob.Kind.PUBLISH
+UNPUBLISH = ProductBulkJob.Kind.UNPUBLISH
+DELETE_LISTINGS = ProductBulkJob.Kind.DELETE
+
+# Selection filters and the ProductIndex lookups they map to
+LISTING_FILTERS = {
+    "category": "category__iexact",
+    "sub_category": "sub_category__iexact",
+    "brand": "brand__iexact",
+    "condition": "condition__iexact",
+    "state": "state__iexact",
+    "local_govt": "local_govt__iexact",
+    "is_published": "is_published",
+    "search": "title__icontains",
+}
+
+
+def select_listings(shop, ids=None, filters=None):
+    """
+    Resolve a selection to {model: [product ids]} for one shop.
+    Explicit ids and filters combine, an empty filter selects the whole shop
+    """
+    queryset = ProductIndex.objects.filter(shop=shop)
+    if ids is not None:
+        queryset = queryset.filter(id__in=ids)
+
+    for key, value in (filters or {}).items():
+        if key == "out_of_stock":
+            queryset = queryset.filter(quantity=0) if value else queryset.filter(quantity__gt=0)
+        else:
+            queryset = queryset.filter(**{LISTING_FILTERS[key]: value})
+
+    selected = defaultdict(list)
+    for product_id, category in queryset.order_by('id').values_list('id', 'category').iterator():
+        model = CATEGORY_MODEL_MAP.get(category)
+        if model:
+            selected[model].append(product_id)
+    return selected
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _set_published(shop, model, product_ids, is_published):
+    """Toggle one chunk with set based updates, skipping rows already in that state"""
+    changed = list(
+        model.objects.filter(shop=shop, id__in=product_ids)
+        .exclude(is_published=is_published)
+        .values_list('id', flat=True)
+    )
+    if not changed:
+        return 0
+
+    model.objects.filter(id__in=changed).update(
+        is_published=is_published, updated_at=timezone.now()
+    )
+    ProductIndex.objects.filter(id__in=changed).update(is_published=is_published)
+
+    # Unpublishing reaches delta sync clients as a tombstone
+    record_index_changes(changed, UPSERT if is_published else DELETE)
+    return len(changed)
+
+
+def _delete(shop, model, product_ids):
+    """
+    Delete one chunk the same way a single product delete does.
+    Images cascade, and the index rows are removed in one statement when the chunk commits
+    """
+    with deferred_index_sync():
+        deleted, per_model = model.objects.filter(shop=shop, id__in=product_ids).delete()
+    return per_model.get(model._meta.label, 0)
+
+
+def apply_listing_action(shop, action, selected, job=None, chunk_size=LISTING_CHUNK_SIZE):
+    """
+    Publish, unpublish or delete the selected listings chunk by chunk.
+    Each chunk commits on its own, bumps the catalog version once
+    and reports progress to the job when there is one.
+    Returns (processed, changed)
+    """
+    processed = changed = 0
+
+    for model, product_ids in selected.items():
+        for chunk in _chunks(product_ids, chunk_size):
+            with transaction.atomic():
+                if action == DELETE_LISTINGS:
+                    # The index flush bumps the catalog version itself
+                    count = _delete(shop, model, chunk)
+                else:
+                    count = _set_published(shop, model, chunk, action == PUBLISH)
+                    if count:
+                        transaction.on_commit(bump_catalog_version)
+
+            processed += len(chunk)
+            changed += count
+
+            if job:
+                ProductBulkJob.objects.filter(pk=job.pk).update(
+                    processed=processed, succeeded=changed
+                )
+
+    return processed, changed
+
+
+def run_listing_job(job, chunk_size=LISTING_CHUNK_SIZE):
+    """Run a queued bulk publish/unpublish/delete job"""
+    selected = select_listings(job.shop, job.params.get("ids"), job.params.get("filters"))
+
+    ProductBulkJob.objects.filter(pk=job.pk).update(
+        status=ProductBulkJob.Status.RUNNING,
+        total=sum(len(ids) for ids in selected.values()),
+        started_at=timezone.now(),
+    )
+
+    try:
+        apply_listing_action(job.shop, job.kind, selected, job=job, chunk_size=chunk_size)
+    except Exception as e:
+        logger.exception(f"Bulk listing job {job.id} failed")
+        ProductBulkJob.objects.filter(pk=job.pk).update(
+            status=ProductBulkJob.Status.FAILED,
+            errors=[{"line": None, "error": f"Job aborted: {str(e)}"}],
+            finished_at=timezone.now(),
+        )
+        raise
+
+    ProductBulkJob.objects.filter(pk=job.pk).update(
+        status=ProductBulkJob.Status.COMPLETED, finished_at=timezone.now()
+    )
+    job.refresh_from_db()
+    return job
@@ -0,0 +1,58 @@
+import threading
+import uuid
+from cachetools import TTLCache
+from django.conf import settings
+from .index_utils import get_catalog_version
+from .models import ProductIndex, ProductVariant
+
+
+# Per-process cache of product id / slug -> (content_type_id, object_id).
+# A product id always points at the same row, so id entries only age out;
+# slug entries are keyed by the catalog version since slugs can be edited
+_locations = TTLCache(maxsize=settings.PRODUCT_LOCATOR_CACHE_SIZE, ttl=settings.PRODUCT_LOCATOR_CACHE_TTL)
+_lock = threading.Lock()
+
+
+def _cache_key(identifier):
+    if isinstance(identifier, uuid.UUID):
+        return identifier
+    try:
+        return uuid.UUID(str(identifier))
+    except ValueError:
+        return (get_catalog_version(), identifier)
+
+
+def locate_product(identifier):
+    """
+    Resolve a product id or slug to (content_type_id, object_id)
+    with one indexed ProductIndex lookup, or None if it does not exist
+    """
+    key = _cache_key(identifier)
+    with _lock:
+        location = _locations.get(key)
+    if location is not None:
+        return location
+
+    lookup = {"id": key} if isinstance(key, uuid.UUID) else {"slug": identifier}
+    location = ProductIndex.objects.filter(**lookup).values_list('content_type_id', 'object_id').first()
+    if location is not None:
+        with _lock:
+            _locations[key] = location
+    return location
+
+
+def clear_locator_cache():
+    with _lock:
+        _locations.clear()
+
+
+def find_variant(location, **options):
+    """
+    The variant of a located product matching the given options, fetched with
+    its stock in the same query. Options left as None are not filtered on
+    """
+    content_type_id, object_id = location
+    filters = {name: value for name, value in options.items() if value is not None}
+    return ProductVariant.objects.filter(
+        content_type_id=content_type_id, object_id=object_id, **filters
+    ).first()
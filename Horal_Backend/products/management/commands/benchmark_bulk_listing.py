@@ -0,0 +1,97 @@
+import io
+import json
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from products.index_utils import deferred_index_sync
+from products.import_utils import run_product_import
+from products.listing_utils import (
+    select_listings, apply_listing_action, PUBLISH, UNPUBLISH, DELETE_LISTINGS
+)
+from products.models import ProductBulkJob
+from products.utils import CATEGORY_MODEL_MAP
+from shops.models import Shop
+from subcategories.models import SubCategory
+
+
+class Command(BaseCommand):
+    help = "Compare bulk publish/unpublish/delete against per-product saves (default: 10k listings)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10000)
+        parser.add_argument("--sample", type=int, default=200,
+                            help="Products toggled one by one for the per-product baseline")
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def seed(self, shop, sub_category, count):
+        """Create the listings through the bulk import"""
+        lines = []
+        for n in range(count):
+            lines.append(json.dumps({
+                "category": sub_category.category.name,
+                "sub_category": sub_category.name,
+                "title": f"Listing bench {shop.name} {n}",
+                "description": "Synthetic listing used for bulk action benchmarking",
+                "price": "1500.00", "state": "Lagos", "local_govt": "Ikeja",
+                "is_published": True,
+                "images": [{"url": f"https://cdn.horal.ng/bench/{n}.jpg"}],
+                "variants": [{"color": "black", "stock_quantity": 5}],
+                "logistics": {"weight_measurement": "KG", "total_weight": "1.00"},
+            }))
+
+        job = ProductBulkJob.objects.create(kind=ProductBulkJob.Kind.IMPORT, shop=shop)
+        job = run_product_import(job, io.BytesIO("\n".join(lines).encode()), "jsonl")
+        if job.failed:
+            raise CommandError(f"Seeding failed: {job.errors[:3]}")
+
+    def measure(self, label, func):
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+        self.stdout.write(f"{label}: {elapsed:.2f}s, {len(queries)} queries")
+        return result, elapsed
+
+    def handle(self, *args, **options):
+        sub_category = SubCategory.objects.select_related("category").filter(
+            category__name__in=list(CATEGORY_MODEL_MAP)
+        ).first()
+        if not sub_category:
+            raise CommandError("Create at least one category with a sub category first")
+
+        count = options["count"]
+        chunk_size = options["chunk_size"]
+        shop = Shop.objects.create(
+            owner_type=Shop.OwnerType.PLATFORM, name=f"listing-benchmark-{uuid.uuid4().hex[:8]}"
+        )
+
+        try:
+            self.stdout.write(f"Seeding {count} listings...")
+            self.seed(shop, sub_category, count)
+            model = CATEGORY_MODEL_MAP[sub_category.category.name.lower()]
+
+            # Baseline: one request per product, each with its own save and index sync
+            sample = list(model.objects.filter(shop=shop)[:options["sample"]])
+
+            def one_by_one():
+                for product in sample:
+                    with deferred_index_sync():
+                        product.is_published = False
+                        product.save()
+
+            _, elapsed = self.measure(f"Per-product unpublish x{len(sample)}", one_by_one)
+            if sample:
+                self.stdout.write(f"  extrapolated to {count}: {elapsed / len(sample) * count:.1f}s")
+
+            selected = select_listings(shop, filters={})
+            for label, action in (("unpublish", UNPUBLISH), ("publish", PUBLISH), ("delete", DELETE_LISTINGS)):
+                (processed, changed), _ = self.measure(
+                    f"Bulk {label} x{count}",
+                    lambda action=action: apply_listing_action(shop, action, selected, chunk_size=chunk_size),
+                )
+                self.stdout.write(f"  {changed} of {processed} listings changed")
+        finally:
+            self.stdout.write("Cleaning up benchmark shop...")
+            shop.delete()
@@ -0,0 +1,79 @@
+import csv
+import io
+import tempfile
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from products.import_utils import PRODUCT_COLUMNS, VARIANT_COLUMNS, run_product_import
+from products.models import ProductBulkJob
+from products.utils import CATEGORY_MODEL_MAP
+from shops.models import Shop
+from subcategories.models import SubCategory
+
+
+class Command(BaseCommand):
+    help = "Measure bulk import throughput on a synthetic CSV (target: 10k products/min)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=10000)
+        parser.add_argument("--variants", type=int, default=3)
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--keep", action="store_true", help="Keep the imported products")
+
+    def write_csv(self, fileobj, sub_category, count, variants):
+        colors = ["red", "green", "blue", "black", "silver", "gold"]
+        sizes = ["XS", "S", "M", "L", "XL", "XXL"]
+        run = uuid.uuid4().hex[:6]
+
+        text = io.TextIOWrapper(fileobj, encoding="utf-8", newline="")
+        writer = csv.writer(text)
+        writer.writerow(PRODUCT_COLUMNS + VARIANT_COLUMNS)
+        for n in range(count):
+            product = [
+                f"p{n}", sub_category.category.name, sub_category.name, f"Bench {run} product {n}",
+                "Synthetic product used for import benchmarking", "", "2500.00", "Horal",
+                "brand new", "Lagos", "Ikeja", "true",
+                f"https://cdn.horal.ng/bench/{n}-1.jpg|https://cdn.horal.ng/bench/{n}-2.jpg", "", "",
+            ]
+            for v in range(variants):
+                writer.writerow(product + [
+                    colors[v % len(colors)], sizes[(v // len(colors)) % len(sizes)], "",
+                    "", "", "5", "", "KG", "1.20",
+                ])
+        text.flush()
+        text.detach()
+        fileobj.seek(0)
+
+    def handle(self, *args, **options):
+        sub_category = SubCategory.objects.select_related("category").filter(
+            category__name__in=list(CATEGORY_MODEL_MAP)
+        ).first()
+        if not sub_category:
+            raise CommandError("Create at least one category with a sub category first")
+
+        shop = Shop.objects.create(
+            owner_type=Shop.OwnerType.PLATFORM, name=f"import-benchmark-{uuid.uuid4().hex[:8]}"
+        )
+        job = ProductBulkJob.objects.create(
+            kind=ProductBulkJob.Kind.IMPORT, shop=shop, params={"format": "csv"}
+        )
+
+        try:
+            with tempfile.TemporaryFile() as fileobj:
+                self.write_csv(fileobj, sub_category, options["count"], options["variants"])
+
+                start = time.perf_counter()
+                job = run_product_import(job, fileobj, "csv", chunk_size=options["chunk_size"])
+                elapsed = time.perf_counter() - start
+
+            rate = job.succeeded / elapsed * 60 if elapsed else 0
+            self.stdout.write(
+                f"{job.succeeded} products ({job.succeeded * options['variants']} variants) "
+                f"in {elapsed:.1f}s -> {rate:,.0f} products/min, {job.failed} failed"
+            )
+            for error in job.errors[:5]:
+                self.stdout.write(f"  line {error['line']}: {error['error']}")
+        finally:
+            if not options["keep"]:
+                self.stdout.write("Cleaning up benchmark shop...")
+                shop.delete()
@@ -0,0 +1,154 @@
+import gzip
+import time
+import uuid
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from Horal_Backend.renderers import ORJSONRenderer, MessagePackRenderer
+
+
+def _product_row(i):
+    """Mirror ProductIndexSerializer output"""
+    return {
+        "id": str(uuid.uuid4()),
+        "title": f"Samsung Galaxy A15 128GB Dual SIM {i}",
+        "slug": f"samsung-galaxy-a15-128gb-dual-sim-{i}-{uuid.uuid4().hex[:12]}",
+        "price": f"{185000 + i}.00",
+        "image": f"https://horal.fra1.digitaloceanspaces.com/products/{uuid.uuid4()}.jpg",
+        "brand": "Samsung",
+        "state": "Lagos",
+        "local_govt": "Ikeja",
+        "condition": "new",
+        "description": "Brand new, sealed in box with one year warranty. " * 4,
+        "quantity": 12,
+        "category": "gadget",
+        "sub_category": "Phones",
+        "shop": str(uuid.uuid4()),
+        "is_published": True,
+        "specifications": "6.5 inch display, 4GB RAM, 5000mAh battery",
+        "average_rating": 4.3,
+        "total_reviews": 27,
+        "created_at": timezone.now(),
+    }
+
+
+def _variant(i):
+    return {
+        "id": str(uuid.uuid4()),
+        "sku": f"GAD-{uuid.uuid4().hex[:8].upper()}",
+        "color": "black",
+        "standard_size": None,
+        "custom_size_unit": None,
+        "custom_size_value": None,
+        "stock_quantity": 5 + i,
+        "reserved_quantity": 0,
+        "price_override": Decimal("190000.00"),
+        "logistics": {"weight_measurement": "kg", "total_weight": Decimal("0.45")},
+    }
+
+
+def _envelope(message, data):
+    """Same shape as BaseResponseMixin.get_response"""
+    return {"status": "success", "status_code": 200, "message": message, "data": data}
+
+
+def sample_payloads():
+    """Synthetic responses shaped like the product, cart and order endpoints"""
+    product_detail = dict(_product_row(0))
+    product_detail["images"] = [
+        {"id": str(uuid.uuid4()), "url": f"https://cdn.horal.ng/p/{n}.jpg"} for n in range(5)
+    ]
+    product_detail["variants"] = [_variant(n) for n in range(6)]
+
+    cart = {
+        "id": str(uuid.uuid4()),
+        "total_price": Decimal("742000.00"),
+        "items": [
+            {
+                "id": str(uuid.uuid4()),
+                "quantity": 2,
+                "item_total_price": Decimal("380000.00"),
+                "variant": _variant(n),
+                "product": _product_row(n),
+            } for n in range(8)
+        ],
+    }
+
+    order = {
+        "id": str(uuid.uuid4()),
+        "status": "pending",
+        "product_total": Decimal("742000.00"),
+        "shipping_total": Decimal("4500.00"),
+        "total_amount": Decimal("746500.00"),
+        "created_at": timezone.now(),
+        "items": [
+            {
+                "id": str(uuid.uuid4()),
+                "quantity": 1,
+                "unit_price": Decimal("185000.00"),
+                "variant": _variant(n),
+            } for n in range(8)
+        ],
+        "shipments": [
+            {"id": str(uuid.uuid4()), "status": "pending", "shipping_fee": Decimal("2250.00")}
+            for _ in range(2)
+        ],
+    }
+
+    return {
+        "product list (30)": _envelope("Products retrieved", {
+            "count": 3000, "next": "https://api.horal.ng/api/v1/product/?page=2",
+            "previous": None, "results": [_product_row(n) for n in range(30)],
+        }),
+        "product detail": _envelope("Product retrieved", product_detail),
+        "cart (8 items)": _envelope("Cart retrieved", cart),
+        "order (8 items)": _envelope("Order retrieved", order),
+    }
+
+
+def db_payloads(limit):
+    """Real product list rendered through the API serializer"""
+    from products.models import ProductIndex
+    from products.serializers import ProductIndexSerializer
+
+    rows = ProductIndex.objects.filter(is_published=True)[:limit]
+    data = ProductIndexSerializer(rows, many=True).data
+    return {f"product index ({len(data)} from db)": _envelope("Products retrieved", data)}
+
+
+class Command(BaseCommand):
+    help = "Compare payload size and encode time of DRF JSON, orjson and MessagePack"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--iterations", type=int, default=500)
+        parser.add_argument("--from-db", action="store_true",
+                            help="Also benchmark a product list fetched from the database")
+        parser.add_argument("--limit", type=int, default=30)
+
+    def handle(self, *args, **options):
+        renderers = {
+            "drf json": JSONRenderer(),
+            "orjson": ORJSONRenderer(),
+            "msgpack": MessagePackRenderer(),
+        }
+
+        payloads = sample_payloads()
+        if options["from_db"]:
+            payloads.update(db_payloads(options["limit"]))
+
+        iterations = options["iterations"]
+        for label, payload in payloads.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{label}"))
+            self.stdout.write(f"{'renderer':<10}{'bytes':>10}{'gzip':>10}{'encode µs':>12}")
+            for name, renderer in renderers.items():
+                body = renderer.render(payload)
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    renderer.render(payload)
+                elapsed = (time.perf_counter() - start) / iterations * 1_000_000
+                self.stdout.write(
+                    f"{name:<10}{len(body):>10}{len(gzip.compress(body)):>10}{elapsed:>12.1f}"
+                )
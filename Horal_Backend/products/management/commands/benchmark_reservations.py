@@ -0,0 +1,178 @@
+import io
+import json
+import random
+import threading
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction, OperationalError
+from products.import_utils import run_product_import
+from products.models import ProductBulkJob, ProductVariant
+from products.flash_sale_utils import (
+    reserve_flash_stock, settle_flash_holds, start_flash_sale, stop_flash_sale,
+)
+from products.reservation_utils import reserve_stock, InsufficientStock, _quantities
+from products.utils import CATEGORY_MODEL_MAP, update_quantity
+from shops.models import Shop
+from subcategories.models import SubCategory
+
+
+class SoldOut(Exception):
+    pass
+
+
+def legacy_reserve(lines):
+    """The previous checkout: lock and save each variant in cart order"""
+    with transaction.atomic():
+        for variant_id, quantity in lines:
+            variant = ProductVariant.objects.select_for_update().get(pk=variant_id)
+            if quantity > variant.stock_quantity:
+                raise SoldOut()
+            variant.reserved_quantity += quantity
+            variant.stock_quantity -= quantity
+            variant.save()
+            update_quantity(variant.product)
+
+
+def engine_reserve(lines):
+    try:
+        reserve_stock(lines)
+    except InsufficientStock:
+        raise SoldOut()
+
+
+# Hold tokens taken by flash_reserve, released once the run is measured
+flash_tokens = []
+
+
+def flash_reserve(lines):
+    """Flash sale mode: one Lua call per checkout, no Postgres row locks"""
+    token = uuid.uuid4()
+    flash_tokens.append(token)
+    try:
+        reserve_flash_stock(token, _quantities(lines))
+    except InsufficientStock:
+        raise SoldOut()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run simultaneous checkouts on hot SKUs through the legacy path, the Postgres engine "
+        "and flash sale mode, and report throughput, deadlocks and oversell"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--buyers", type=int, default=16, help="Concurrent checkout threads")
+        parser.add_argument("--checkouts", type=int, default=20, help="Checkouts per buyer")
+        parser.add_argument("--skus", type=int, default=8, help="Hot variants shared by every cart")
+        parser.add_argument("--cart-size", type=int, default=4)
+        parser.add_argument("--stock", type=int, default=200, help="Starting stock per hot variant")
+
+    def seed(self, shop, sub_category, count, stock):
+        lines = [
+            json.dumps({
+                "category": sub_category.category.name,
+                "sub_category": sub_category.name,
+                "title": f"Reservation bench {shop.name} {n}",
+                "description": "Synthetic product used for reservation benchmarking",
+                "price": "2500.00", "state": "Lagos", "local_govt": "Ikeja",
+                "is_published": True,
+                "images": [{"url": f"https://cdn.horal.ng/bench/{n}.jpg"}],
+                "variants": [{"color": "black", "stock_quantity": stock}],
+                "logistics": {"weight_measurement": "KG", "total_weight": "1.00"},
+            })
+            for n in range(count)
+        ]
+        job = ProductBulkJob.objects.create(kind=ProductBulkJob.Kind.IMPORT, shop=shop)
+        job = run_product_import(job, io.BytesIO("\n".join(lines).encode()), "jsonl")
+        if job.failed:
+            raise CommandError(f"Seeding failed: {job.errors[:3]}")
+        return list(ProductVariant.objects.filter(shop=shop).values_list("id", flat=True))
+
+    def run(self, reserve, variant_ids, options):
+        counts = {"ok": 0, "sold_out": 0, "deadlocks": 0, "errors": 0}
+        lock = threading.Lock()
+        seed = random.Random(42)
+        carts = [
+            [
+                [(variant_id, 1) for variant_id in seed.sample(variant_ids, options["cart_size"])]
+                for _ in range(options["checkouts"])
+            ]
+            for _ in range(options["buyers"])
+        ]
+
+        def buyer(checkouts):
+            try:
+                for lines in checkouts:
+                    try:
+                        reserve(lines)
+                        outcome = "ok"
+                    except SoldOut:
+                        outcome = "sold_out"
+                    except OperationalError as e:
+                        outcome = "deadlocks" if "deadlock" in str(e) else "errors"
+                    with lock:
+                        counts[outcome] += 1
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buyer, args=(checkouts,)) for checkouts in carts]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return counts, time.perf_counter() - start
+
+    def handle(self, *args, **options):
+        if options["cart_size"] > options["skus"]:
+            raise CommandError("--cart-size cannot exceed --skus")
+        sub_category = SubCategory.objects.select_related("category").filter(
+            category__name__in=list(CATEGORY_MODEL_MAP)
+        ).first()
+        if not sub_category:
+            raise CommandError("Create at least one category with a sub category first")
+
+        shop = Shop.objects.create(
+            owner_type=Shop.OwnerType.PLATFORM, name=f"reservation-benchmark-{uuid.uuid4().hex[:8]}"
+        )
+
+        try:
+            stock = options["stock"]
+            variant_ids = self.seed(shop, sub_category, options["skus"], stock)
+            total = options["buyers"] * options["checkouts"]
+
+            self.stdout.write(
+                f"{options['buyers']} buyers x {options['checkouts']} checkouts of {options['cart_size']} "
+                f"lines over {options['skus']} SKUs with {stock} units each"
+            )
+            self.stdout.write(
+                f"{'engine':<8} {'ok':>5} {'sold out':>9} {'deadlocks':>10} {'errors':>7} "
+                f"{'checkouts/s':>12} {'oversold':>9}"
+            )
+            for label, reserve in (("legacy", legacy_reserve), ("engine", engine_reserve), ("flash", flash_reserve)):
+                ProductVariant.objects.filter(id__in=variant_ids).update(stock_quantity=stock, reserved_quantity=0)
+
+                if reserve is flash_reserve:
+                    start_flash_sale(variant_ids)
+                counts, elapsed = self.run(reserve, variant_ids, options)
+                if reserve is flash_reserve:
+                    # Apply the journal so the oversell check below reads what Redis sold
+                    stop_flash_sale(variant_ids)
+
+                # Units reserved beyond the starting stock, or stock that went negative
+                oversold = sum(
+                    max(reserved - stock, 0) + max(-remaining, 0)
+                    for remaining, reserved in ProductVariant.objects.filter(
+                        id__in=variant_ids
+                    ).values_list("stock_quantity", "reserved_quantity")
+                )
+                if reserve is flash_reserve:
+                    settle_flash_holds(flash_tokens, commit=False)
+                self.stdout.write(
+                    f"{label:<8} {counts['ok']:>5} {counts['sold_out']:>9} {counts['deadlocks']:>10} "
+                    f"{counts['errors']:>7} {total / elapsed:>12.1f} {oversold:>9}"
+                )
+        finally:
+            self.stdout.write("Cleaning up benchmark shop...")
+            shop.delete()
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from products.flash_sale_utils import (
+    start_flash_sale, stop_flash_sale, flash_sale_stock,
+    release_expired_flash_holds, reconcile_flash_journal,
+)
+from products.models import ProductVariant
+
+
+class Command(BaseCommand):
+    help = "Start, stop or inspect flash sale mode for variants (by SKU)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("action", choices=["start", "stop", "status", "reconcile"])
+        parser.add_argument("skus", nargs="*")
+
+    def variant_ids(self, skus):
+        ids = dict(ProductVariant.objects.filter(sku__in=skus).values_list("sku", "id"))
+        missing = set(skus) - set(ids)
+        if missing:
+            raise CommandError(f"Unknown SKUs: {', '.join(sorted(missing))}")
+        return list(ids.values())
+
+    def handle(self, *args, **options):
+        action, skus = options["action"], options["skus"]
+
+        if action == "reconcile":
+            released = release_expired_flash_holds()
+            applied = reconcile_flash_journal()
+            if applied is None:
+                raise CommandError("Another reconciliation is running")
+            self.stdout.write(self.style.SUCCESS(f"{released} expired holds released, {applied} journal entries applied"))
+            return
+
+        if action in ("start", "stop") and not skus:
+            raise CommandError(f"Give the SKUs to {action}")
+
+        if action == "start":
+            variants = start_flash_sale(self.variant_ids(skus))
+            self.stdout.write(self.style.SUCCESS(f"Flash sale started for {len(variants)} variants"))
+        elif action == "stop":
+            variants = stop_flash_sale(self.variant_ids(skus))
+            self.stdout.write(self.style.SUCCESS(f"Flash sale stopped for {len(variants)} variants"))
+
+        variants = ProductVariant.objects.filter(sku__in=skus) if skus else ProductVariant.objects.filter(is_flash_sale=True)
+        variants = list(variants.only("id", "sku", "is_flash_sale", "stock_quantity", "reserved_quantity"))
+        counters = flash_sale_stock([variant.id for variant in variants])
+        self.stdout.write(f"{'sku':<30} {'flash':>6} {'redis':>7} {'stock':>7} {'reserved':>9}")
+        for variant in variants:
+            counter = counters[variant.id]
+            self.stdout.write(
+                f"{variant.sku:<30} {'yes' if variant.is_flash_sale else 'no':>6} "
+                f"{'-' if counter is None else counter:>7} {variant.stock_quantity:>7} {variant.reserved_quantity:>9}"
+            )
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from products.feed_utils import generate_all
+
+
+class Command(BaseCommand):
+    help = "Generate gzipped sitemap shards and merchant product feeds from ProductIndex"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output-dir", help="Write files locally instead of uploading to S3")
+        parser.add_argument("--base-url", help="Public URL the sitemap shards are served from")
+        parser.add_argument("--only", choices=["sitemap", "feed"])
+        parser.add_argument("--force", action="store_true",
+                            help="Regenerate and publish even if nothing changed")
+        parser.add_argument("--chunk-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        results = generate_all(
+            output_dir=options["output_dir"],
+            base_url=options["base_url"],
+            force=options["force"],
+            chunk_size=options["chunk_size"],
+            only=options["only"],
+        )
+
+        for target, result in results.items():
+            if result.get("skipped"):
+                self.stdout.write(f"{target}: no catalog changes, skipped")
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{target}: {result}"))
@@ -0,0 +1,41 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+from products.import_utils import IMPORT_READERS, run_product_import
+from products.models import ProductBulkJob
+from shops.models import Shop
+
+
+class Command(BaseCommand):
+    help = "Import products from a local CSV or JSONL file into a shop"
+
+    def add_arguments(self, parser):
+        parser.add_argument("file")
+        parser.add_argument("--shop", required=True, help="Shop id to import into")
+        parser.add_argument("--format", choices=list(IMPORT_READERS))
+        parser.add_argument("--chunk-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options["file"]
+        file_format = options["format"] or os.path.splitext(path)[1].lstrip(".").lower()
+        if file_format not in IMPORT_READERS:
+            raise CommandError(f"Unsupported format: {file_format}")
+
+        try:
+            shop = Shop.objects.get(id=options["shop"])
+        except Shop.DoesNotExist:
+            raise CommandError("Shop not found")
+
+        job = ProductBulkJob.objects.create(
+            kind=ProductBulkJob.Kind.IMPORT,
+            shop=shop,
+            params={"format": file_format, "filename": os.path.basename(path)},
+        )
+
+        with open(path, "rb") as fileobj:
+            job = run_product_import(job, fileobj, file_format, chunk_size=options["chunk_size"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Job {job.id}: {job.succeeded} created, {job.failed} failed of {job.total}"
+        ))
+        for error in job.errors[:20]:
+            self.stdout.write(f"  line {error['line']}: {error['error']}")
@@ -0,0 +1,138 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from products.index_utils import (
+    index_drift, orphaned_index_ids, write_index_rows, delete_index_rows, bump_catalog_version
+)
+from products.utils import CATEGORY_MODEL_MAP
+
+
+MAX_REPORTED_IDS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild ProductIndex from the product tables in parallel chunks, "
+        "or verify it and report drift"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--verify", action="store_true",
+                            help="Only report missing, stale and orphaned rows")
+        parser.add_argument("--fix", action="store_true",
+                            help="With --verify, rewrite just the drifted rows")
+        parser.add_argument("--category", choices=list(CATEGORY_MODEL_MAP))
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--chunk-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options["fix"] and not options["verify"]:
+            raise CommandError("--fix only applies together with --verify")
+        if options["workers"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--workers and --chunk-size must be positive")
+
+        self.verify = options["verify"]
+        self.fix = options["fix"]
+        categories = [options["category"]] if options["category"] else list(CATEGORY_MODEL_MAP)
+
+        totals = {"checked": 0, "missing": 0, "stale": 0, "orphaned": 0, "written": 0}
+        samples = []
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+            for category in categories:
+                model = CATEGORY_MODEL_MAP[category]
+                result = self.run_category(executor, model, options["workers"], options["chunk_size"])
+
+                for key in totals:
+                    totals[key] += result[key]
+                samples.extend(result["samples"])
+
+                self.stdout.write(
+                    f"{category}: checked={result['checked']} missing={result['missing']} "
+                    f"stale={result['stale']} orphaned={result['orphaned']} written={result['written']}"
+                )
+
+        if totals["written"] or (totals["orphaned"] and (self.fix or not self.verify)):
+            bump_catalog_version()
+
+        for line in samples[:MAX_REPORTED_IDS]:
+            self.stdout.write(f"  {line}")
+
+        drift = totals["missing"] + totals["stale"] + totals["orphaned"]
+        summary = (
+            f"Checked {totals['checked']} products: {totals['missing']} missing, "
+            f"{totals['stale']} stale, {totals['orphaned']} orphaned, {totals['written']} rows written"
+        )
+        if self.verify and drift and not self.fix:
+            self.stdout.write(self.style.WARNING(summary + ", rerun with --fix to repair"))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def run_category(self, executor, model, workers, chunk_size):
+        """Feed id chunks of one model to the pool, keeping only a few in flight"""
+        result = {"checked": 0, "missing": 0, "stale": 0, "orphaned": 0, "written": 0, "samples": []}
+        in_flight = set()
+
+        def collect(done):
+            for future in done:
+                chunk = future.result()
+                for key in ("checked", "missing", "stale", "written"):
+                    result[key] += chunk[key]
+                result["samples"].extend(chunk["samples"])
+
+        ids = model.objects.order_by('pk').values_list('id', flat=True).iterator(chunk_size=chunk_size)
+        chunk = []
+        for product_id in ids:
+            chunk.append(product_id)
+            if len(chunk) < chunk_size:
+                continue
+
+            in_flight.add(executor.submit(self.process_chunk, model, chunk))
+            chunk = []
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(done)
+
+        if chunk:
+            in_flight.add(executor.submit(self.process_chunk, model, chunk))
+        collect(wait(in_flight).done)
+
+        orphaned = orphaned_index_ids(model)
+        result["orphaned"] = len(orphaned)
+        result["samples"].extend(f"{model.__name__} {pid}: orphaned" for pid in orphaned)
+        if orphaned and (self.fix or not self.verify):
+            with transaction.atomic():
+                delete_index_rows(orphaned)
+
+        return result
+
+    def process_chunk(self, model, product_ids):
+        """Verify, and unless only verifying, rewrite one chunk of products"""
+        try:
+            expected, missing, stale = index_drift(model, product_ids)
+
+            if not self.verify:
+                rows = list(expected.values())
+            elif self.fix:
+                rows = [expected[pid] for pid in missing] + [expected[pid] for pid in stale]
+            else:
+                rows = []
+
+            if rows:
+                with transaction.atomic():
+                    # Rows that were already correct are rewritten but not logged
+                    write_index_rows(rows, changed_ids=missing + list(stale))
+
+            samples = [f"{model.__name__} {pid}: missing" for pid in missing]
+            samples += [f"{model.__name__} {pid}: stale {', '.join(fields)}" for pid, fields in stale.items()]
+
+            return {
+                "checked": len(expected),
+                "missing": len(missing),
+                "stale": len(stale),
+                "written": len(rows),
+                "samples": samples[:MAX_REPORTED_IDS],
+            }
+        finally:
+            # Worker threads each hold their own connection
+            connection.close()
@@ -0,0 +1,17 @@
+from .index_utils import deferred_index_sync
+
+
+class ProductIndexSyncMiddleware:
+    """
+    Middleware deferring ProductIndex writes to the end of the request,
+    so a product touched many times in one request is indexed once
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+
+    def __call__(self, request):
+        with deferred_index_sync():
+            response = self.get_response(request)
+        return response
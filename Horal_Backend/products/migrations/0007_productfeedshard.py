@@ -0,0 +1,24 @@
+# Generated by Django 5.2 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0006_productindexchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFeedShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('checksum', models.CharField(max_length=64)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('last_seq', models.BigIntegerField(default=0)),
+                ('generated_at', models.DateTimeField()),
+            ],
+        ),
+    ]
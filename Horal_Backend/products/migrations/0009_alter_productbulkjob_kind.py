@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 09:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0008_productbulkjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productbulkjob',
+            name='kind',
+            field=models.CharField(choices=[('import', 'Import'), ('publish', 'Publish'), ('unpublish', 'Unpublish'), ('delete', 'Delete')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 09:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_alter_productbulkjob_kind'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='version',
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2 on 2026-10-19 09:38
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce, NullIf
+
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def backfill_effective_price(apps, schema_editor):
+    """Fill effective_price in id-ordered chunks, one UPDATE per chunk"""
+    ContentType = apps.get_model('contenttypes', 'ContentType')
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+
+    content_type_ids = ProductVariant.objects.values_list('content_type_id', flat=True).distinct()
+    for content_type in ContentType.objects.filter(id__in=list(content_type_ids)):
+        model = apps.get_model(content_type.app_label, content_type.model)
+        product_price = model.objects.filter(id=OuterRef('object_id')).values('price')[:1]
+        variants = ProductVariant.objects.filter(content_type_id=content_type.id).order_by('id')
+
+        last_id = None
+        while True:
+            chunk = variants if last_id is None else variants.filter(id__gt=last_id)
+            ids = list(chunk.values_list('id', flat=True)[:BACKFILL_CHUNK_SIZE])
+            if not ids:
+                break
+            ProductVariant.objects.filter(id__in=ids).update(
+                effective_price=Coalesce(NullIf('price_override', 0), Subquery(product_price))
+            )
+            last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('products', '0010_productvariant_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='effective_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True),
+        ),
+        migrations.RunPython(backfill_effective_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-19 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_productvariant_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='flash_sale_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='productvariant',
+            name='is_flash_sale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2 on 2026-10-19 10:09
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import Case, F, OuterRef, Subquery, When
+from django.db.models.functions import Coalesce
+
+
+BACKFILL_CHUNK_SIZE = 2000
+
+
+def backfill_shipping_weight(apps, schema_editor):
+    """Fill shipping_weight_kg from logistics in id-ordered chunks, one UPDATE per chunk"""
+    Logistics = apps.get_model('logistics', 'Logistics')
+    ProductVariant = apps.get_model('products', 'ProductVariant')
+
+    weight_kg = Case(
+        When(weight_measurement='G', then=F('total_weight') * Decimal('0.001')),
+        default=F('total_weight'),
+        output_field=models.DecimalField(max_digits=8, decimal_places=5),
+    )
+    own = Logistics.objects.filter(
+        product_variant=OuterRef('pk')
+    ).annotate(kg=weight_kg).order_by('-kg').values('kg')[:1]
+    product = Logistics.objects.filter(
+        product_variant__isnull=True,
+        content_type=OuterRef('content_type'),
+        object_id=OuterRef('object_id'),
+    ).annotate(kg=weight_kg).order_by('-kg').values('kg')[:1]
+
+    variants = ProductVariant.objects.order_by('id')
+    last_id = None
+    while True:
+        chunk = variants if last_id is None else variants.filter(id__gt=last_id)
+        ids = list(chunk.values_list('id', flat=True)[:BACKFILL_CHUNK_SIZE])
+        if not ids:
+            break
+        ProductVariant.objects.filter(id__in=ids).update(
+            shipping_weight_kg=Coalesce(Subquery(own), Subquery(product))
+        )
+        last_id = ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('logistics', '0006_logistics_object_id_index'),
+        ('products', '0012_productvariant_flash_sale'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productvariant',
+            name='shipping_weight_kg',
+            field=models.DecimalField(blank=True, decimal_places=5, max_digits=8, null=True),
+        ),
+        migrations.RunPython(backfill_shipping_weight, migrations.RunPython.noop),
+    ]
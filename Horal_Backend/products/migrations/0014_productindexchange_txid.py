@@ -0,0 +1,22 @@
+# Generated by Django 5.2 on 2026-10-19 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0013_productvariant_shipping_weight_kg'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productindexchange',
+            name='txid',
+            field=models.BigIntegerField(db_default=models.Func(function='txid_current', output_field=models.BigIntegerField())),
+        ),
+        migrations.AddIndex(
+            model_name='productindexchange',
+            index=models.Index(fields=['txid', 'seq'], name='products_pr_txid_06f3b2_idx'),
+        ),
+    ]
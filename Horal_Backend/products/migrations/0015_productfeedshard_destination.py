@@ -0,0 +1,32 @@
+# Generated by Django 5.2 on 2026-10-19 10:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0014_productindexchange_txid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productfeedshard',
+            name='destination',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='productfeedshard',
+            name='last_txid',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='productfeedshard',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterUniqueTogether(
+            name='productfeedshard',
+            unique_together={('destination', 'name')},
+        ),
+    ]
@@ -2,7 +2,6 @@ from django.db import models
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 import uuid
-from django.utils.crypto import get_random_string
 from users.models import CustomUser
 from shops.models import Shop
 from categories.models import Category
@@ -14,6 +13,11 @@ from .textchoices import (
     PowerOutput, Type, SkinType, FoodCondition, AgeRecommendation
 )
 
+def product_slug(title, product_id):
+    """Slug used for product URLs: slugified title plus a short id suffix"""
+    return f"{slugify(title)}-{str(product_id)[:12]}"
+
+
 # Create your models here.   
 class PublishedProductManager(models.Manager):
     def get_queryset(self):
@@ -68,9 +72,7 @@ class BaseProduct(models.Model):
 
     def save(self, *args, **kwargs):
         if not self.slug:
-            base_slug = slugify(self.title)
-            short_uuid = str(self.id)[:12] # Use first 12 characters of the UUID
-            self.slug = f"{base_slug}-{short_uuid}"
+            self.slug = product_slug(self.title, self.id)
         super().save(*args, **kwargs)
 
     def get_variants(self):
@@ -106,23 +108,36 @@ class ProductVariant(models.Model):
     stock_quantity = models.PositiveBigIntegerField(default=0)
     reserved_quantity = models.PositiveIntegerField(default=0)
     price_override = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
-
+    # Incremented on every write, clients send it back for optimistic concurrency checks
+    version = models.PositiveIntegerField(default=1)
+    # price_override or the product price, kept in sync so prices can be summed in SQL
+    effective_price = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    # Flash sale variants sell from a Redis counter, see flash_sale_utils
+    is_flash_sale = models.BooleanField(default=False)
+    # Last flash sale journal entry applied to the stock columns
+    flash_sale_seq = models.PositiveBigIntegerField(default=0)
+    # Logistics weight in kg (the variant's own, else the product's), kept in
+    # sync by refresh_shipping_weights. Null when neither has logistics
+    shipping_weight_kg = models.DecimalField(max_digits=8, decimal_places=5, null=True, blank=True)
+
+
+    def refresh_effective_price(self, product=None):
+        product = product or self.product
+        self.effective_price = self.price_override or (product.price if product else None)
 
     def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version', 'effective_price'}
+
+        self.refresh_effective_price()
+
         if not self.sku:
-            base = slugify(self.product.title)[:5].upper()
-            color = self.color[:3].upper() if self.color else "XXX"
-            size = self.standard_size or self.custom_size_value or "FRE"
-            
+            from .variant_utils import allocate_skus
+
             # Generating a unique SKU
-            for _ in range(10): 
-                random_part = get_random_string(4).upper()
-                candidate = f"{base}-{color}-{size}-{random_part}"
-                if not ProductVariant.objects.filter(sku=candidate).exists():
-                    self.sku = candidate
-                    break
-                else:
-                    raise ValueError("Unable to generate unique SKU after 10 attempts.")
+            allocate_skus([self], {self.object_id: self.product.title})
         
         # Set the shop (once product is attached)
         if self.product and hasattr(self.product, "shop"):
@@ -523,6 +538,95 @@ class ProductIndex(models.Model):
         return f"{self.category} - {self.object_id}"
 
 
+class ProductIndexChange(models.Model):
+    """
+    Append-only change log over ProductIndex.
+    Sync tokens are (txid, seq): seqs are taken at insert but become visible at
+    commit, so entries are ordered by the writing transaction first
+    """
+    class Operation(models.TextChoices):
+        UPSERT = "upsert", "Upsert"
+        DELETE = "delete", "Delete"
+
+    seq = models.BigAutoField(primary_key=True)
+    # Id of the transaction that wrote the entry, set by Postgres
+    txid = models.BigIntegerField(
+        db_default=models.Func(function='txid_current', output_field=models.BigIntegerField())
+    )
+    product_id = models.UUIDField(db_index=True)
+    operation = models.CharField(max_length=10, choices=Operation.choices)
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['txid', 'seq']),
+        ]
+
+    def __str__(self):
+        return f"{self.seq} - {self.operation} - {self.product_id}"
+
+
+class ProductFeedShard(models.Model):
+    """
+    Last published state of each generated sitemap shard and product feed file,
+    used to skip uploads whose content has not changed.
+    Files uploaded to S3 have an empty destination, local runs record their output directory.
+    last_txid and last_seq are the change log token the file was generated at
+    """
+    destination = models.CharField(max_length=255, blank=True, default="")
+    name = models.CharField(max_length=100)
+    checksum = models.CharField(max_length=64)
+    item_count = models.PositiveIntegerField(default=0)
+    last_txid = models.BigIntegerField(default=0)
+    last_seq = models.BigIntegerField(default=0)
+    generated_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('destination', 'name')
+
+    def __str__(self):
+        return f"{self.name} ({self.item_count})"
+
+
+class ProductBulkJob(models.Model):
+    """Tracks progress and per-row errors of asynchronous bulk product jobs"""
+    class Kind(models.TextChoices):
+        IMPORT = "import", "Import"
+        PUBLISH = "publish", "Publish"
+        UNPUBLISH = "unpublish", "Unpublish"
+        DELETE = "delete", "Delete"
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        COMPLETED = "completed", "Completed"
+        FAILED = "failed", "Failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    kind = models.CharField(max_length=20, choices=Kind.choices)
+    status = models.CharField(max_length=20, choices=Status.choices, default=Status.PENDING)
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, related_name="bulk_jobs")
+    requested_by = models.ForeignKey(
+        CustomUser, on_delete=models.SET_NULL,
+        null=True, blank=True, related_name="product_bulk_jobs"
+    )
+    file_key = models.CharField(max_length=255, blank=True)
+    params = models.JSONField(default=dict, blank=True)
+
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    succeeded = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} {self.status} - {self.shop_id}"
+
+
 class RecentlyViewedProduct(models.Model):
     """Model to handle users recently viewed products"""
     user = models.ForeignKey(
@@ -0,0 +1,138 @@
+from collections import Counter
+from django.db import transaction
+from django.db.models import Case, When, Value, F
+from django.db.models.functions import Greatest
+from .inventory_utils import refresh_product_quantities
+from .models import ProductVariant
+
+
+class InsufficientStock(Exception):
+    """Raised with {variant: quantity available} for every line that cannot be reserved"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        super().__init__(", ".join(
+            f"Only {available} items available for {variant}" for variant, available in shortages.items()
+        ))
+
+
+class InventoryModeChanged(Exception):
+    """Raised when a variant entered or left flash sale mode during a checkout, retrying succeeds"""
+
+    def __init__(self, variants):
+        self.variants = variants
+        super().__init__(", ".join(
+            f"Stock for {variant} is changing over to or from a flash sale, please try again" for variant in variants
+        ))
+
+
+def _quantities(lines):
+    """Sum (variant_id, quantity) pairs per variant"""
+    totals = Counter()
+    for variant_id, quantity in lines:
+        totals[variant_id] += quantity
+    return totals
+
+
+def _per_variant(quantities):
+    return Case(
+        *[When(id=variant_id, then=Value(quantity)) for variant_id, quantity in quantities.items()],
+        default=Value(0),
+    )
+
+
+def lock_variants(variant_ids):
+    """
+    Lock every variant in one SELECT ... FOR UPDATE ORDER BY id.
+    Taking row locks in id order means two checkouts with overlapping carts
+    queue behind each other instead of deadlocking
+    """
+    return {
+        variant.id: variant
+        for variant in ProductVariant.objects.select_for_update().filter(id__in=variant_ids).order_by('id')
+    }
+
+
+def reserve_stock(lines, release=()):
+    """
+    Move the quantities of (variant_id, quantity) lines from stock_quantity to
+    reserved_quantity, after giving back the `release` lines of a previous
+    reservation (e.g. an order being re-checked out).
+    The whole change takes one locking SELECT and one UPDATE. If any line is
+    short, InsufficientStock is raised and nothing is written.
+    Returns the locked variants by id
+    """
+    quantities = _quantities(lines)
+    releasing = _quantities(release)
+    if not quantities and not releasing:
+        return {}
+
+    with transaction.atomic():
+        variants = lock_variants(quantities.keys() | releasing.keys())
+
+        # Never give back more than the variant has reserved
+        freed = {
+            variant_id: min(quantity, variants[variant_id].reserved_quantity)
+            for variant_id, quantity in releasing.items() if variant_id in variants
+        }
+
+        # Flash sale stock is held in Redis, a stale flag read by the caller lands here
+        flashing = [variants[variant_id] for variant_id in quantities if variant_id in variants
+                    and variants[variant_id].is_flash_sale]
+        if flashing:
+            raise InventoryModeChanged(flashing)
+
+        shortages = {}
+        for variant_id, quantity in quantities.items():
+            variant = variants.get(variant_id)
+            available = variant.stock_quantity + freed.get(variant_id, 0) if variant else 0
+            if available < quantity:
+                shortages[variant or variant_id] = available
+        if shortages:
+            raise InsufficientStock(shortages)
+
+        # Net quantity moved from stock to reserved, negative when released
+        moved = {
+            variant_id: quantities.get(variant_id, 0) - freed.get(variant_id, 0)
+            for variant_id in variants
+        }
+        moved = {variant_id: quantity for variant_id, quantity in moved.items() if quantity}
+        if moved:
+            delta = _per_variant(moved)
+            ProductVariant.objects.filter(id__in=moved.keys()).update(
+                stock_quantity=F('stock_quantity') - delta,
+                reserved_quantity=F('reserved_quantity') + delta,
+                version=F('version') + 1,
+            )
+
+    # stock + reserved is unchanged, so product quantities need no refresh
+    for variant_id, quantity in moved.items():
+        variants[variant_id].stock_quantity -= quantity
+        variants[variant_id].reserved_quantity += quantity
+    return variants
+
+
+def release_stock(lines):
+    """
+    Give reserved quantities back to stock, e.g. when an order is cancelled or
+    fails. Never releases more than the variant has reserved
+    """
+    reserve_stock((), release=lines)
+
+
+def commit_stock(lines):
+    """
+    Consume reserved quantities once an order is paid, then refresh the
+    quantity of the products involved
+    """
+    quantities = _quantities(lines)
+    if not quantities:
+        return
+
+    with transaction.atomic():
+        variants = lock_variants(quantities.keys())
+        ProductVariant.objects.filter(id__in=quantities.keys()).update(
+            reserved_quantity=Greatest(F('reserved_quantity') - _per_variant(quantities), Value(0)),
+            version=F('version') + 1,
+        )
+        refresh_product_quantities({(v.content_type_id, v.object_id) for v in variants.values()})
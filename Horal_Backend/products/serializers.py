@@ -1,10 +1,13 @@
 from rest_framework import serializers
-from django.db.models import Q, Avg
+from collections import Counter
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Avg, Sum, F
 from .models import (
     ChildrenProduct,
     ProductVariant, VehicleProduct, GadgetProduct,
     FashionProduct, ElectronicsProduct, AccessoryProduct,
-    HealthAndBeautyProduct, FoodProduct, ProductIndex,
+    HealthAndBeautyProduct, FoodProduct, ProductIndex, ProductBulkJob,
     VehicleImage, FashionImage, ElectronicsImage, FoodImage,
     HealthAndBeautyImage, AccessoryImage, ChildrenImage, GadgetImage
 )
@@ -16,6 +19,7 @@ from subcategories.models import SubCategory
 from django.contrib.contenttypes.models import ContentType
 from ratings.models import UserRating
 from logistics.serializers import LogisticsSerializer
+from .variant_utils import bulk_create_variants
 
 from .textchoices import (
     Color, SizeOption, ProductCondition, EngineType, EngineSize,
@@ -105,9 +109,9 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'color', 'custom_size_unit', 'standard_size', 'sku', 'size',
             'custom_size_value', 'stock_quantity', 'reserved_quantity', 'price_override',
-            'logistics', 'logistics_data'
+            'effective_price', 'version', 'logistics', 'logistics_data'
         ]
-        read_only_fields = ['id', 'sku', 'logistics_data']
+        read_only_fields = ['id', 'sku', 'effective_price', 'version', 'logistics_data']
     
     def get_logistics_data(self, obj):
         logistics_qs = obj.get_logistics() # defined in BaseProduct
@@ -158,7 +162,7 @@ class ProductRatingMixin(serializers.Serializer):
 
 class ProductCreateMixin:
     def create(self, validated_data):
-        from .utils import image_model_map, validate_logistics_vs_variants
+        from .utils import image_model_map, validate_logistics_placement, set_product_images
         from logistics.models import Logistics
         from logistics.serializers import LogisticsSerializer
 
@@ -167,142 +171,84 @@ class ProductCreateMixin:
         variant_data = validated_data.pop('variants', [])
         logistic_data = validated_data.pop('logistics', {})
 
-        # Check variant logistics consistency
-        variant_have_logistics = [v.get('logistics') is not None for v in variant_data]
-        if any(variant_have_logistics) and logistic_data:
-            raise serializers.ValidationError(
-                    "Logistics can either be at variant or product level not both"
-                )
-        elif any(variant_have_logistics):
-            if not all(variant_have_logistics):
-                raise serializers.ValidationError(
-                    "if any variant has logistics, all variant must have logistics"
-                )
-        else:
-            if not logistic_data:
-                raise serializers.ValidationError(
-                    "No variant logistics provided, product-level is required if no variant logistics"
-                )
-        
-        # Ensure proper weight values are provided
-        validate_logistics_vs_variants(logistic_data, variant_data)
-
-        # Now create the product safely
-        instance = self.Meta.model.objects.create(**validated_data)
-
-        # Dynamically resolve image model
-        model_name = instance.__class__.__name__
-        image_model_class = image_model_map.get(model_name)
-
-        if image_model_class:
-            for img in images:
-                image_model_class.objects.create(product=instance, **img)
-
-        # Create variants and their logistics
-        for variant in variant_data:
-            variant_logistics = variant.pop('logistics', None)
-            variant_instance = ProductVariant.objects.create(product=instance, **variant)
-
-            # Create logistics for this variant if provided
-            if variant_logistics:
-                # logistic_data['product_variant'] = variant_instance.id
-                serializer = LogisticsSerializer(data=variant_logistics)
-                if serializer.is_valid():
-                    serializer.save(product_variant=variant_instance)  # attach variant
-                else:
-                    raise serializers.ValidationError(serializer.errors)
-                # Logistics.objects.create(product_variant=variant_logistics, **variant_logistics)
-        
-        # Create logistics for a single product if provided
-        if not any(variant_have_logistics) and logistic_data:
-                serializer = LogisticsSerializer(data=logistic_data)
-                if serializer.is_valid(raise_exception=True):
-                    serializer.save(product=instance)  # attach product
-        # Logistics.objects.create(product=instance, **logistic_data)
+        # Check variant logistics consistency and weights
+        variant_have_logistics = validate_logistics_placement(logistic_data, variant_data)
 
-        # Update product quantity based on stock
-        from .utils import update_quantity
-        update_quantity(instance)
+        with transaction.atomic():
+            # Stock is known up front, so the product (and its index row)
+            # is written once with the right quantity
+            instance = self.Meta.model(**validated_data)
+            instance.quantity = sum(
+                v.get('stock_quantity', 0) + v.get('reserved_quantity', 0) for v in variant_data
+            )
+            instance.save()
+
+            # Dynamically resolve image model
+            model_name = instance.__class__.__name__
+            image_model_class = image_model_map.get(model_name)
+
+            if image_model_class and images:
+                set_product_images(instance, image_model_class, images)
+
+            # Create variants and their logistics
+            bulk_create_variants(instance, variant_data)
+
+            # Create logistics for a single product if provided
+            if not any(variant_have_logistics) and logistic_data:
+                    serializer = LogisticsSerializer(data=logistic_data)
+                    if serializer.is_valid(raise_exception=True):
+                        serializer.save(product=instance)  # attach product
 
         return instance
     
 
     def update(self, instance, validated_data):
-        from .utils import image_model_map
+        from .utils import image_model_map, set_product_images
         from logistics.models import Logistics
         """
         Product update especially for nested fields like images and variants
         """
-        from .utils import validate_logistics_vs_variants
+        from .utils import validate_logistics_placement
 
         images = validated_data.pop('images', [])
         variant_data = validated_data.pop('variants', [])
         logistic_data = validated_data.pop('logistics', {})
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
+        # Check variant logistics consistency and weights
+        variant_have_logistics = validate_logistics_placement(logistic_data, variant_data)
 
-        # Dynamically resolve image model
-        model_name = instance.__class__.__name__
-        image_model_class = image_model_map[model_name]
+        with transaction.atomic():
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
 
-        if image_model_class and images:
-            # Clear old images before adding new ones
-            image_model_class.objects.filter(product=instance).delete()
-            for img in images:
-                image_model_class.objects.create(product=instance, **img)
-
-        # Check variant logistics consistency
-        variant_have_logistics = [v.get('logistics') is not None for v in variant_data]
-        if any(variant_have_logistics) and logistic_data:
-            raise serializers.ValidationError(
-                    "Logistics can either be at variant or product level not both"
-                )
-        elif any(variant_have_logistics):
-            if not all(variant_have_logistics):
-                raise serializers.ValidationError(
-                    "if any variant has logistics, all variant must have logistics"
-                )
-        else:
-            if not logistic_data:
-                raise serializers.ValidationError(
-                    "No variant logistics provided, product-level is required if no variant logistics"
-                )
-        
-        # Ensure proper weight values are provided
-        validate_logistics_vs_variants(logistic_data, variant_data)
-
-        if variant_data:
-            instance.get_variants().delete()
-            for variant in variant_data:
-                variant_logistics = variant.pop('logistics', None)
-                variant_instance = ProductVariant.objects.create(product=instance, **variant)
-
-                # Update variant logistics if updated
-                if variant_logistics:
-                    serializer = LogisticsSerializer(data=variant_logistics)
-                    if serializer.is_valid(raise_exception=True):
-                        serializer.save(product_variant=variant_instance)  # attach product
-                    else:
-                        raise serializers.ValidationError(serializer.errors)
-                    # variant_instance.logistics_variant.delete()
-                    # Logistics.objects.create(product_variant=variant_instance, **variant_logistics)
-
-        # Update product-level logistics if variants have None
-        if not any(variant_have_logistics) and logistic_data:
-            # Delete old product logistics
-            instance.get_logistics().delete()
-            serializer = LogisticsSerializer(data=logistic_data)
-            if serializer.is_valid(raise_exception=True):
-                serializer.save(product=instance)  # attach product
-           
-            # instance.get_logistics().delete()
-            # Logistics.objects.create(product=instance, **logistic_data)
-        
-        # Update product quantity based on stock
-        from .utils import update_quantity
-        update_quantity(instance)
+            if variant_data:
+                instance.get_variants().delete()
+                # Product quantity comes from the replacement variants
+                instance.quantity = bulk_create_variants(instance, variant_data)
+            else:
+                instance.quantity = instance.get_variants().aggregate(
+                    total=Sum(F('stock_quantity') + F('reserved_quantity'))
+                )['total'] or 0
+
+            # Single save, so the index row is refreshed once
+            instance.save()
+
+            # Dynamically resolve image model
+            model_name = instance.__class__.__name__
+            image_model_class = image_model_map[model_name]
+
+            if image_model_class and images:
+                # Clear old images before adding new ones
+                image_model_class.objects.filter(product=instance).delete()
+                set_product_images(instance, image_model_class, images)
+
+            # Update product-level logistics if variants have None
+            if not any(variant_have_logistics) and logistic_data:
+                # Delete old product logistics
+                instance.get_logistics().delete()
+                serializer = LogisticsSerializer(data=logistic_data)
+                if serializer.is_valid(raise_exception=True):
+                    serializer.save(product=instance)  # attach product
 
         return instance 
     
@@ -686,6 +632,76 @@ class FoodProductSerializer(
     #     return normalize_choice(value, ProductCondition)
 
 
+class ProductBulkJobSerializer(serializers.ModelSerializer):
+    """Serializer for bulk product job progress"""
+
+    class Meta:
+        model = ProductBulkJob
+        fields = [
+            "id", "kind", "status", "shop", "params", "total", "processed",
+            "succeeded", "failed", "errors", "created_at", "started_at", "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class ProductListingFilterSerializer(serializers.Serializer):
+    """Filters selecting a seller's listings for a bulk action"""
+    category = serializers.CharField(required=False)
+    sub_category = serializers.CharField(required=False)
+    brand = serializers.CharField(required=False)
+    condition = serializers.CharField(required=False)
+    state = serializers.CharField(required=False)
+    local_govt = serializers.CharField(required=False)
+    is_published = serializers.BooleanField(required=False)
+    out_of_stock = serializers.BooleanField(required=False)
+    search = serializers.CharField(required=False)
+
+
+class ProductBulkActionSerializer(serializers.Serializer):
+    """Serializer for bulk publish, unpublish and delete requests"""
+    action = serializers.ChoiceField(choices=[
+        ProductBulkJob.Kind.PUBLISH, ProductBulkJob.Kind.UNPUBLISH, ProductBulkJob.Kind.DELETE,
+    ])
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False, max_length=50000)
+    filters = ProductListingFilterSerializer(required=False)
+    shop = serializers.UUIDField(required=False)
+
+    def validate(self, attrs):
+        if "ids" not in attrs and "filters" not in attrs:
+            raise serializers.ValidationError(
+                "Provide product ids, filters, or both. Use empty filters to select the whole shop"
+            )
+        return attrs
+
+
+class InventoryItemSerializer(serializers.Serializer):
+    """One SKU of a bulk inventory update"""
+    sku = serializers.CharField(max_length=50)
+    stock_quantity = serializers.IntegerField(min_value=0, required=False)
+    price_override = serializers.DecimalField(
+        max_digits=12, decimal_places=2, min_value=0, allow_null=True, required=False
+    )
+    version = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        if "stock_quantity" not in attrs and "price_override" not in attrs:
+            raise serializers.ValidationError("Provide stock_quantity, price_override, or both")
+        return attrs
+
+
+class InventoryBulkUpdateSerializer(serializers.Serializer):
+    """Serializer for bulk stock and price updates keyed by SKU"""
+    items = InventoryItemSerializer(many=True, allow_empty=False, max_length=settings.INVENTORY_BULK_MAX_ITEMS)
+    shop = serializers.UUIDField(required=False)
+
+    def validate_items(self, items):
+        counts = Counter(item["sku"] for item in items)
+        duplicates = sorted(sku for sku, count in counts.items() if count > 1)
+        if duplicates:
+            raise serializers.ValidationError(f"Duplicate SKUs: {', '.join(duplicates)}")
+        return items
+
+
 # Dynamic serializer solver (for views)
 def get_product_serializer(category_name):
     mapping = {
@@ -773,3 +789,15 @@ class ProductIndexSerializer(serializers.ModelSerializer):
         return 0
 
 
+class ProductIndexSyncSerializer(serializers.ModelSerializer):
+    """Flat index row for delta sync clients, no per-row rating lookups"""
+
+    class Meta:
+        model = ProductIndex
+        fields = [
+            "id", "title", "slug", "price", "image", "brand",
+            "state", "local_govt", "condition", "description", "quantity",
+            "category", "sub_category", "shop", "specifications", "created_at",
+        ]
+
+
@@ -1,84 +1,61 @@
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.contrib.contenttypes.models import ContentType
-from .models import ProductIndex
-from .utils import CATEGORY_MODEL_MAP, image_model_map
+from .utils import image_model_map
+from .index_utils import mark_index_dirty, MODEL_CATEGORY_MAP
+from .models import ProductVariant
+from .variant_utils import sync_effective_price, refresh_shipping_weights
 
 
-MODEL_CATEGORY_MAP = {v: k for k, v in CATEGORY_MODEL_MAP.items()}
-
 @receiver(post_save)
-def create_or_update_product_index(sender, instance, created, **kwargs):
+@receiver(post_delete)
+def queue_product_index_sync(sender, instance, **kwargs):
     """
-    Automatically create product index once a product is created
-    
+    Keep the product index in line with product saves and deletes.
+    Rows are written in bulk on commit rather than on every save
+
     NOTE:
-    For ProductIndex, content_type_id is intentionally set to the UUID of the product itself
+    For ProductIndex, the id is intentionally set to the UUID of the product itself
     to simplify joins with ProductVariant and avoid Django ContentType joins.
     """
     if sender not in MODEL_CATEGORY_MAP:
         return
 
+    mark_index_dirty(sender, instance.id)
 
-    defaults = {
-        "shop": instance.shop,
-        "category": MODEL_CATEGORY_MAP[sender],
-        "sub_category": instance.sub_category.name,
-        "title": instance.title,
-        "slug": instance.slug,
-        "price": instance.price,
-        "description": instance.description,
-        "specifications": instance.specifications,
-        "state": instance.state,
-        "local_govt": instance.local_govt,
-        "condition": instance.condition,
-        "is_published": instance.is_published,
-        "quantity": instance.quantity,
-        "brand": getattr(instance, "brand", "") or "",
-    }
-
-    ProductIndex.objects.update_or_create(
-        id=instance.id,
-        content_type=ContentType.objects.get_for_model(sender),
-        object_id=instance.id,
-        defaults=defaults,
-    )
 
-
-
-@receiver(post_delete)
-def delete_product_index(sender, instance, **kwargs):
-    """Automatically delete product index when product is deleted"""
+@receiver(post_save)
+def sync_variant_effective_price(sender, instance, **kwargs):
+    """Keep ProductVariant.effective_price in line with the product price"""
     if sender not in MODEL_CATEGORY_MAP:
         return
 
-    ProductIndex.objects.filter(
-        content_type=ContentType.objects.get_for_model(sender),
-        object_id=instance.id
-    ).delete()
+    sync_effective_price(instance)
+
+
+@receiver(post_save, sender="logistics.Logistics")
+@receiver(post_delete, sender="logistics.Logistics")
+def sync_variant_shipping_weight(sender, instance, **kwargs):
+    """Keep ProductVariant.shipping_weight_kg in line with logistics rows"""
+    if instance.product_variant_id:
+        variants = ProductVariant.objects.filter(id=instance.product_variant_id)
+    else:
+        variants = ProductVariant.objects.filter(
+            content_type_id=instance.content_type_id, object_id=instance.object_id
+        )
+    refresh_shipping_weights(variants)
 
 
 IMAGE_MAP = {v: k for k, v in image_model_map.items()}
 
 @receiver(post_save)
+@receiver(post_delete)
 def update_product_index_image(sender, instance, **kwargs):
     """
-    Update ProductIndex.image when an image is saved for any product type.
+    Refresh ProductIndex.image when an image is saved or removed for any product type.
     """
     # Check if the sender is a known image model
-    if sender not in image_model_map.values():
+    if sender not in IMAGE_MAP:
         return
-    
-    # Get the related product instance from the image
-    product = getattr(instance, 'product', None)  # assuming FK on image is named 'product'
-    if not product:
-        return
-
-    first_image = product.images.first()
-    if first_image:
-        ProductIndex.objects.update_or_create(
-            content_type=ContentType.objects.get_for_model(product.__class__),
-            object_id=product.id,
-            defaults={"image": first_image.url}
-        )
 
+    product_model = instance._meta.get_field('product').related_model
+    mark_index_dirty(product_model, instance.product_id)
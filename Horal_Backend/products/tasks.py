@@ -0,0 +1,61 @@
+from celery import shared_task
+import logging
+from .index_utils import prune_index_changes
+from .flash_sale_utils import release_expired_flash_holds, reconcile_flash_journal
+from .feed_utils import generate_all
+from .import_utils import run_product_import
+from .listing_utils import run_listing_job
+from .models import ProductBulkJob
+from media.utils.s3 import download_file
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task
+def prune_product_index_changes():
+    """Drop catalog change log entries past the retention window"""
+    deleted = prune_index_changes()
+    logger.info(f"Pruned {deleted} product index change entries")
+    return deleted
+
+
+@shared_task
+def generate_product_feeds_task():
+    """Regenerate sitemaps and merchant feeds when the catalog changed"""
+    results = generate_all()
+    logger.info(f"Product feed generation finished: {results}")
+    return results
+
+
+@shared_task
+def reconcile_flash_sales_task():
+    """Release expired flash sale holds, then apply the Redis journal to Postgres"""
+    released = release_expired_flash_holds()
+    applied = reconcile_flash_journal()
+    if released or applied:
+        logger.info(f"Flash sale reconciliation: {released} expired holds released, {applied} journal entries applied")
+    return released, applied
+
+
+@shared_task
+def run_product_import_task(job_id):
+    """Run a bulk product import from its uploaded file"""
+    job = ProductBulkJob.objects.select_related('shop').get(id=job_id)
+
+    with download_file(job.file_key) as fileobj:
+        job = run_product_import(job, fileobj, job.params.get("format", "csv"))
+
+    logger.info(
+        f"Product import {job.id} finished: {job.succeeded} created, {job.failed} failed"
+    )
+    return str(job.id)
+
+
+@shared_task
+def run_listing_job_task(job_id):
+    """Run a bulk publish, unpublish or delete over a large selection"""
+    job = ProductBulkJob.objects.select_related('shop').get(id=job_id)
+    job = run_listing_job(job)
+
+    logger.info(f"Bulk {job.kind} {job.id} finished: {job.succeeded} of {job.total} listings changed")
+    return str(job.id)
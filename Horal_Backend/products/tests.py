@@ -1,3 +1,204 @@
+import io
+import json
+import uuid
+from decimal import Decimal
+from unittest import mock
+from django.contrib.contenttypes.models import ContentType
 from django.test import TestCase
+from django.utils import timezone
+from categories.models import Category
+from logistics.models import Logistics
+from shops.models import Shop
+from subcategories.models import SubCategory
+from .export_utils import jsonl_stream
+from .import_utils import ProductImporter, run_product_import
+from .models import GadgetProduct, ProductBulkJob, ProductVariant
+from .reservation_utils import (
+    InsufficientStock, InventoryModeChanged, reserve_stock, release_stock, commit_stock,
+)
 
-# Create your tests here.
+
+class ReservationTests(TestCase):
+    """reserve_stock, release_stock and commit_stock: all-or-nothing, never past the counters"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category, _ = Category.objects.get_or_create(name="gadget")
+        sub_category, _ = SubCategory.objects.get_or_create(category=category, name="Phones")
+        shop = Shop.objects.create(owner_type=Shop.OwnerType.PLATFORM, name="reservation-tests")
+        cls.product = GadgetProduct.objects.create(
+            shop=shop, category=category, sub_category=sub_category, title="Reservation phone",
+            description="Phone", price=Decimal("1000.00"), state="Lagos", local_govt="Ikeja", brand="Horal",
+        )
+        content_type = ContentType.objects.get_for_model(GadgetProduct)
+        cls.black, cls.red = [
+            ProductVariant.objects.create(
+                content_type=content_type, object_id=cls.product.id,
+                shop=shop, color=color, stock_quantity=stock,
+            )
+            for color, stock in (("black", 5), ("red", 2))
+        ]
+
+    def stock(self, variant):
+        variant.refresh_from_db()
+        return variant.stock_quantity, variant.reserved_quantity
+
+    def test_reserve_moves_stock_and_sums_repeated_lines(self):
+        reserve_stock([(self.black.id, 2), (self.red.id, 1), (self.black.id, 1)])
+
+        self.assertEqual(self.stock(self.black), (2, 3))
+        self.assertEqual(self.stock(self.red), (1, 1))
+
+    def test_shortage_reports_every_short_line_and_writes_nothing(self):
+        missing = uuid.uuid4()
+
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock([(self.black.id, 5), (self.red.id, 3), (missing, 1)])
+
+        self.assertEqual(raised.exception.shortages, {self.red: 2, missing: 0})
+        self.assertEqual(self.stock(self.black), (5, 0))
+        self.assertEqual(self.stock(self.red), (2, 0))
+
+    def test_released_lines_count_towards_a_new_reservation(self):
+        reserve_stock([(self.red.id, 2)])
+
+        reserve_stock([(self.red.id, 2)], release=[(self.red.id, 2)])
+        self.assertEqual(self.stock(self.red), (0, 2))
+
+        with self.assertRaises(InsufficientStock):
+            reserve_stock([(self.red.id, 3)], release=[(self.red.id, 2)])
+        self.assertEqual(self.stock(self.red), (0, 2))
+
+    def test_release_is_capped_at_reserved(self):
+        reserve_stock([(self.black.id, 2)])
+
+        release_stock([(self.black.id, 3)])
+        self.assertEqual(self.stock(self.black), (5, 0))
+
+        release_stock([(self.black.id, 1)])
+        self.assertEqual(self.stock(self.black), (5, 0))
+
+    def test_commit_consumes_reserved_and_refreshes_product_quantity(self):
+        reserve_stock([(self.black.id, 3), (self.red.id, 1)])
+
+        commit_stock([(self.black.id, 3), (self.red.id, 1)])
+        commit_stock([(self.red.id, 1)])
+
+        self.assertEqual(self.stock(self.black), (2, 0))
+        self.assertEqual(self.stock(self.red), (1, 0))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 3)
+
+    def test_flash_sale_variant_is_refused(self):
+        ProductVariant.objects.filter(id=self.red.id).update(is_flash_sale=True)
+
+        with self.assertRaises(InventoryModeChanged):
+            reserve_stock([(self.black.id, 1), (self.red.id, 1)])
+        self.assertEqual(self.stock(self.black), (5, 0))
+
+
+class ImportUpdateTests(TestCase):
+    """Re-importing an edited export updates products in place, stale rows are conflicts"""
+
+    @classmethod
+    def setUpTestData(cls):
+        category, _ = Category.objects.get_or_create(name="gadget")
+        cls.sub_category, _ = SubCategory.objects.get_or_create(category=category, name="Phones")
+        cls.shop = Shop.objects.create(owner_type=Shop.OwnerType.PLATFORM, name="import-tests")
+
+    def setUp(self):
+        summary = self.run_import([{
+            "category": "gadget", "sub_category": self.sub_category.name, "title": f"Import phone {n}",
+            "description": "Phone", "price": "1000.00", "state": "Lagos", "local_govt": "Ikeja", "brand": "Horal",
+            "images": [{"url": f"https://cdn.horal.ng/import-tests/{n}.jpg"}],
+            "variants": [
+                {"color": "black", "stock_quantity": 5,
+                 "logistics": {"weight_measurement": "KG", "total_weight": "4.00"}},
+                {"color": "red", "stock_quantity": 3,
+                 "logistics": {"weight_measurement": "KG", "total_weight": "2.00"}},
+            ],
+        } for n in range(2)])
+        self.assertEqual(summary, (2, 0, []))
+
+    def run_import(self, payloads):
+        job = ProductBulkJob.objects.create(kind=ProductBulkJob.Kind.IMPORT, shop=self.shop)
+        data = "\n".join(json.dumps(payload) for payload in payloads).encode()
+        job = run_product_import(job, io.BytesIO(data), "jsonl")
+        return job.succeeded, job.failed, job.errors
+
+    def export(self):
+        return [json.loads(line) for line in b"".join(jsonl_stream(self.shop)).splitlines()]
+
+    def variants(self):
+        return {
+            v.sku: (v.stock_quantity, v.version)
+            for v in ProductVariant.objects.filter(shop=self.shop)
+        }
+
+    def test_edited_export_updates_in_place(self):
+        before = self.variants()
+        payloads = self.export()
+        for payload in payloads:
+            payload["title"] += " edited"
+            payload["variants"][0]["stock_quantity"] = 9
+
+        self.assertEqual(self.run_import(payloads), (2, 0, []))
+
+        self.assertEqual(GadgetProduct.objects.filter(shop=self.shop).count(), 2)
+        self.assertTrue(all(p.title.endswith(" edited") for p in GadgetProduct.objects.filter(shop=self.shop)))
+        after = self.variants()
+        self.assertEqual(after.keys(), before.keys())
+        self.assertTrue(all(after[sku][1] == before[sku][1] + 1 for sku in before))
+
+    def test_stale_variant_version_is_a_conflict(self):
+        payloads = self.export()
+        ProductVariant.objects.filter(sku=payloads[0]["variants"][0]["sku"]).update(version=5)
+        for payload in payloads:
+            payload["description"] = "Updated"
+
+        succeeded, failed, errors = self.run_import(payloads)
+
+        self.assertEqual((succeeded, failed), (1, 1))
+        self.assertIn("changed since it was exported", errors[0]["error"])
+        self.assertEqual(
+            sorted(GadgetProduct.objects.filter(shop=self.shop).values_list("description", flat=True)),
+            ["Phone", "Updated"],
+        )
+
+    def test_product_edited_after_it_was_read_is_a_conflict(self):
+        payloads = self.export()
+        edited = payloads[0]["title"]
+        load_existing = ProductImporter.load_existing
+
+        def edit_meanwhile(importer, rows):
+            load_existing(importer, rows)
+            GadgetProduct.objects.filter(shop=self.shop, title=edited).update(
+                is_published=True, updated_at=timezone.now()
+            )
+
+        with mock.patch.object(ProductImporter, "load_existing", edit_meanwhile):
+            succeeded, failed, _ = self.run_import(payloads)
+
+        self.assertEqual((succeeded, failed), (1, 1))
+        self.assertTrue(GadgetProduct.objects.get(shop=self.shop, title=edited).is_published)
+
+    def test_variants_left_out_of_the_file_keep_their_logistics(self):
+        payloads = self.export()
+        for payload in payloads:
+            payload["variants"] = [v for v in payload["variants"] if v["color"] == "red"]
+
+        self.assertEqual(self.run_import(payloads), (2, 0, []))
+
+        for variant in ProductVariant.objects.filter(shop=self.shop, color="black"):
+            self.assertEqual(variant.shipping_weight_kg, Decimal("4.00"))
+            self.assertTrue(Logistics.objects.filter(product_variant=variant).exists())
+
+    def test_stock_of_a_flash_sale_variant_is_refused(self):
+        payloads = self.export()
+        ProductVariant.objects.filter(sku=payloads[0]["variants"][0]["sku"]).update(is_flash_sale=True)
+        payloads[0]["variants"][0]["stock_quantity"] = 1
+
+        succeeded, failed, errors = self.run_import(payloads[:1])
+
+        self.assertEqual((succeeded, failed), (0, 1))
+        self.assertIn("flash sale", errors[0]["error"])
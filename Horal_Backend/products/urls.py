@@ -9,6 +9,16 @@ urlpatterns = [
     path('recently-viewed/', views.RecentlyViewedProductView.as_view(), name="recently-viewed-products"),
     # Top selling products
     path('top-selling/', views.TopSellingProductListView.as_view(), name="top-selling-products"),
+    # Bulk import/export, listing actions and job progress
+    path('import/', views.ProductImportView.as_view(), name='product-import'),
+    path('export/', views.ProductExportView.as_view(), name='product-export'),
+    path('bulk/', views.ProductBulkActionView.as_view(), name='product-bulk-action'),
+    path('inventory/bulk/', views.InventoryBulkUpdateView.as_view(), name='inventory-bulk-update'),
+    path('jobs/<uuid:job_id>/', views.ProductBulkJobView.as_view(), name='product-bulk-job'),
+    # Incremental catalog sync
+    path('changes/', views.ProductChangesView.as_view(), name='product-changes'),
+    # Sitemaps and merchant feeds
+    path('feeds/<str:name>', views.ProductFeedView.as_view(), name='product-feed'),
     # Product endpoints
     path('', views.ProductListView.as_view(), name='product-list'),
     path('<str:category_name>/create/', views.ProductCreateView.as_view(), name='product-create'),
@@ -17,6 +17,8 @@ from .serializers import (
     HealthAndBeautyProductSerializer, AccessoryProductSerializer, normalize_choice
 ) 
 from django.db import connection
+from django.db.models import Sum, F
+from Horal_Backend.sessions import ensure_session_key
 from django.utils.timezone import now
 
 
@@ -155,9 +157,25 @@ class IsSellerAdminOrSuperuser(IsAuthenticated):
 
 # helper function to update total stock for products after purchases
 def update_quantity(product):
-    total = sum(v.stock_quantity + v.reserved_quantity for v in product.get_variants())
-    product.quantity = total
-    product.save(update_fields=['quantity'])
+    total = product.get_variants().aggregate(
+        total=Sum(F('stock_quantity') + F('reserved_quantity'))
+    )['total'] or 0
+
+    # Skip the write (and the index refresh it triggers) when nothing changed
+    if product.quantity != total:
+        product.quantity = total
+        product.save(update_fields=['quantity'])
+
+
+def set_product_images(product, image_model_class, images):
+    """Bulk insert product images and queue the index row for an image refresh"""
+    from .index_utils import mark_index_dirty
+
+    created = image_model_class.objects.bulk_create([
+        image_model_class(product=product, **img) for img in images
+    ])
+    if created:
+        mark_index_dirty(product.__class__, product.id)
 
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -190,13 +208,8 @@ def track_recently_viewed_product(request, index):
             defaults={'viewed_at': now()}
         )
     else:
-        session_key = request.session.session_key
-        if not session_key:
-            request.session.save()
-            session_key = request.session.session_key
-
         RecentlyViewedProduct.objects.update_or_create(
-            session_key=session_key,
+            session_key=ensure_session_key(request),
             product_index=index,
             defaults={'viewed_at': now()}
         )
@@ -331,3 +344,29 @@ def validate_logistics_vs_variants(logistics_data, variants_data):
                         f"Variant '{variant.get('custom_size_unit')}' weight of ({variant_weight:.2f}kg) "
                         f"cannot exceed its logistics weight of ({logistics_weight:.2f}kg)."
                     )
+
+
+def validate_logistics_placement(logistics_data, variants_data):
+    """
+    Logistics go either on the product or on every variant, never both.
+    Returns the per-variant flags used to decide where to save them
+    """
+    variant_have_logistics = [v.get('logistics') is not None for v in variants_data]
+    if any(variant_have_logistics) and logistics_data:
+        raise serializers.ValidationError(
+                "Logistics can either be at variant or product level not both"
+            )
+    elif any(variant_have_logistics):
+        if not all(variant_have_logistics):
+            raise serializers.ValidationError(
+                "if any variant has logistics, all variant must have logistics"
+            )
+    else:
+        if not logistics_data:
+            raise serializers.ValidationError(
+                "No variant logistics provided, product-level is required if no variant logistics"
+            )
+
+    # Ensure proper weight values are provided
+    validate_logistics_vs_variants(logistics_data, variants_data)
+    return variant_have_logistics
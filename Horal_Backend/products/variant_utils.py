@@ -0,0 +1,161 @@
+from decimal import Decimal
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import Case, DecimalField, F, Q, Subquery, OuterRef, When
+from django.db.models.functions import Coalesce, NullIf
+from django.utils.crypto import get_random_string
+from django.utils.text import slugify
+from rest_framework import serializers
+from .models import ProductVariant
+
+
+SKU_ATTEMPTS = 10
+
+
+def sync_effective_price(product):
+    """Carry a product price change to its variants that have no override, in one UPDATE"""
+    ProductVariant.objects.filter(
+        Q(price_override__isnull=True) | Q(price_override=0),
+        content_type=ContentType.objects.get_for_model(product.__class__),
+        object_id=product.id,
+    ).exclude(effective_price=product.price).update(effective_price=product.price)
+
+
+def refresh_effective_prices(variants):
+    """
+    Recompute effective_price for a variant queryset in SQL,
+    one UPDATE per product type involved
+    """
+    content_type_ids = variants.order_by().values_list('content_type_id', flat=True).distinct()
+    for content_type in ContentType.objects.filter(id__in=content_type_ids):
+        product_price = content_type.model_class().objects.filter(
+            id=OuterRef('object_id')
+        ).values('price')[:1]
+        variants.filter(content_type=content_type).update(
+            effective_price=Coalesce(NullIf('price_override', 0), Subquery(product_price))
+        )
+
+
+def refresh_shipping_weights(variants):
+    """
+    Recompute shipping_weight_kg for a variant queryset in one UPDATE, from
+    the variant's own logistics or else its product's. Run it whenever
+    logistics rows or variants change
+    """
+    from logistics.models import Logistics
+    from .textchoices import LogisticSizeUnit
+
+    weight_kg = Case(
+        When(weight_measurement=LogisticSizeUnit.G, then=F('total_weight') * Decimal('0.001')),
+        default=F('total_weight'),
+        output_field=DecimalField(max_digits=8, decimal_places=5),
+    )
+    # The heaviest row wins if a target has several
+    own = Logistics.objects.filter(
+        product_variant=OuterRef('pk')
+    ).annotate(kg=weight_kg).order_by('-kg').values('kg')[:1]
+    product = Logistics.objects.filter(
+        product_variant__isnull=True,
+        content_type=OuterRef('content_type'),
+        object_id=OuterRef('object_id'),
+    ).annotate(kg=weight_kg).order_by('-kg').values('kg')[:1]
+
+    return variants.update(shipping_weight_kg=Coalesce(Subquery(own), Subquery(product)))
+
+
+def sku_prefix(title, color=None, standard_size=None, custom_size_value=None):
+    """Readable part of a SKU, e.g. NIKEA-BLA-XL"""
+    base = slugify(title)[:5].upper()
+    color = color[:3].upper() if color else "XXX"
+    size = standard_size or custom_size_value or "FRE"
+    return f"{base}-{color}-{size}"
+
+
+def allocate_skus(variants, titles):
+    """
+    Give every variant without a SKU a unique one, `titles` maps each
+    product id to its title.
+    Candidates for the whole batch are checked in a single query per round,
+    and only the ones that collided are regenerated
+    """
+    pending = [v for v in variants if not v.sku]
+    taken = {v.sku for v in variants if v.sku}
+
+    for _ in range(SKU_ATTEMPTS):
+        if not pending:
+            return variants
+
+        candidates = {}
+        for variant in pending:
+            prefix = sku_prefix(titles[variant.object_id], variant.color, variant.standard_size, variant.custom_size_value)
+            candidate = f"{prefix}-{get_random_string(4).upper()}"
+            # Also avoid collisions inside the batch itself
+            while candidate in taken or candidate in candidates:
+                candidate = f"{prefix}-{get_random_string(4).upper()}"
+            candidates[candidate] = variant
+
+        existing = set(
+            ProductVariant.objects.filter(sku__in=candidates).values_list('sku', flat=True)
+        )
+
+        pending = []
+        for candidate, variant in candidates.items():
+            if candidate in existing:
+                pending.append(variant)
+            else:
+                variant.sku = candidate
+                taken.add(candidate)
+
+    raise ValueError(f"Unable to generate unique SKU after {SKU_ATTEMPTS} attempts.")
+
+
+def bulk_create_variants(product, variant_data):
+    """
+    Create all variants of a product and their logistics in bulk.
+    Returns the total stock so the caller can save product quantity once
+    """
+    from logistics.models import Logistics
+    from logistics.serializers import LogisticsSerializer
+
+    content_type = ContentType.objects.get_for_model(product.__class__)
+    variants, variant_logistics = [], []
+
+    for data in variant_data:
+        data = dict(data)
+        logistics = data.pop('logistics', None)
+        variant = ProductVariant(
+            content_type=content_type,
+            object_id=product.id,
+            shop=product.shop,
+            **data
+        )
+        variant.refresh_effective_price(product)
+        variants.append(variant)
+
+        if logistics:
+            serializer = LogisticsSerializer(data=logistics)
+            if not serializer.is_valid():
+                raise serializers.ValidationError(serializer.errors)
+            variant_logistics.append((variant, serializer.validated_data))
+
+    for attempt in range(2):
+        allocate_skus(variants, {product.id: product.title})
+        try:
+            with transaction.atomic():
+                ProductVariant.objects.bulk_create(variants)
+            break
+        except IntegrityError:
+            # A concurrent request took one of our SKUs between check and insert
+            if attempt:
+                raise
+            for variant in variants:
+                variant.sku = ""
+
+    Logistics.objects.bulk_create([
+        Logistics(product_variant=variant, **data)
+        for variant, data in variant_logistics
+    ])
+    # Also picks up logistics the product already has
+    refresh_shipping_weights(ProductVariant.objects.filter(id__in=[v.id for v in variants]))
+
+    return sum(v.stock_quantity + v.reserved_quantity for v in variants)
@@ -7,6 +7,7 @@ from django.db.models import Q, Avg, Value
 from django.db.models.functions import Coalesce
 from django.core.exceptions import PermissionDenied
 from django.utils.dateparse import parse_date
+from django.utils.text import slugify
 from sellers.models import SellerKYC
 from sellers_dashboard.serializers import SellerProfileSerializer
 from ratings.serializers import UserRatingSerializer
@@ -23,12 +24,28 @@ from .utils import (
     product_models_list, track_recently_viewed_product,
     topselling_product_sql
 )
-from .models import ProductIndex, RecentlyViewedProduct
+from .models import ProductIndex, RecentlyViewedProduct, ProductBulkJob, ProductFeedShard
 from categories.models import Category
 from subcategories.models import SubCategory
 from .models import ProductVariant
-from .serializers import get_product_serializer, ProductIndexSerializer, MixedProductSerializer
+from .serializers import (
+    get_product_serializer, ProductIndexSerializer,
+    MixedProductSerializer, ProductIndexSyncSerializer,
+    ProductBulkJobSerializer, ProductBulkActionSerializer,
+    InventoryBulkUpdateSerializer
+)
+from .index_utils import format_sync_token, get_index_changes, get_sync_head, needs_resync, parse_sync_token
+from .feed_utils import FeedWriter
+from django.http import HttpResponseRedirect, StreamingHttpResponse
+from .import_utils import IMPORT_READERS
+from .export_utils import EXPORT_FORMATS
+from .tasks import run_product_import_task, run_listing_job_task
+from .listing_utils import select_listings, apply_listing_action, DELETE_LISTINGS
+from .inventory_utils import bulk_update_inventory
+from media.utils.s3 import upload_file
+import os
 from carts.authentication import SessionOrAnonymousAuthentication
+from django.conf import settings
 
 
 class ProductBySubcategoryView(GenericAPIView, BaseResponseMixin):
@@ -534,6 +551,344 @@ class TopSellingProductListView(GenericAPIView, BaseResponseMixin):
     
 
 
+class ProductChangesView(GenericAPIView, BaseResponseMixin):
+    """
+    API endpoint for incremental catalog sync.
+    Call without `since` to get a starting token, download the catalog,
+    then poll with the returned next_token for changed rows and tombstones
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    serializer_class = ProductIndexSyncSerializer
+
+    def get(self, request, *args, **kwargs):
+        """Get catalog changes after a sync token"""
+        try:
+            since = request.query_params.get('since')
+            limit = request.query_params.get('limit', 200)
+
+            try:
+                limit = min(max(int(limit), 1), settings.PRODUCT_CHANGES_MAX_PAGE_SIZE)
+            except ValueError:
+                return self.get_response(
+                    status.HTTP_400_BAD_REQUEST,
+                    "limit must be an integer"
+                )
+
+            try:
+                since = parse_sync_token(since) if since not in (None, '') else None
+            except ValueError:
+                # Unreadable tokens, including ones from before (txid, seq) tokens, start over
+                since = None
+
+            # New clients and clients behind the retention window start over
+            if since is None or needs_resync(since):
+                return self.get_response(
+                    status.HTTP_200_OK,
+                    "Full resync required",
+                    {
+                        "reset": True,
+                        "changed": [],
+                        "deleted": [],
+                        "next_token": format_sync_token(get_sync_head()),
+                        "has_more": False,
+                    }
+                )
+
+            page = get_index_changes(since, limit)
+            serializer = self.get_serializer(page["changed"], many=True)
+
+            return self.get_response(
+                status.HTTP_200_OK,
+                "Catalog changes retrieved successfully",
+                {
+                    "reset": False,
+                    "changed": serializer.data,
+                    "deleted": page["deleted"],
+                    "next_token": format_sync_token(page["next_token"]),
+                    "has_more": page["has_more"],
+                }
+            )
+        except Exception as e:
+            return self.get_response(
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+                f"An error occurred while retrieving catalog changes: {str(e)}"
+            )
+
+
+class ProductFeedView(GenericAPIView, BaseResponseMixin):
+    """
+    API endpoint redirecting to the generated sitemaps and merchant feeds.
+    Serves sitemap.xml.gz, sitemap-<n>.xml.gz, products.csv.gz and products.xml.gz
+    as last written by generate_product_feeds
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    def get(self, request, name, *args, **kwargs):
+        """Redirect to a stored feed file"""
+        try:
+            writer = FeedWriter()
+            if not ProductFeedShard.objects.filter(destination=writer.destination, name=name).exists():
+                return self.get_response(status.HTTP_404_NOT_FOUND, "Feed not found")
+
+            response = HttpResponseRedirect(writer.url_for(name))
+            response["Cache-Control"] = "public, max-age=3600"
+            return response
+        except Exception as e:
+            return self.get_response(
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+                f"An error occurred while retrieving feed: {str(e)}"
+            )
+
+
+class SellerShopMixin:
+    """Resolve the shop a seller bulk endpoint acts on"""
+
+    def get_shop(self, request, shop_id=None):
+        """Sellers act on their own shop, admins must name one"""
+        if request.user.is_seller:
+            seller_kyc = get_object_or_404(SellerKYC, user=request.user)
+            return get_object_or_404(Shop, owner=seller_kyc)
+
+        if not shop_id:
+            return None
+        return get_object_or_404(Shop, id=shop_id)
+
+
+class ProductImportView(SellerShopMixin, GenericAPIView, BaseResponseMixin):
+    """
+    API endpoint to start an asynchronous bulk product import from a CSV or JSONL file
+    """
+    permission_classes = [IsSellerAdminOrSuperuser]
+    authentication_classes = [CookieTokenAuthentication]
+    serializer_class = ProductBulkJobSerializer
+
+    def post(self, request, *args, **kwargs):
+        """Upload an import file and queue the job"""
+        try:
+            file_obj = request.FILES.get('file')
+            if not file_obj:
+                return self.get_response(status.HTTP_400_BAD_REQUEST, "No file provided")
+
+            file_format = (
+                request.data.get('format')
+                or os.path.splitext(file_obj.name)[1].lstrip('.')
+            ).lower()
+            if file_format not in IMPORT_READERS:
+                return self.get_response(
+                    status.HTTP_400_BAD_REQUEST,
+                    f"Unsupported format, use one of: {', '.join(IMPORT_READERS)}"
+                )
+
+            shop = self.get_shop(request, request.data.get('shop'))
+            if not shop:
+                return self.get_response(
+                    status.HTTP_400_BAD_REQUEST,
+                    "Admin must specify a shop ID"
+                )
+
+            job = ProductBulkJob.objects.create(
+                kind=ProductBulkJob.Kind.IMPORT,
+                shop=shop,
+                requested_by=request.user,
+                params={"format": file_format, "filename": file_obj.name},
+            )
+            job.file_key = f"imports/{job.id}.{file_format}"
+            upload_file(file_obj, job.file_key, file_obj.content_type, is_private=True)
+            job.save(update_fields=['file_key'])
+
+            run_product_import_task.delay(str(job.id))
+
+            return self.get_response(
+                status.HTTP_202_ACCEPTED,
+                "Product import queued",
+                self.get_serializer(job).data
+            )
+        except Http404:
+            raise
+        except Exception as e:
+            return self.get_response(
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+                f"An error occurred while starting the import: {str(e)}"
+            )
+
+
+class ProductExportView(SellerShopMixin, GenericAPIView, BaseResponseMixin):
+    """
+    API endpoint streaming a shop's full catalog as CSV, JSONL or XLSX.
+    The file uses the bulk import layout, so it can be edited and imported back
+    """
+    permission_classes = [IsSellerAdminOrSuperuser]
+    authentication_classes = [CookieTokenAuthentication]
+
+    def get(self, request, *args, **kwargs):
+        """Stream the export, `type` selects csv (default), jsonl or xlsx"""
+        try:
+            file_format = request.query_params.get('type', 'csv').lower()
+            if file_format not in EXPORT_FORMATS:
+                return self.get_response(
+                    status.HTTP_400_BAD_REQUEST,
+                    f"Unsupported format, use one of: {', '.join(EXPORT_FORMATS)}"
+                )
+
+            shop = self.get_shop(request, request.query_params.get('shop'))
+            if not shop:
+                return self.get_response(
+                    status.HTTP_400_BAD_REQUEST,
+                    "Admin must specify a shop ID"
+                )
+
+            stream, content_type = EXPORT_FORMATS[file_format]
+            filename = f"{slugify(shop.name) or 'shop'}-products-{now():%Y%m%d}.{file_format}"
+            response = StreamingHttpResponse(stream(shop), content_type=content_type)
+            response["Content-Disposition"] = f'attachment; filename="{filename}"'
+            return response
+        except Http404:
+            raise
+        except Exception as e:
+            return self.get_response(
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+                f"An error occurred while exporting products: {str(e)}"
+            )
+
+
+class ProductBulkActionView(SellerShopMixin, GenericAPIView, BaseResponseMixin):
+    """
+    API endpoint to publish, unpublish or delete many listings of a shop at once.
+    Small selections are applied right away, large ones are queued as a job
+    """
+    permission_classes = [IsSellerAdminOrSuperuser]
+    authentication_classes = [CookieTokenAuthentication]
+    serializer_class = ProductBulkActionSerializer
+
+    def post(self, request, *args, **kwargs):
+        """Apply or queue a bulk listing action"""
+        try:
+            serializer = self.get_serializer(data=request.data)
+            if not serializer.is_valid():
+                return self.get_response(
+                    status.HTTP_400_BAD_REQUEST,
+                    "Invalid bulk action",
+                    serializer.errors
+                )
+            data = serializer.validated_data
+
+            # Same rule as single product delete
+            if data["action"] == DELETE_LISTINGS and not (request.user.is_staff or request.user.is_superuser):
+                raise PermissionDenied("Only staff or superusers can delete products")
+
+            shop = self.get_shop(request, data.get("shop"))
+            if not shop:
+                return self.get_response(
+                    status.HTTP_400_BAD_REQUEST,
+                    "Admin must specify a shop ID"
+                )
+
+            ids = data.get("ids")
+            filters = data.get("filters")
+            selected = select_listings(shop, ids, filters)
+            total = sum(len(product_ids) for product_ids in selected.values())
+
+            if total > settings.BULK_LISTING_SYNC_LIMIT:
+                job = ProductBulkJob.objects.create(
+                    kind=data["action"],
+                    shop=shop,
+                    requested_by=request.user,
+                    total=total,
+                    params={
+                        "ids": [str(product_id) for product_id in ids] if ids is not None else None,
+                        "filters": filters,
+                    },
+                )
+                run_listing_job_task.delay(str(job.id))
+
+                return self.get_response(
+                    status.HTTP_202_ACCEPTED,
+                    f"Bulk {data['action']} of {total} products queued",
+                    ProductBulkJobSerializer(job).data
+                )
+
+            processed, changed = apply_listing_action(shop, data["action"], selected)
+            return self.get_response(
+                status.HTTP_200_OK,
+                f"Bulk {data['action']} applied",
+                {"action": data["action"], "matched": processed, "changed": changed}
+            )
+        except (Http404, PermissionDenied):
+            raise
+        except Exception as e:
+            return self.get_response(
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+                f"An error occurred while applying the bulk action: {str(e)}"
+            )
+
+
+class InventoryBulkUpdateView(SellerShopMixin, GenericAPIView, BaseResponseMixin):
+    """
+    API endpoint for POS style stock and price sync keyed by SKU.
+    Items may carry the variant `version` last seen, stale items are
+    reported as conflicts instead of overwriting newer data
+    """
+    permission_classes = [IsSellerAdminOrSuperuser]
+    authentication_classes = [CookieTokenAuthentication]
+    serializer_class = InventoryBulkUpdateSerializer
+
+    def patch(self, request, *args, **kwargs):
+        """Update stock_quantity and price_override of many variants at once"""
+        try:
+            serializer = self.get_serializer(data=request.data)
+            if not serializer.is_valid():
+                return self.get_response(
+                    status.HTTP_400_BAD_REQUEST,
+                    "Invalid inventory update",
+                    serializer.errors
+                )
+
+            shop = self.get_shop(request, serializer.validated_data.get("shop"))
+            if not shop:
+                return self.get_response(
+                    status.HTTP_400_BAD_REQUEST,
+                    "Admin must specify a shop ID"
+                )
+
+            result = bulk_update_inventory(shop, serializer.validated_data["items"])
+            message = (
+                f"{len(result['updated'])} variants updated, "
+                f"{len(result['conflicts'])} conflicts, {len(result['not_found'])} not found"
+            )
+            return self.get_response(status.HTTP_200_OK, message, result)
+        except Http404:
+            raise
+        except Exception as e:
+            return self.get_response(
+                status.HTTP_500_INTERNAL_SERVER_ERROR,
+                f"An error occurred while updating inventory: {str(e)}"
+            )
+
+
+class ProductBulkJobView(GenericAPIView, BaseResponseMixin):
+    """
+    API endpoint to check progress and row errors of a bulk product job
+    """
+    permission_classes = [IsSellerAdminOrSuperuser]
+    authentication_classes = [CookieTokenAuthentication]
+    serializer_class = ProductBulkJobSerializer
+
+    def get(self, request, job_id, *args, **kwargs):
+        """Get a bulk job"""
+        jobs = ProductBulkJob.objects.all()
+        if not (request.user.is_staff or request.user.is_superuser):
+            jobs = jobs.filter(requested_by=request.user)
+
+        job = get_object_or_404(jobs, id=job_id)
+        return self.get_response(
+            status.HTTP_200_OK,
+            "Job retrieved successfully",
+            self.get_serializer(job).data
+        )
+
+
 class ProductVariantView(GenericAPIView, BaseResponseMixin):
     """
     API endpoint to manage product variants
@@ -635,20 +990,17 @@ class RecentlyViewedProductView(GenericAPIView, BaseResponseMixin):
         """Retrieve users recently viewed products"""
         try:
             user = request.user
+            # Visitors without a session have not viewed anything yet,
+            # and reading the list must not create a session for them
             session_key = request.session.session_key
-            
-
-            if not session_key:
-                request.session['init'] = True
-                request.session.save()
-                session_key = request.session.session_key
-                
 
             # fetched viewed items for user or anonymous users
             if user.is_authenticated:
                 views = RecentlyViewedProduct.objects.filter(user=user)
-            else:
+            elif session_key:
                 views = RecentlyViewedProduct.objects.filter(session_key=session_key)
+            else:
+                views = RecentlyViewedProduct.objects.none()
 
             views = views.select_related('product_index')[:20]
 
@@ -0,0 +1,170 @@
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+from xml.sax.saxutils import escape
+
+
+# Minimal single-sheet workbook ("XLSX-lite"): inline strings only,
+# no styles, which every spreadsheet application opens fine
+SHEET_PATH = "xl/worksheets/sheet1.xml"
+NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="{name}" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+
+# Characters XML 1.0 does not allow, even escaped
+_ILLEGAL_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+class _StreamBuffer:
+    """Write-only file object whose contents are drained between rows"""
+
+    def __init__(self):
+        self.chunks = []
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _cell(value):
+    value = _ILLEGAL_XML.sub("", str(value))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(value)}</t></is></c>'
+
+
+def _row(values):
+    return ("<row>" + "".join(_cell(v) for v in values) + "</row>").encode("utf-8")
+
+
+def xlsx_stream(header, rows, sheet_name="Products"):
+    """
+    Yield the bytes of an xlsx workbook as rows are produced.
+    The zip is written to a buffer that is emptied after every row,
+    so memory use does not grow with the sheet size
+    """
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", CONTENT_TYPES)
+        archive.writestr("_rels/.rels", ROOT_RELS)
+        archive.writestr("xl/workbook.xml", WORKBOOK.format(name=escape(sheet_name)))
+        archive.writestr("xl/_rels/workbook.xml.rels", WORKBOOK_RELS)
+
+        with archive.open(SHEET_PATH, mode="w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                b'<sheetData>'
+            )
+            sheet.write(_row(header))
+            for row in rows:
+                sheet.write(_row(row))
+                data = buffer.drain()
+                if data:
+                    yield data
+            sheet.write(b"</sheetData></worksheet>")
+
+    yield buffer.drain()
+
+
+def _column_index(ref):
+    """Zero based column index from a cell reference such as "AB12" """
+    index = 0
+    for char in ref:
+        if not char.isalpha():
+            break
+        index = index * 26 + (ord(char.upper()) - 64)
+    return index - 1
+
+
+def iter_xlsx_rows(fileobj):
+    """
+    Yield (line number, list of cell strings) from the first sheet of an xlsx file.
+    Handles shared strings as written by Excel and LibreOffice as well as inline strings
+    """
+    with zipfile.ZipFile(fileobj) as archive:
+        names = set(archive.namelist())
+        shared = []
+        if "xl/sharedStrings.xml" in names:
+            with archive.open("xl/sharedStrings.xml") as f:
+                for _, element in iterparse(f):
+                    if element.tag == f"{NS}si":
+                        shared.append("".join(t.text or "" for t in element.iter(f"{NS}t")))
+                        element.clear()
+
+        sheet_path = SHEET_PATH if SHEET_PATH in names else sorted(
+            n for n in names if n.startswith("xl/worksheets/sheet")
+        )[0]
+
+        with archive.open(sheet_path) as f:
+            line = 0
+            for _, element in iterparse(f):
+                if element.tag != f"{NS}row":
+                    continue
+
+                line = int(element.get("r", line + 1))
+                values = {}
+                for position, cell in enumerate(element.iter(f"{NS}c")):
+                    kind = cell.get("t")
+                    column = _column_index(cell.get("r")) if cell.get("r") else position
+                    if kind == "inlineStr":
+                        text = "".join(t.text or "" for t in cell.iter(f"{NS}t"))
+                    else:
+                        raw = cell.findtext(f"{NS}v")
+                        if raw is None:
+                            continue
+                        if kind == "s":
+                            text = shared[int(raw)]
+                        elif kind == "b":
+                            text = "true" if raw == "1" else "false"
+                        else:
+                            text = raw
+                    values[column] = text
+
+                element.clear()
+                width = max(values) + 1 if values else 0
+                yield line, [values.get(i, "") for i in range(width)]
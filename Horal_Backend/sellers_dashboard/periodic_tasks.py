@@ -8,6 +8,8 @@ location = 'sellers_dashboard.tasks.'
 order_location = 'orders.tasks.'
 payment_location = 'payment.tasks.'
 cart_location = 'carts.tasks.'
+product_location = 'products.tasks.'
+logistics_location = 'logistics.tasks.'
 
 def setup_hourly_task():
     """Run every hour: populate shop sales"""
@@ -47,12 +49,19 @@ def setup_order_expiration_task():
         month_of_year='*',
     )
 
-    # Register the periodic task
-    PeriodicTask.objects.get_or_create(
+    # Each checkout queues its own expiry, this sweep only catches lost tasks
+    every_five_minutes, _ = CrontabSchedule.objects.get_or_create(
+        minute='*/5',
+        hour='*',
+        day_of_month='*',
+        month_of_year='*',
+    )
+
+    PeriodicTask.objects.update_or_create(
         name="Expire Pending Orders",
         defaults={
             "task": f'{order_location}expire_pending_orders_task',
-            'crontab': schedule,
+            'crontab': every_five_minutes,
             'enabled': True
         },
     )
@@ -228,6 +237,87 @@ def setup_daily_task():
     )
 
 
+def setup_catalog_maintenance_task():
+    """
+    Run daily: prune the catalog change log
+    Run hourly: regenerate sitemaps and product feeds
+    """
+    schedule, _ = CrontabSchedule.objects.get_or_create(
+        minute='30',
+        hour='3',
+        day_of_month='*',
+        month_of_year='*',
+        day_of_week='*'
+    )
+
+    PeriodicTask.objects.update_or_create(
+        name="Prune product index change log",
+        defaults={
+            'task': f'{product_location}prune_product_index_changes',
+            'crontab': schedule,
+            'enabled': True
+        }
+    )
+
+    hourly, _ = CrontabSchedule.objects.get_or_create(
+        minute='15',
+        hour='*',
+        day_of_month='*',
+        month_of_year='*',
+        day_of_week='*'
+    )
+
+    # Cheap when nothing changed: the task skips unless the change log moved
+    PeriodicTask.objects.update_or_create(
+        name="Generate sitemaps and product feeds",
+        defaults={
+            'task': f'{product_location}generate_product_feeds_task',
+            'crontab': hourly,
+            'enabled': True
+        }
+    )
+
+
+def setup_flash_sale_task():
+    """Run every minute: release expired flash sale holds and reconcile stock to Postgres"""
+    schedule, _ = CrontabSchedule.objects.get_or_create(
+        minute='*',
+        hour='*',
+        day_of_month='*',
+        month_of_year='*',
+        day_of_week='*'
+    )
+
+    PeriodicTask.objects.update_or_create(
+        name="Reconcile flash sale stock",
+        defaults={
+            'task': f'{product_location}reconcile_flash_sales_task',
+            'crontab': schedule,
+            'enabled': True
+        }
+    )
+
+
+def setup_shipping_rate_sync_task():
+    """Run daily: refresh the shipping rate card from FEZ and record drift"""
+    schedule, _ = CrontabSchedule.objects.get_or_create(
+        minute='0',
+        hour='4',
+        day_of_month='*',
+        month_of_year='*',
+        day_of_week='*'
+    )
+
+    PeriodicTask.objects.update_or_create(
+        name="Sync shipping rate card",
+        defaults={
+            'task': f'{logistics_location}sync_shipping_rates_task',
+            'crontab': schedule,
+            'enabled': True
+        }
+    )
+
+
 def setup_all_tasks():
     setup_hourly_task()
     setup_weekly_task()
@@ -236,4 +326,7 @@ def setup_all_tasks():
     setup_cart_abandonment_and_order_review_task()
     setup_order_expiration_task()
     setup_daily_task()
+    setup_catalog_maintenance_task()
+    setup_flash_sale_task()
+    setup_shipping_rate_sync_task()
 